@@ -0,0 +1,3 @@
+"""
+Benchmarks locales que no requieren credenciales ni red
+"""
@@ -0,0 +1,129 @@
+"""
+Índice BM25: tiempo de construcción, bytes por posting y latencia de consulta;
+y search_documents con y sin recuperación híbrida, contando los embeddings de
+consulta que se ahorra el atajo léxico
+
+Uso:
+    python -m benchmarks.bench_bm25 [--rows 20000] [--calls 200] [--keyword-ratio 0.5]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import sys
+import time
+
+from benchmarks import run_suite
+from src.bm25 import BM25Index
+from src.config import config
+
+# Tecnologías compartidas entre chunks; cada chunk además nombra una empresa única
+TECHNOLOGIES = [f"tecnologia{i}" for i in range(200)]
+
+
+def corpus(rows: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            'id': doc_id,
+            'content': f"{run_suite.synthetic_text(400, seed=doc_id)} empresa{doc_id} {rng.choice(TECHNOLOGIES)}"
+        }
+        for doc_id in range(1, rows + 1)
+    ]
+
+
+def keyword_query(index: int, rows: int) -> str:
+    """Pregunta de palabra clave: una empresa (un solo chunk) o una tecnología (varios)"""
+    rng = random.Random(f"keyword-{index}")
+    return f"empresa{rng.randint(1, rows)}" if rng.random() < 0.5 else rng.choice(TECHNOLOGIES)
+
+
+async def bench_index(args: argparse.Namespace) -> dict:
+    rows = corpus(args.rows, args.seed)
+
+    async def fetch_page(after_id, limit):
+        start = 0 if after_id is None else after_id
+        return rows[start:start + limit]
+
+    index = BM25Index(config.BM25_K1, config.BM25_B)
+    start = time.perf_counter()
+    await index.load(fetch_page, config.LOCAL_INDEX_PAGE_SIZE)
+    build_s = time.perf_counter() - start
+    stats = index.stats()
+
+    report = {
+        'build_ms': build_s * 1000,
+        'rows_per_s': args.rows / build_s,
+        **stats,
+        'bytes_per_posting': stats['posting_bytes'] / max(stats['postings'], 1)
+    }
+    for name, make_query in (
+        ('keyword', lambda i: keyword_query(i, args.rows)),
+        ('natural', run_suite.query_text)
+    ):
+        samples, confident = [], 0
+        for i in range(args.queries):
+            query = make_query(i)
+            start = time.perf_counter()
+            _, confidence = index.search(query, 10)
+            samples.append(time.perf_counter() - start)
+            confident += confidence >= config.BM25_FAST_PATH_CONFIDENCE
+        report[f"{name}_query"] = {**run_suite.percentiles(samples), 'fast_path_rate': confident / args.queries}
+    return report
+
+
+async def bench_search(args: argparse.Namespace, enabled: bool) -> dict:
+    config.BM25_ENABLED = enabled
+    clients = run_suite.install_fakes(args)
+    supabase, gemini = clients['supabase'], clients['gemini']
+    # Corpus directo en la tabla simulada (la ingesta no es lo que se mide)
+    from benchmarks.fakes import fake_embedding
+    for row in corpus(args.search_rows, args.seed):
+        supabase.rows[row['id']] = {**row, 'embedding': fake_embedding(row['content'], config.EMBED_DIM)}
+    supabase._next_id = args.search_rows + 1
+    await supabase.ensure_lexical_index()
+
+    def query(i: int) -> str:
+        if random.Random(i).random() < args.keyword_ratio:
+            return keyword_query(i, args.search_rows)
+        return run_suite.query_text(i)
+
+    embed_calls = gemini.faults.calls
+    report = await run_suite.timed_calls(
+        lambda i: run_suite.legacy_main.search_documents(query(i)), args.calls, args.concurrency
+    )
+    report['embedding_calls'] = gemini.faults.calls - embed_calls
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--search-rows', type=int, default=2_000)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--keyword-ratio', type=float, default=0.5)
+    parser.add_argument('--embed-latency', type=float, default=0.05)
+    parser.add_argument('--generate-latency', type=float, default=0.3)
+    parser.add_argument('--first-token-latency', type=float, default=0.1)
+    parser.add_argument('--db-latency', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--tail-rate', type=float, default=0.0)
+    parser.add_argument('--tail-latency', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        report = {
+            'params': vars(args),
+            'index': asyncio.run(bench_index(args)),
+            'vector_only': asyncio.run(bench_search(args, False)),
+            'hybrid': asyncio.run(bench_search(args, True))
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
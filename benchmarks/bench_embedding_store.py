@@ -0,0 +1,88 @@
+"""
+Snapshot de embeddings mapeado en memoria: bytes por fila, tiempo de apertura
+en frío, latencia de búsqueda y recall@k de cada formato frente a la búsqueda
+exacta en float32
+
+Uso:
+    python -m benchmarks.bench_embedding_store [--rows 50000] [--queries 50]
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.config import config
+from src.embedding_store import EmbeddingStore
+from src.vector_index import LocalVectorIndex
+
+
+def list_bytes(dim: int) -> int:
+    """Memoria de un embedding como List[float] (lista + un float por valor)"""
+    values = [0.1 * i for i in range(dim)]
+    return sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--dim', type=int, default=config.EMBED_DIM)
+    parser.add_argument('--limit', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    # Corpus con estructura de clusters para que el top-k no sea ruido
+    centers = rng.normal(size=(64, args.dim)).astype(np.float32)
+    embeddings = centers[rng.integers(0, 64, args.rows)] + rng.normal(size=(args.rows, args.dim)).astype(np.float32)
+    ids = list(range(1, args.rows + 1))
+    contents = [f"chunk {doc_id}" for doc_id in ids]
+    queries = embeddings[rng.integers(0, args.rows, args.queries)] + rng.normal(size=(args.queries, args.dim))
+
+    exact = LocalVectorIndex(args.dim)
+    exact.add(ids, contents, embeddings)
+    expected = [{doc['id'] for doc in exact.search(query, args.limit, 0.0)} for query in queries]
+
+    report = {'rows': args.rows, 'dim': args.dim, 'list_float_bytes_per_row': list_bytes(args.dim), 'formats': {}}
+    root = tempfile.mkdtemp(prefix='embed_store_')
+    try:
+        for dtype in ('float32', 'float16', 'int8'):
+            for rescore in ((False,) if dtype == 'float32' else (False, True)):
+                path = f"{root}/{dtype}-{rescore}"
+                start = time.perf_counter()
+                EmbeddingStore(path, args.dim, dtype, rescore).append(ids, contents, embeddings)
+                build_s = time.perf_counter() - start
+
+                # Apertura en frío: otro proceso solo mapea los archivos existentes
+                start = time.perf_counter()
+                store = EmbeddingStore(path, args.dim, dtype, rescore)
+                store.open()
+                open_ms = (time.perf_counter() - start) * 1000
+
+                latencies, recall = [], 0.0
+                for query, truth in zip(queries, expected):
+                    start = time.perf_counter()
+                    found = store.search(query, args.limit, 0.0, config.EMBED_STORE_RESCORE_FACTOR)
+                    latencies.append(time.perf_counter() - start)
+                    recall += len({doc['id'] for doc in found} & truth) / len(truth)
+
+                stats = store.stats()
+                report['formats'][f"{dtype}{'+rescore' if rescore else ''}"] = {
+                    'bytes_per_row': stats['bytes_per_row'],
+                    'build_s': build_s,
+                    'open_ms': open_ms,
+                    'search_p50_ms': float(np.percentile(latencies, 50) * 1000),
+                    f'recall_at_{args.limit}': recall / len(queries)
+                }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Cola de latencia de generate_response y search_documents con y sin requests
+hedged, inyectando una fracción de embed_content y match_documents lentos
+
+Uso:
+    python -m benchmarks.bench_hedging [--calls 400] [--tail-rate 0.03] [--tail-latency 1.0]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
+
+from benchmarks import run_suite
+from src import hedging
+from src.config import config
+
+
+async def measure(args: argparse.Namespace, enabled: bool) -> dict:
+    config.HEDGE_ENABLED = enabled
+    hedging._trackers.clear()
+    hedging._calls.clear()
+    hedging._hedges.clear()
+    run_suite.install_fakes(args)
+
+    report = {}
+    for name, call in run_suite.tool_calls().items():
+        # Misma secuencia de consultas (y de fallas inyectadas) en ambas corridas
+        report[name] = await run_suite.timed_calls(call, args.calls, args.concurrency)
+    report['hedging'] = hedging.stats()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--tail-rate', type=float, default=0.03)
+    parser.add_argument('--tail-latency', type=float, default=1.0)
+    parser.add_argument('--embed-latency', type=float, default=0.05)
+    parser.add_argument('--generate-latency', type=float, default=0.3)
+    parser.add_argument('--first-token-latency', type=float, default=0.1)
+    parser.add_argument('--db-latency', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Cada llamada hace el trabajo completo: sin caches de embeddings ni de respuestas
+    config.ANSWER_CACHE_ENABLED = False
+    with contextlib.redirect_stdout(sys.stderr):
+        report = {
+            'params': vars(args),
+            'without_hedging': asyncio.run(measure(args, False)),
+            'with_hedging': asyncio.run(measure(args, True))
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
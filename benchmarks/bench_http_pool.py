@@ -0,0 +1,108 @@
+"""
+Prueba de carga del transporte HTTP asíncrono contra el servidor stub local
+
+Compara el camino asíncrono (pool httpx compartido) con el camino anterior
+(request síncrono dentro de asyncio.to_thread) para N llamadas concurrentes
+de embedding + búsqueda, con varios tamaños de pool.
+
+Uso:
+    python -m benchmarks.bench_http_pool [--concurrency 200] [--pools 10,50,100] [--latency-ms 50]
+"""
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+
+from src.config import config
+from src.gemini import GeminiClient
+from src.http_transport import close_http_client
+from src.supabase_client import SupabaseClient
+
+
+def wait_for_port(port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"El servidor stub no respondió en el puerto {port}")
+
+
+async def run_async(concurrency: int) -> float:
+    """Throughput (llamadas/s) con el transporte asíncrono"""
+    gemini, supabase = GeminiClient(), SupabaseClient()
+
+    async def call(i: int) -> None:
+        embedding = await gemini.generate_embedding(f"pregunta {i}")
+        await supabase.search_similar_documents(embedding, limit=5, threshold=0.5)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(concurrency)))
+    return concurrency / (time.perf_counter() - start)
+
+
+async def run_threads(concurrency: int, base_url: str) -> float:
+    """Throughput con requests síncronos en el pool de hilos (como el SDK)"""
+    import httpx
+
+    client = httpx.Client(limits=httpx.Limits(max_connections=concurrency))
+    body = {'content': {'parts': [{'text': 'pregunta'}]}, 'taskType': 'RETRIEVAL_QUERY'}
+
+    def call() -> None:
+        client.post(f"{base_url}/v1beta/models/stub:embedContent", json=body).raise_for_status()
+        client.post(f"{base_url}/rest/v1/rpc/match_documents", json={'match_count': 5}).raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(asyncio.to_thread(call) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    client.close()
+    return concurrency / elapsed
+
+
+async def measure(concurrency: int, pools: list, base_url: str) -> dict:
+    report = {'concurrency': concurrency, 'threads_calls_per_s': await run_threads(concurrency, base_url)}
+    for pool in pools:
+        config.HTTP_MAX_CONNECTIONS = pool
+        config.HTTP_MAX_KEEPALIVE = pool
+        await close_http_client()
+        report[f'async_pool_{pool}_calls_per_s'] = await run_async(concurrency)
+    await close_http_client()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--pools', default='10,50,100')
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    config.ASYNC_HTTP_ENABLED = True
+    config.GEMINI_API_BASE = base_url
+    config.GEMINI_API_KEY = config.GEMINI_API_KEY or 'stub'
+    config.SUPABASE_URL = base_url
+    config.SUPABASE_SERVICE_ROLE_KEY = config.SUPABASE_SERVICE_ROLE_KEY or 'stub'
+    config.EMBED_CACHE_SIZE = 0
+    config.LOCAL_INDEX_ENABLED = False
+
+    server = subprocess.Popen([
+        sys.executable, '-m', 'benchmarks.stub_server',
+        '--port', str(args.port), '--latency-ms', str(args.latency_ms)
+    ])
+    try:
+        wait_for_port(args.port)
+        pools = [int(pool) for pool in args.pools.split(',')]
+        print(json.dumps(asyncio.run(measure(args.concurrency, pools, base_url)), indent=2))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
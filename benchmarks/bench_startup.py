@@ -0,0 +1,88 @@
+"""
+Benchmark de arranque en frío: tiempo de import en un proceso nuevo
+
+Verifica que importar el paquete no cargue los SDKs pesados (se cargan en el
+primer uso) y que el tiempo de import quede dentro del presupuesto. Sale con
+código 1 si hay una regresión.
+
+Uso:
+    python -m benchmarks.bench_startup [--runs 5] [--budget-ms 300] [--server-budget-ms 3000]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que no deben importarse al arrancar
+DEFERRED_MODULES = ('google.generativeai', 'supabase', 'numpy')
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'ms': elapsed * 1000,
+    'loaded': [name for name in {deferred!r} if name in sys.modules]
+}}))
+"""
+
+
+def measure(module: str, runs: int) -> dict:
+    """Importa module en runs procesos nuevos y devuelve la mediana en ms"""
+    samples, loaded = [], set()
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module, deferred=DEFERRED_MODULES)],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result['ms'])
+        loaded.update(result['loaded'])
+    return {
+        'median_ms': statistics.median(samples),
+        'max_ms': max(samples),
+        'eager_sdk_imports': sorted(loaded)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument(
+        '--budget-ms', type=float,
+        default=float(os.getenv('STARTUP_IMPORT_BUDGET_MS', '300')),
+        help='presupuesto para "import src" (config + clientes)'
+    )
+    parser.add_argument(
+        '--server-budget-ms', type=float,
+        default=float(os.getenv('STARTUP_SERVER_BUDGET_MS', '3000')),
+        help='presupuesto para "import src.main" (incluye fastmcp)'
+    )
+    args = parser.parse_args()
+
+    report = {
+        'src': {**measure('src', args.runs), 'budget_ms': args.budget_ms},
+        'src.main': {**measure('src.main', args.runs), 'budget_ms': args.server_budget_ms}
+    }
+    failures = [
+        name for name, result in report.items()
+        if result['median_ms'] > result['budget_ms'] or result['eager_sdk_imports']
+    ]
+    report['ok'] = not failures
+    print(json.dumps(report, indent=2))
+
+    if failures:
+        print(f"❌ Regresión de arranque en: {', '.join(failures)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Tiempo al primer byte de generate_text vs generate_text_stream con un modelo falso
+
+Uso:
+    python -m benchmarks.bench_streaming [--runs 5] [--first-token 0.3] [--inter-token 0.02]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from benchmarks.fakes import FakeStreamingModel
+from src.gemini import GeminiClient
+
+
+async def measure(client: GeminiClient, runs: int) -> dict:
+    blocking, ttfb, stream_total = [], [], []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        await client.generate_text("prompt")
+        blocking.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        first = None
+        async for _piece in client.generate_text_stream("prompt"):
+            if first is None:
+                first = time.perf_counter() - start
+        ttfb.append(first)
+        stream_total.append(time.perf_counter() - start)
+
+    return {
+        'runs': runs,
+        'blocking_ttfb_ms': statistics.median(blocking) * 1000,
+        'stream_ttfb_ms': statistics.median(ttfb) * 1000,
+        'stream_total_ms': statistics.median(stream_total) * 1000
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--first-token', type=float, default=0.3, help='segundos hasta el primer token')
+    parser.add_argument('--inter-token', type=float, default=0.02, help='segundos entre fragmentos')
+    args = parser.parse_args()
+
+    model = FakeStreamingModel(first_token_delay=args.first_token, inter_token_delay=args.inter_token)
+    client = GeminiClient(model=model)
+    print(json.dumps(asyncio.run(measure(client, args.runs)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
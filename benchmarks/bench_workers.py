@@ -0,0 +1,127 @@
+"""
+Throughput del servidor MCP completo por HTTP según el número de workers
+
+Levanta el servidor stub (Gemini + PostgREST) y, para cada número de workers,
+`python -m src.serve` apuntando a él. Mide llamadas/s a generate_response con
+consultas distintas (trabajo real en cada worker) y luego repitiendo las mismas
+consultas (servidas por los caches compartidos, sin importar qué worker
+atiende cada request).
+
+Uso:
+    python -m benchmarks.bench_workers [--workers 1,2,4] [--calls 400] [--concurrency 64]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_http_pool import wait_for_port
+
+HEADERS = {'Accept': 'application/json, text/event-stream', 'Content-Type': 'application/json'}
+
+
+def parse_result(response: httpx.Response) -> dict:
+    """El transporte responde JSON o un stream SSE cuyo último evento es el resultado"""
+    if response.headers.get('content-type', '').startswith('application/json'):
+        return response.json()
+    events = [line[5:].strip() for line in response.text.splitlines() if line.startswith('data:')]
+    return json.loads(events[-1])
+
+
+async def run_calls(url: str, queries: list, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def call(i: int, query: str) -> None:
+            nonlocal errors
+            payload = {
+                'jsonrpc': '2.0', 'id': i, 'method': 'tools/call',
+                'params': {'name': 'generate_response', 'arguments': {'query': query}}
+            }
+            async with semaphore:
+                response = await client.post(url, json=payload, headers=HEADERS)
+            if response.status_code != 200 or 'error' in parse_result(response):
+                errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(call(i, query) for i, query in enumerate(queries)))
+        elapsed = time.perf_counter() - start
+    return {'calls_per_s': len(queries) / elapsed, 'errors': errors}
+
+
+def measure(workers: int, args, stub_url: str) -> dict:
+    state = tempfile.mkdtemp(prefix='bench_workers_')
+    env = {
+        **os.environ,
+        'ASYNC_HTTP_ENABLED': 'true',
+        'GEMINI_API_BASE': stub_url,
+        'GEMINI_API_KEY': os.getenv('GEMINI_API_KEY') or 'stub',
+        'SUPABASE_URL': stub_url,
+        'SUPABASE_SERVICE_ROLE_KEY': os.getenv('SUPABASE_SERVICE_ROLE_KEY') or 'stub',
+        'EMBED_CACHE_PATH': os.path.join(state, 'embeddings.sqlite'),
+        'ANSWER_CACHE_ENABLED': 'true',
+        'ANSWER_CACHE_PATH': os.path.join(state, 'answers.sqlite'),
+        'INGEST_JOBS_DIR': os.path.join(state, 'jobs'),
+        'LOCAL_INDEX_ENABLED': 'false',
+        'EMBED_STORE_ENABLED': 'false',
+        'LOG_LEVEL': 'WARNING',
+    }
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'src.serve', '--workers', str(workers), '--port', str(args.port)],
+        env=env
+    )
+    try:
+        wait_for_port(args.port, timeout=60)
+        url = f"http://127.0.0.1:{args.port}/mcp"
+        queries = [f"pregunta de prueba número {i} con workers={workers}" for i in range(args.calls)]
+        # Primera llamada fuera de la medición: clientes construidos en cada worker
+        asyncio.run(run_calls(url, queries[:workers * 4], workers * 4))
+        cold = asyncio.run(run_calls(url, queries, args.concurrency))
+        repeated = asyncio.run(run_calls(url, queries, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(state, ignore_errors=True)
+    return {
+        'workers': workers,
+        'distinct_calls_per_s': cold['calls_per_s'],
+        'repeated_calls_per_s': repeated['calls_per_s'],
+        'errors': cold['errors'] + repeated['errors']
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--calls', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--stub-port', type=int, default=8765)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    stub = subprocess.Popen([
+        sys.executable, '-m', 'benchmarks.stub_server',
+        '--port', str(args.stub_port), '--latency-ms', str(args.latency_ms)
+    ])
+    try:
+        wait_for_port(args.stub_port)
+        stub_url = f"http://127.0.0.1:{args.stub_port}"
+        report = [measure(int(workers), args, stub_url) for workers in args.workers.split(',')]
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print(json.dumps({'cpus': os.cpu_count(), 'calls': args.calls, 'results': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""
+Dobles locales y deterministas de los servicios externos para benchmarks
+"""
+import asyncio
+import functools
+import hashlib
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from src.bm25 import BM25Index
+from src.config import config
+from src.gemini import GeminiClient
+from src.supabase_client import SupabaseClient
+
+_WORD_RE = re.compile(r'\w+')
+
+
+@functools.lru_cache(maxsize=65536)
+def _word_vector(word: str, dim: int):
+    import numpy as np
+
+    seed = int.from_bytes(hashlib.sha256(word.encode('utf-8')).digest()[:8], 'big')
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def fake_embedding(text: str, dim: int = 768) -> List[float]:
+    """
+    Vector determinista tipo bolsa de palabras: el mismo texto siempre da el
+    mismo vector y los textos que comparten palabras resultan similares, así
+    que las búsquedas de los benchmarks sí encuentran documentos
+    """
+    import numpy as np
+
+    words = _WORD_RE.findall(text.lower()) or [text]
+    vector = np.sum([_word_vector(word, dim) for word in words], axis=0)
+    return (vector / max(float(np.linalg.norm(vector)), 1e-12)).tolist()
+
+
+class FakeChunk:
+    """Fragmento de respuesta con la misma forma que los de Gemini (atributo text)"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeStreamResponse:
+    """Respuesta en streaming: iterable asíncrono de FakeChunk"""
+
+    def __init__(self, pieces: List[str], first_token_delay: float, inter_token_delay: float):
+        self._pieces = pieces
+        self._first_token_delay = first_token_delay
+        self._inter_token_delay = inter_token_delay
+
+    async def __aiter__(self):
+        for index, piece in enumerate(self._pieces):
+            await asyncio.sleep(self._first_token_delay if index == 0 else self._inter_token_delay)
+            yield FakeChunk(piece)
+
+
+class FakeBlockingResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeStreamingModel:
+    """
+    Sustituto de genai.GenerativeModel que simula la latencia de generación:
+    un retraso hasta el primer token y un retraso fijo entre tokens.
+    """
+
+    def __init__(
+        self,
+        answer: str = "Respuesta simulada " * 40,
+        first_token_delay: float = 0.3,
+        inter_token_delay: float = 0.02,
+        words_per_chunk: int = 4
+    ):
+        words = answer.split(' ')
+        self.pieces = [
+            ' '.join(words[i:i + words_per_chunk]) + ' '
+            for i in range(0, len(words), words_per_chunk)
+        ]
+        self.first_token_delay = first_token_delay
+        self.inter_token_delay = inter_token_delay
+
+    @property
+    def total_delay(self) -> float:
+        return self.first_token_delay + self.inter_token_delay * (len(self.pieces) - 1)
+
+    def generate_content(self, prompt, **kwargs):
+        time.sleep(self.total_delay)
+        return FakeBlockingResponse(''.join(self.pieces))
+
+    async def generate_content_async(self, prompt, stream: bool = False, **kwargs):
+        if stream:
+            return FakeStreamResponse(self.pieces, self.first_token_delay, self.inter_token_delay)
+        await asyncio.sleep(self.total_delay)
+        return FakeBlockingResponse(''.join(self.pieces))
+
+
+class FakeServiceError(Exception):
+    """Error transitorio inyectado; se comporta como un 503 del servicio real"""
+    code = 503
+
+
+class FaultInjector:
+    """
+    Latencia con jitter y errores aleatorios, reproducibles con una semilla.
+    Con tail_rate, esa fracción de llamadas tarda tail_latency segundos (cola
+    de latencia, como un embed_content o un RPC ocasionalmente lento).
+    """
+
+    def __init__(
+        self,
+        error_rate: float = 0.0,
+        jitter: float = 0.0,
+        seed: int = 0,
+        tail_rate: float = 0.0,
+        tail_latency: float = 0.0
+    ):
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self._rng = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+
+    async def wait(self, latency: float) -> None:
+        """Simula un round-trip de latency segundos (± jitter) que puede fallar"""
+        self.calls += 1
+        if self.tail_rate and self._rng.random() < self.tail_rate:
+            latency = max(latency, self.tail_latency)
+        if latency > 0:
+            await asyncio.sleep(latency * (1 + self._rng.uniform(-self.jitter, self.jitter)))
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.errors += 1
+            raise FakeServiceError("503 Service Unavailable (inyectado)")
+
+
+class FakeGeminiClient(GeminiClient):
+    """
+    GeminiClient con el transporte sustituido por uno local y determinista.
+    Se conserva el resto del cliente (lotes, cache, límite de tasa y reintentos).
+    """
+
+    answer = "Respuesta simulada basada en los documentos recuperados. " * 8
+
+    def __init__(
+        self,
+        embed_latency: float = 0.05,
+        generate_latency: float = 0.3,
+        first_token_latency: float = 0.1,
+        error_rate: float = 0.0,
+        jitter: float = 0.1,
+        seed: int = 0,
+        use_cache: bool = False
+    ):
+        # Un modelo inyectado evita configurar el SDK y pedir GEMINI_API_KEY
+        super().__init__(model=FakeStreamingModel())
+        if not use_cache:
+            self.embedding_cache = None
+        self.embed_latency = embed_latency
+        self.generate_latency = generate_latency
+        self.first_token_latency = first_token_latency
+        self.faults = FaultInjector(error_rate, jitter, seed)
+
+    async def _send_embed_one(self, text: str, task_type: str) -> List[float]:
+        await self.faults.wait(self.embed_latency)
+        return fake_embedding(text, config.EMBED_DIM)
+
+    async def _send_embed_batch(self, texts: List[str], task_type: str) -> List[List[float]]:
+        await self.faults.wait(self.embed_latency)
+        return [fake_embedding(text, config.EMBED_DIM) for text in texts]
+
+    async def _send_generate(self, prompt: str) -> str:
+        await self.faults.wait(self.generate_latency)
+        return self.answer
+
+    async def _send_stream(self, prompt: str):
+        await self.faults.wait(self.first_token_latency)
+        words = self.answer.split(' ')
+        pieces = [' '.join(words[i:i + 4]) + ' ' for i in range(0, len(words), 4)]
+        delay = max(self.generate_latency - self.first_token_latency, 0) / len(pieces)
+        for index, piece in enumerate(pieces):
+            if index:
+                await asyncio.sleep(delay)
+            yield piece
+
+
+class FakeSupabaseClient(SupabaseClient):
+    """
+    SupabaseClient con jp_documents en memoria. match_documents calcula la
+    similitud coseno con numpy, como la función SQL del proyecto.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.02,
+        error_rate: float = 0.0,
+        jitter: float = 0.1,
+        seed: int = 0
+    ):
+        # Sin super().__init__: no se necesitan credenciales ni SDK
+        self.client = None
+        self._http = None
+        self.local_index = None
+        self.embedding_store = None
+        self._store_lock = asyncio.Lock()
+        self._has_dedup_columns = True
+        self.lexical_index = BM25Index(config.BM25_K1, config.BM25_B) if config.BM25_ENABLED else None
+        self._lexical_rebuild = None
+        self._lexical_pending = None
+        self._local_rebuild = None
+        self._local_pending = None
+        self.latency = latency
+        self.faults = FaultInjector(error_rate, jitter, seed)
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self._next_id = 1
+        self._matrix = None
+
+    async def _insert(self, data: Any) -> List[Dict[str, Any]]:
+        await self.faults.wait(self.latency)
+        inserted = []
+        for row in data if isinstance(data, list) else [data]:
+            stored = {**row, 'id': self._next_id}
+            self.rows[self._next_id] = stored
+            self._next_id += 1
+            inserted.append(stored)
+        self._matrix = None
+        return inserted
+
+    async def _update(self, row_id: Any, values: Dict[str, Any]) -> List[Dict[str, Any]]:
+        await self.faults.wait(self.latency)
+        if row_id not in self.rows:
+            return []
+        self.rows[row_id].update(values)
+        self._matrix = None
+        return [{'id': row_id}]
+
+    def _similarity_matrix(self):
+        import numpy as np
+
+        if self._matrix is None:
+            ids = list(self.rows)
+            matrix = np.array([self.rows[i]['embedding'] for i in ids], dtype=np.float32)
+            if ids:
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            self._matrix = (ids, matrix)
+        return self._matrix
+
+    async def _rpc(self, function: str, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        import numpy as np
+
+        await self.faults.wait(self.latency)
+        if function != 'match_documents':
+            raise ValueError(f"Función RPC no simulada: {function}")
+        ids, matrix = self._similarity_matrix()
+        if not ids:
+            return []
+        query = np.asarray(payload['query_embedding'], dtype=np.float32)
+        scores = matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        order = np.argsort(-scores)[:payload['match_count']]
+        return [
+            {'id': ids[i], 'content': self.rows[ids[i]]['content'], 'similarity': float(scores[i])}
+            for i in order if scores[i] > payload['match_threshold']
+        ]
+
+    async def _select(
+        self,
+        columns: str,
+        after_id: Any = None,
+        limit: Optional[int] = None,
+        eq: Optional[Dict[str, Any]] = None,
+        in_: Optional[Dict[str, List[Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        await self.faults.wait(self.latency)
+        names = [name.strip() for name in columns.split(',')]
+        allowed = {column: set(values) for column, values in (in_ or {}).items()}
+        result = []
+        for row_id in sorted(self.rows):
+            row = self.rows[row_id]
+            if after_id is not None and row_id <= after_id:
+                continue
+            if any(row.get(column) != value for column, value in (eq or {}).items()):
+                continue
+            if any(row.get(column) not in values for column, values in allowed.items()):
+                continue
+            result.append({name: row.get(name) for name in names})
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+    async def _delete(self, ids: List[Any]) -> List[Dict[str, Any]]:
+        await self.faults.wait(self.latency)
+        deleted = [self.rows.pop(row_id) for row_id in ids if row_id in self.rows]
+        self._matrix = None
+        return deleted
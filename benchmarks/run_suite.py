@@ -0,0 +1,300 @@
+"""
+Suite de benchmarks sin red: chunker, latencia por herramienta, ingesta y
+escalado con la concurrencia, usando dobles locales de Gemini y Supabase
+
+Los resultados se emiten como JSON para comparar corridas entre sí.
+
+Uso:
+    python -m benchmarks.run_suite [--output resultados.json] [--compare base.json]
+    python -m benchmarks.run_suite --quick --error-rate 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List
+
+import main as legacy_main
+import src.main as server
+from benchmarks.fakes import FakeGeminiClient, FakeSupabaseClient
+from src.chunking import iter_chunks
+from src.config import config
+from src.metrics import metrics
+
+WORDS = (
+    "experiencia proyecto desarrollo datos modelo sistema equipo python servicio "
+    "arquitectura nube análisis producto diseño pruebas rendimiento usuarios api"
+).split()
+
+
+def synthetic_text(chars: int, seed: int = 0) -> str:
+    """Texto pseudoaleatorio determinista con frases y párrafos"""
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < chars:
+        sentence = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize()
+        sentence += '.\n\n' if rng.random() < 0.15 else '. '
+        parts.append(sentence)
+        size += len(sentence)
+    return ''.join(parts)[:chars]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 y media en milisegundos"""
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return {'n': len(samples), 'mean_ms': value, 'p50_ms': value, 'p95_ms': value, 'p99_ms': value}
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {
+        'n': len(samples),
+        'mean_ms': statistics.fmean(samples) * 1000,
+        'p50_ms': cuts[49] * 1000,
+        'p95_ms': cuts[94] * 1000,
+        'p99_ms': cuts[98] * 1000
+    }
+
+
+async def timed_calls(call: Callable[[int], Awaitable[Any]], count: int, concurrency: int) -> Dict[str, Any]:
+    """Ejecuta count llamadas con concurrency en vuelo; latencias y throughput"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(index: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await call(index)
+                if isinstance(result, str) and result.lstrip().startswith(('Error', '❌')):
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    elapsed = time.perf_counter() - start
+    return {**percentiles(latencies), 'errors': errors, 'calls_per_s': count / elapsed}
+
+
+def bench_chunker(size_chars: int) -> Dict[str, Any]:
+    text = synthetic_text(size_chars)
+    report = {}
+    for unit, chunk_size, overlap in (('chars', 500, 50), ('tokens', 120, 12)):
+        start = time.perf_counter()
+        chunks = sum(1 for _ in iter_chunks(text, chunk_size, overlap, unit=unit))
+        elapsed = time.perf_counter() - start
+        report[unit] = {
+            'chunks': chunks,
+            'mb_per_s': size_chars / elapsed / 1e6,
+            'chunks_per_s': chunks / elapsed
+        }
+    return report
+
+
+def install_fakes(args: argparse.Namespace) -> Dict[str, Any]:
+    """Sustituye los clientes globales de los servidores por los dobles locales"""
+    gemini = FakeGeminiClient(
+        embed_latency=args.embed_latency,
+        generate_latency=args.generate_latency,
+        first_token_latency=args.first_token_latency,
+        error_rate=args.error_rate,
+        seed=args.seed
+    )
+    supabase = FakeSupabaseClient(latency=args.db_latency, error_rate=args.error_rate, seed=args.seed)
+    for client in (gemini, supabase):
+        client.faults.tail_rate = args.tail_rate
+        client.faults.tail_latency = args.tail_latency
+    for module in (server, legacy_main):
+        module.gemini_client = gemini
+        module.supabase_client = supabase
+    return {'gemini': gemini, 'supabase': supabase}
+
+
+async def bench_ingest(docs: int, doc_chars: int, concurrency: int) -> Dict[str, Any]:
+    texts = [synthetic_text(doc_chars, seed=1000 + i) for i in range(docs)]
+    result = await timed_calls(
+        lambda i: server.store_document(texts[i], document_key=f"bench-{i}"),
+        docs,
+        concurrency
+    )
+    chunks = sum(sum(1 for _ in iter_chunks(text)) for text in texts)
+    seconds = docs / result['calls_per_s']
+    return {**result, 'docs_per_s': result['calls_per_s'], 'chunks_per_s': chunks / seconds}
+
+
+def query_text(index: int) -> str:
+    """
+    Consulta distinta por llamada (se mide el trabajo real, no la coalescencia)
+    con palabras del corpus, para que la búsqueda encuentre documentos
+    """
+    rng = random.Random(index)
+    return ' '.join(rng.choice(WORDS) for _ in range(10)) + f" {index}"
+
+
+def tool_calls() -> Dict[str, Callable[[int], Awaitable[Any]]]:
+    return {
+        'search_documents': lambda i: legacy_main.search_documents(query_text(i)),
+        'generate_response': lambda i: server.generate_response(query_text(i))
+    }
+
+
+async def bench_batch(count: int) -> Dict[str, Any]:
+    """Herramientas por lote con un conjunto de evaluación de `count` preguntas"""
+    report = {}
+    for name, tool in (
+        ('search_documents_batch', server.search_documents_batch),
+        ('generate_responses_batch', server.generate_responses_batch)
+    ):
+        queries = [query_text(900000 + len(report) * count + i) for i in range(count)]
+        start = time.perf_counter()
+        items = json.loads(await tool(queries))
+        elapsed = time.perf_counter() - start
+        report[name] = {
+            'queries': count,
+            'errors': sum(1 for item in items if 'error' in item),
+            'total_ms': elapsed * 1000,
+            'queries_per_s': count / elapsed
+        }
+    return report
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    fakes = install_fakes(args)
+    report: Dict[str, Any] = {'chunker': bench_chunker(args.chunker_chars)}
+
+    report['ingest'] = await bench_ingest(args.ingest_docs, args.doc_chars, args.ingest_concurrency)
+    report['corpus_rows'] = len(fakes['supabase'].rows)
+
+    report['latency'] = {
+        'store_document': await timed_calls(
+            lambda i: server.store_document(synthetic_text(args.doc_chars, seed=5000 + i)),
+            args.samples, 1
+        )
+    }
+    for name, call in tool_calls().items():
+        report['latency'][name] = await timed_calls(call, args.samples, 1)
+
+    report['scaling'] = {}
+    for name, call in tool_calls().items():
+        levels = []
+        for concurrency in args.concurrency:
+            result = await timed_calls(
+                lambda i, c=concurrency: call(c * 100000 + i),
+                max(concurrency * args.calls_per_level, args.samples),
+                concurrency
+            )
+            levels.append({'concurrency': concurrency, **result})
+        report['scaling'][name] = levels
+
+    report['batch'] = await bench_batch(args.batch_queries)
+
+    # Desglose por etapa registrado por el propio servidor durante toda la corrida
+    report['stages'] = metrics.snapshot()['stages']
+    report['injected_errors'] = {
+        'gemini': fakes['gemini'].faults.errors,
+        'supabase': fakes['supabase'].faults.errors
+    }
+    return report
+
+
+def metadata(args: argparse.Namespace) -> Dict[str, Any]:
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+    }
+
+
+def flatten(data: Any, prefix: str = '') -> Dict[str, float]:
+    """Hojas numéricas de un reporte con claves tipo 'latency.search_documents.p95_ms'"""
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, list):
+        items = ((str(item.get('concurrency', index)), item) for index, item in enumerate(data))
+    else:
+        return {prefix: data} if isinstance(data, (int, float)) and not isinstance(data, bool) else {}
+    flat = {}
+    for key, value in items:
+        flat.update(flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Cambio relativo de cada métrica respecto a una corrida anterior"""
+    now, before = flatten(current), flatten(baseline['results'])
+    return {
+        key: {'baseline': before[key], 'current': now[key], 'change': now[key] / before[key] - 1}
+        for key in sorted(now.keys() & before.keys())
+        if before[key] and (key.endswith(('_ms', '_per_s')))
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', help='archivo donde guardar el JSON (default: stdout)')
+    parser.add_argument('--compare', help='JSON de una corrida anterior para calcular cambios')
+    parser.add_argument('--quick', action='store_true', help='menos muestras y niveles de concurrencia')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--samples', type=int, default=50, help='llamadas por herramienta para percentiles')
+    parser.add_argument('--concurrency', default='1,2,4,8,16,32,64,128,256')
+    parser.add_argument('--calls-per-level', type=int, default=2)
+    parser.add_argument('--chunker-chars', type=int, default=5_000_000)
+    parser.add_argument('--ingest-docs', type=int, default=20)
+    parser.add_argument('--doc-chars', type=int, default=20_000)
+    parser.add_argument('--ingest-concurrency', type=int, default=4)
+    parser.add_argument('--embed-latency', type=float, default=0.05)
+    parser.add_argument('--generate-latency', type=float, default=0.3)
+    parser.add_argument('--first-token-latency', type=float, default=0.1)
+    parser.add_argument('--db-latency', type=float, default=0.02)
+    parser.add_argument('--batch-queries', type=int, default=500, help='preguntas del lote de evaluación')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='probabilidad de error por request')
+    parser.add_argument('--tail-rate', type=float, default=0.0, help='fracción de requests lentos (cola)')
+    parser.add_argument('--tail-latency', type=float, default=1.0, help='segundos de un request lento')
+    args = parser.parse_args()
+
+    if args.quick:
+        args.samples, args.concurrency = 20, '1,8,64'
+        args.chunker_chars, args.ingest_docs = 1_000_000, 5
+        args.batch_queries = 100
+    args.concurrency = [int(level) for level in args.concurrency.split(',')]
+
+    # Resultados comparables: sin caches entre llamadas y sin esperas largas en reintentos
+    config.ANSWER_CACHE_ENABLED = False
+    config.GEMINI_RETRY_BASE_DELAY = min(config.GEMINI_RETRY_BASE_DELAY, 0.05)
+
+    # Los logs de los clientes van a stderr para que stdout sea JSON válido
+    with contextlib.redirect_stdout(sys.stderr):
+        results = asyncio.run(run(args))
+
+    report = {'meta': metadata(args), 'results': results}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            report['comparison'] = compare(results, json.load(handle))
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
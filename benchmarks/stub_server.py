@@ -0,0 +1,90 @@
+"""
+Servidor HTTP local que imita las APIs REST de Gemini y PostgREST de Supabase,
+para pruebas de carga del transporte asíncrono sin red ni credenciales
+
+Uso:
+    python -m benchmarks.stub_server [--port 8765] [--latency-ms 50]
+
+Y en el servidor MCP:
+    ASYNC_HTTP_ENABLED=true GEMINI_API_BASE=http://127.0.0.1:8765 SUPABASE_URL=http://127.0.0.1:8765
+"""
+import argparse
+import asyncio
+import itertools
+import json
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from benchmarks.fakes import fake_embedding
+
+
+def create_app(latency_ms: float = 50.0, dim: int = 768) -> Starlette:
+    latency = latency_ms / 1000
+    ids = itertools.count(1)
+
+    async def gemini(request: Request) -> Response:
+        await asyncio.sleep(latency)
+        method = request.path_params['path'].rsplit(':', 1)[-1]
+        body = await request.json()
+
+        if method == 'embedContent':
+            text = body['content']['parts'][0]['text']
+            return JSONResponse({'embedding': {'values': fake_embedding(text, dim)}})
+        if method == 'batchEmbedContents':
+            return JSONResponse({'embeddings': [
+                {'values': fake_embedding(item['content']['parts'][0]['text'], dim)}
+                for item in body['requests']
+            ]})
+
+        answer = {'candidates': [{'content': {'parts': [{'text': 'Respuesta simulada.'}]}}]}
+        if method == 'generateContent':
+            return JSONResponse(answer)
+        if method == 'streamGenerateContent':
+            async def events():
+                for word in ('Respuesta ', 'simulada ', 'en ', 'streaming.'):
+                    chunk = {'candidates': [{'content': {'parts': [{'text': word}]}}]}
+                    yield f"data: {json.dumps(chunk)}\r\n\r\n"
+                    await asyncio.sleep(latency / 4)
+            return StreamingResponse(events(), media_type='text/event-stream')
+        return JSONResponse({'error': f'método no soportado: {method}'}, status_code=404)
+
+    async def rpc(request: Request) -> Response:
+        await asyncio.sleep(latency)
+        payload = await request.json()
+        count = min(int(payload.get('match_count', 5)), 5)
+        return JSONResponse([
+            {'id': i + 1, 'content': f'Documento simulado {i + 1}', 'similarity': 0.9 - i * 0.05}
+            for i in range(count)
+        ])
+
+    async def table(request: Request) -> Response:
+        await asyncio.sleep(latency)
+        if request.method == 'POST':
+            rows = await request.json()
+            rows = rows if isinstance(rows, list) else [rows]
+            return JSONResponse([{**row, 'id': next(ids)} for row in rows], status_code=201)
+        return JSONResponse([])
+
+    return Starlette(routes=[
+        Route('/v1beta/{path:path}', gemini, methods=['POST']),
+        Route('/rest/v1/rpc/{function}', rpc, methods=['POST']),
+        Route('/rest/v1/{table}', table, methods=['GET', 'POST', 'DELETE'])
+    ])
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms), host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
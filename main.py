@@ -2,6 +2,7 @@
 Servidor FastMCP para búsqueda semántica con Gemini y Supabase
 Entry point para FastMCP Cloud deployment
 """
+import json
 import os
 import sys
 
@@ -12,10 +13,63 @@ from fastmcp import FastMCP
 from src.gemini import gemini_client
 from src.supabase_client import supabase_client
 from src.config import config
+from src.chunking import iter_chunks
+from src.ingest import format_ingest_summary, ingest_chunks, notify_corpus_changed
+from src.singleflight import SingleFlight, make_key
+from src.metrics import metrics
+from src.batch import check_queries, search_batch
+from src.hedging import hedged
+from src.hybrid import hybrid_search
 
 # Crear servidor FastMCP
 mcp = FastMCP("JpChatbotMCP")
 
+# Búsquedas idénticas en curso comparten un solo embedding y una sola consulta
+_flights = SingleFlight()
+
+_answer_cache = None
+_answer_cache_loaded = False
+
+
+def _corpus_changed(result: dict) -> None:
+    """
+    Mismo hook que src.main después de una ingesta: este entry point no tiene
+    cache de respuestas ni router propios, pero invalida el cache compartido
+    (ANSWER_CACHE_PATH) y reconstruye sus índices locales
+    """
+    global _answer_cache, _answer_cache_loaded
+    if not _answer_cache_loaded:
+        _answer_cache_loaded = True
+        # Import diferido: el cache usa numpy
+        from src.answer_cache import open_shared_cache
+        _answer_cache = open_shared_cache()
+    notify_corpus_changed(result, supabase_client, _answer_cache)
+
+
+async def _search(query: str, limit: int, threshold: float) -> list:
+    # Deadline por etapa y hedge tras el p95 reciente de cada una
+    def embed():
+        return hedged(
+            'embed',
+            lambda: gemini_client.generate_embedding(query),
+            config.EMBED_TIMEOUT or None
+        )
+
+    def vector_search(embedding: list, count: int):
+        return hedged(
+            'search',
+            lambda: supabase_client.search_similar_documents(
+                embedding=embedding,
+                limit=count,
+                threshold=threshold
+            ),
+            config.SEARCH_TIMEOUT or None
+        )
+
+    # BM25 local primero; el embedding solo se pide si la coincidencia léxica no es clara
+    documents, _ = await hybrid_search(query, supabase_client, embed, vector_search, limit, threshold)
+    return documents
+
 @mcp.tool()
 async def search_documents(
     query: str,
@@ -40,15 +94,12 @@ async def search_documents(
         threshold = config.SIMILARITY_THRESHOLD
     
     try:
-        # Generar embedding de la consulta
-        embedding = await gemini_client.generate_embedding(query)
-        
-        # Buscar documentos similares
-        documents = await supabase_client.search_similar_documents(
-            embedding=embedding,
-            limit=limit,
-            threshold=threshold
-        )
+        # Generar embedding de la consulta y buscar documentos similares
+        with metrics.span('tool.search_documents'):
+            documents = await _flights.do(
+                make_key('search_documents', query, limit, threshold),
+                lambda: _search(query, limit, threshold)
+            )
         
         if not documents:
             return "No se encontraron documentos similares para la consulta."
@@ -56,13 +107,15 @@ async def search_documents(
         # Formatear resultados
         result = f"📚 Encontrados {len(documents)} documentos similares:\n\n"
         for i, doc in enumerate(documents, 1):
-            similarity = doc.get('similarity', 0)
+            similarity = doc.get('similarity')
             title = doc.get('title', 'Sin título')
             scope = doc.get('scope', 'N/A')
             content = doc.get('content', '')[:200] + '...'
             source = doc.get('source_url', 'N/A')
+            # Los resultados solo léxicos no tienen similitud coseno
+            score = f"Similitud: {similarity:.2%}" if similarity is not None else f"BM25: {doc.get('bm25', 0):.2f}"
             
-            result += f"{i}. **{title}** (Similitud: {similarity:.2%})\n"
+            result += f"{i}. **{title}** ({score})\n"
             result += f"   - Ámbito: {scope}\n"
             result += f"   - Contenido: {content}\n"
             result += f"   - Fuente: {source}\n\n"
@@ -74,108 +127,80 @@ async def search_documents(
 
 
 @mcp.tool()
-async def store_document(content: str, chunk_size: int = 500, chunk_overlap: int = 50) -> str:
+async def search_documents_batch(
+    queries: list[str],
+    limit: int = None,
+    threshold: float = None
+) -> str:
     """
-    Almacena un documento dividiéndolo en chunks óptimos para RAG y generando embeddings.
+    Busca documentos similares para una lista de consultas con un solo paso de
+    embeddings por lotes y una búsqueda vectorizada.
     
     Args:
-        content: Contenido del documento a almacenar
-        chunk_size: Tamaño máximo de cada chunk en caracteres (default: 500)
-        chunk_overlap: Superposición entre chunks para mantener contexto (default: 50)
+        queries: Consultas de búsqueda en lenguaje natural
+        limit: Número máximo de documentos por consulta (default del config)
+        threshold: Umbral de similitud 0-1 (default del config)
     
     Returns:
-        Resultado de la operación con los IDs de los chunks creados
+        JSON con un elemento por consulta, en el mismo orden:
+        {"index", "query", "documents"} o {"index", "query", "error"}
     """
     try:
-        # Dividir el contenido en chunks
-        chunks = _split_into_chunks(content, chunk_size, chunk_overlap)
-        
-        stored_chunks = []
-        errors = []
-        
-        # Procesar cada chunk
-        for i, chunk in enumerate(chunks, 1):
-            try:
-                # Generar embedding del chunk
-                embedding = await gemini_client.generate_embedding(chunk)
-                
-                # Almacenar en la base de datos
-                result = await supabase_client.store_embedding(chunk, embedding)
-                
-                if result['success']:
-                    stored_chunks.append({
-                        'chunk_id': i,
-                        'doc_id': result['id'],
-                        'size': len(chunk)
-                    })
-                else:
-                    errors.append(f"Chunk {i}: {result['message']}")
-                    
-            except Exception as e:
-                errors.append(f"Chunk {i}: {str(e)}")
-        
-        # Formatear resultado
-        if stored_chunks:
-            result = f" Documento almacenado exitosamente\n"
-            result += f" Total de chunks: {len(chunks)}\n"
-            result += f" Chunks almacenados: {len(stored_chunks)}\n"
-            if errors:
-                result += f"❌ Errores: {len(errors)}\n"
-            result += f"\n Detalles:\n"
-            for chunk_info in stored_chunks[:5]:  # Mostrar primeros 5
-                result += f"   - Chunk {chunk_info['chunk_id']}: ID {chunk_info['doc_id']} ({chunk_info['size']} chars)\n"
-            if len(stored_chunks) > 5:
-                result += f"   ... y {len(stored_chunks) - 5} chunks más\n"
-            
-            if errors:
-                result += f"\n Errores encontrados:\n"
-                for error in errors[:3]:
-                    result += f"   - {error}\n"
-            
-            return result
-        else:
-            return f" No se pudo almacenar ningún chunk. Errores: {'; '.join(errors)}"
+        check_queries(queries)
+        with metrics.span('tool.search_documents_batch'):
+            results = await search_batch(
+                queries,
+                gemini_client,
+                supabase_client,
+                limit if limit is not None else config.TOPK_DOCUMENTS,
+                threshold if threshold is not None else config.SIMILARITY_THRESHOLD
+            )
+        return json.dumps(results, ensure_ascii=False, default=str)
         
     except Exception as e:
-        return f" Error: {str(e)}"
+        return f"❌ Error en la búsqueda por lote: {str(e)}"
 
 
-def _split_into_chunks(text: str, chunk_size: int = 500, overlap: int = 50) -> list[str]:
+@mcp.tool()
+async def store_document(
+    content: str,
+    chunk_size: int = 500,
+    chunk_overlap: int = 50,
+    document_key: str = None,
+    delete_removed: bool = False,
+    chunk_unit: str = "chars"
+) -> str:
     """
-    Divide un texto en chunks con superposición.
+    Almacena un documento dividiéndolo en chunks óptimos para RAG y generando embeddings.
+    Los chunks que ya existen (misma huella de contenido) no se vuelven a procesar.
     
     Args:
-        text: Texto a dividir
-        chunk_size: Tamaño máximo de cada chunk
-        overlap: Superposición entre chunks
-        
+        content: Contenido del documento a almacenar
+        chunk_size: Tamaño máximo de cada chunk en caracteres (default: 500)
+        chunk_overlap: Superposición entre chunks para mantener contexto (default: 50)
+        document_key: Identificador del documento (p. ej. "cv") para re-ingestas incrementales
+        delete_removed: Eliminar los chunks del documento que ya no aparecen en el contenido
+        chunk_unit: Unidad de chunk_size y chunk_overlap: "chars" o "tokens" (aproximados)
+    
     Returns:
-        Lista de chunks de texto
+        Resultado de la operación con los chunks reutilizados, agregados y eliminados
     """
-    if len(text) <= chunk_size:
-        return [text]
-    
-    chunks = []
-    start = 0
-    
-    while start < len(text):
-        end = start + chunk_size
+    try:
+        # Dividir el contenido en chunks (de forma perezosa: el embedding empieza con el primero)
+        chunks = iter_chunks(content, chunk_size, chunk_overlap, unit=chunk_unit)
         
-        # Si no es el último chunk, buscar el último punto o salto de línea
-        if end < len(text):
-            # Buscar el último separador natural (punto, salto de línea, etc.)
-            last_period = text.rfind('.', start, end)
-            last_newline = text.rfind('\n', start, end)
-            last_separator = max(last_period, last_newline)
-            
-            if last_separator > start + chunk_size // 2:
-                end = last_separator + 1
+        # Embeddings e inserts corren como etapas de un pipeline con colas acotadas
+        result = await ingest_chunks(
+            chunks,
+            gemini_client,
+            supabase_client,
+            document_key=document_key,
+            delete_removed=delete_removed
+        )
         
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
+        _corpus_changed(result)
         
-        # Mover el inicio con overlap
-        start = end - overlap if end < len(text) else end
-    
-    return chunks
+        return format_ingest_summary(result)
+        
+    except Exception as e:
+        return f" Error: {str(e)}"
@@ -8,16 +8,10 @@ __description__ = "Servidor MCP para aprender"
 
 from .config import config
 
-# Importaciones opcionales para evitar errores de startup
-try:
-    from .gemini import gemini_client
-except Exception:
-    gemini_client = None
-
-try:
-    from .supabase_client import supabase_client
-except Exception:
-    supabase_client = None
+# Los clientes son proxies perezosos: importar el paquete no carga los SDKs
+# ni abre conexiones; eso ocurre en el primer uso (o en el warm-up)
+from .gemini import gemini_client
+from .supabase_client import supabase_client
 
 # NO importar main en __init__ para evitar warning de runpy
 # main se importará directamente cuando se ejecute python -m src.main
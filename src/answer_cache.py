@@ -0,0 +1,244 @@
+"""
+Cache semántico de respuestas generadas, indexado por el embedding de la consulta
+"""
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from .config import config
+
+try:
+    import numpy as np
+except ImportError:  # sin numpy el cache de respuestas queda desactivado
+    np = None
+
+
+class SemanticAnswerCache:
+    """
+    Reutiliza la respuesta de una consulta previa cuando la similitud coseno
+    entre embeddings supera el umbral. Cada entrada queda ligada a la versión
+    del corpus con la que se generó; al almacenar documentos nuevos la versión
+    cambia y las respuestas anteriores dejan de servirse.
+
+    Con path, las respuestas y la versión del corpus se comparten por SQLite
+    entre los procesos del servidor: cada uno mantiene su matriz en memoria y
+    antes de cada consulta carga las filas que agregaron los demás.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        max_size: int = 256,
+        ttl: float = 3600,
+        threshold: float = 0.95,
+        path: Optional[str] = None
+    ):
+        """
+        Args:
+            dim: Dimensiones del embedding de la consulta
+            max_size: Número máximo de respuestas guardadas
+            ttl: Segundos que una respuesta es válida (0 = sin expiración)
+            threshold: Similitud coseno mínima para reutilizar una respuesta
+            path: Archivo SQLite compartido entre procesos (opcional)
+        """
+        if np is None:
+            raise RuntimeError("numpy no está instalado")
+        self.dim = dim
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.threshold = threshold
+        self.corpus_version = 0
+
+        self._matrix = np.zeros((self.max_size, dim), dtype=np.float32)
+        self._valid = np.zeros(self.max_size, dtype=bool)
+        self._answers: List[Optional[str]] = [None] * self.max_size
+        self._created_at = [0.0] * self.max_size
+        self._last_used = [0.0] * self.max_size
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._last_row = 0
+        if path:
+            self._open_db(path)
+
+    @staticmethod
+    def available() -> bool:
+        return np is not None
+
+    def _normalize(self, embedding: Sequence[float]) -> Optional["np.ndarray"]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.shape != (self.dim,):
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _open_db(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS answers ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, '
+                'corpus_version INTEGER NOT NULL, vector BLOB NOT NULL, answer TEXT NOT NULL)'
+            )
+            self._db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            self._db.execute("INSERT OR IGNORE INTO meta VALUES ('corpus_version', 0)")
+        self._sync()
+
+    def _sync(self) -> None:
+        """Adopta la versión del corpus compartida y carga las respuestas nuevas"""
+        if self._db is None:
+            return
+        version = self._db.execute("SELECT value FROM meta WHERE key = 'corpus_version'").fetchone()[0]
+        if version != self.corpus_version:
+            self._invalidate()
+            self.corpus_version = version
+        rows = self._db.execute(
+            'SELECT id, created_at, corpus_version, vector, answer FROM answers WHERE id > ? ORDER BY id',
+            (self._last_row,)
+        ).fetchall()
+        for row_id, created_at, row_version, blob, answer in rows[-self.max_size:]:
+            # Filas de otra dimensión (EMBED_DIM cambió tras una migración) se ignoran
+            if row_version == self.corpus_version and len(blob) == self.dim * 4:
+                self._put(np.frombuffer(blob, dtype=np.float32), answer, created_at)
+        if rows:
+            self._last_row = rows[-1][0]
+
+    def _invalidate(self) -> None:
+        self.invalidations += int(self._valid.sum())
+        self._valid[:] = False
+        self._answers = [None] * self.max_size
+
+    def bump_corpus_version(self) -> int:
+        """Invalida todas las respuestas; se llama cuando cambia la base de conocimiento"""
+        if self._db is None:
+            self.corpus_version += 1
+            self._invalidate()
+            return self.corpus_version
+        with self._db:
+            self._db.execute("UPDATE meta SET value = value + 1 WHERE key = 'corpus_version'")
+            version = self._db.execute("SELECT value FROM meta WHERE key = 'corpus_version'").fetchone()[0]
+            self._db.execute('DELETE FROM answers WHERE corpus_version < ?', (version,))
+        self._sync()
+        return self.corpus_version
+
+    def lookup(self, embedding: Sequence[float]) -> Optional[str]:
+        """Devuelve la respuesta de la consulta cacheada más parecida, si supera el umbral"""
+        self._sync()
+        query = self._normalize(embedding)
+        if query is None or not self._valid.any():
+            self.misses += 1
+            return None
+
+        now = time.time()
+        if self.ttl:
+            expired = self._valid & (now - np.asarray(self._created_at) > self.ttl)
+            self._valid[expired] = False
+
+        scores = self._matrix @ query
+        scores[~self._valid] = -1.0
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            self.misses += 1
+            return None
+
+        self._last_used[best] = now
+        self.hits += 1
+        return self._answers[best]
+
+    def store(
+        self,
+        embedding: Sequence[float],
+        answer: str,
+        corpus_version: Optional[int] = None
+    ) -> bool:
+        """
+        Guarda una respuesta generada
+
+        Args:
+            embedding: Embedding de la consulta
+            answer: Respuesta generada por el modelo
+            corpus_version: Versión del corpus al iniciar la generación; si el
+                corpus cambió mientras tanto la respuesta no se guarda
+
+        Returns:
+            True si la respuesta quedó en el cache
+        """
+        self._sync()
+        if corpus_version is not None and corpus_version != self.corpus_version:
+            return False
+        vector = self._normalize(embedding)
+        if vector is None or not answer:
+            return False
+
+        if self._db is not None:
+            # La fila vuelve a este proceso (y a los demás) en el próximo _sync
+            with self._db:
+                self._db.execute(
+                    'INSERT INTO answers (created_at, corpus_version, vector, answer) VALUES (?, ?, ?, ?)',
+                    (time.time(), self.corpus_version, vector.tobytes(), answer)
+                )
+                self._db.execute(
+                    'DELETE FROM answers WHERE id <= (SELECT MAX(id) FROM answers) - ?',
+                    (self.max_size,)
+                )
+            self._sync()
+            return True
+
+        self._put(vector, answer, time.time())
+        return True
+
+    def _put(self, vector: "np.ndarray", answer: str, created_at: float) -> None:
+        free = np.flatnonzero(~self._valid)
+        if free.size:
+            slot = int(free[0])
+        else:
+            # Desalojar la respuesta usada menos recientemente
+            slot = min(range(self.max_size), key=self._last_used.__getitem__)
+            self.evictions += 1
+
+        self._matrix[slot] = vector
+        self._valid[slot] = True
+        self._answers[slot] = answer
+        self._created_at[slot] = created_at
+        self._last_used[slot] = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores del cache de respuestas"""
+        lookups = self.hits + self.misses
+        return {
+            'size': int(self._valid.sum()),
+            'max_size': self.max_size,
+            'threshold': self.threshold,
+            'corpus_version': self.corpus_version,
+            'shared': self._db is not None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+
+def open_shared_cache() -> Optional[SemanticAnswerCache]:
+    """
+    Cache de respuestas compartido en ANSWER_CACHE_PATH, para los procesos que
+    cambian el corpus sin responder preguntas (entry point raíz, migración).
+    None si el cache está desactivado, no tiene path compartido o falta numpy
+    """
+    if not (config.ANSWER_CACHE_ENABLED and config.ANSWER_CACHE_PATH) or not SemanticAnswerCache.available():
+        return None
+    return SemanticAnswerCache(
+        dim=config.EMBED_DIM,
+        max_size=config.ANSWER_CACHE_SIZE,
+        ttl=config.ANSWER_CACHE_TTL,
+        threshold=config.ANSWER_CACHE_THRESHOLD,
+        path=config.ANSWER_CACHE_PATH
+    )
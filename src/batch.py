@@ -0,0 +1,114 @@
+"""
+Consultas por lote: embeddings en requests agrupados, búsqueda vectorizada y
+ejecución concurrente acotada, con resultados en el orden de entrada
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .config import config
+from .log import get_logger
+from .metrics import metrics
+
+logger = get_logger(__name__)
+
+
+def check_queries(queries: List[str]) -> None:
+    """Valida el lote antes de gastar cuota; lanza ValueError si no es válido"""
+    if not isinstance(queries, list) or not queries:
+        raise ValueError("queries debe ser una lista no vacía de consultas")
+    if len(queries) > config.BATCH_MAX_QUERIES:
+        raise ValueError(
+            f"El lote tiene {len(queries)} consultas; el máximo es {config.BATCH_MAX_QUERIES}"
+        )
+
+
+def error_item(index: int, query: Any, error: BaseException) -> Dict[str, Any]:
+    return {'index': index, 'query': query, 'error': str(error) or type(error).__name__}
+
+
+async def search_batch(
+    queries: List[str],
+    gemini_client: Any,
+    supabase_client: Any,
+    limit: int,
+    threshold: float
+) -> List[Dict[str, Any]]:
+    """
+    Busca documentos para muchas consultas
+
+    Args:
+        queries: Consultas en lenguaje natural
+        gemini_client: Cliente de embeddings (GeminiClient)
+        supabase_client: Cliente de búsqueda (SupabaseClient)
+        limit: Documentos por consulta
+        threshold: Umbral de similitud
+
+    Returns:
+        Un dict por consulta, en el orden de entrada: {'index', 'query',
+        'documents'} o {'index', 'query', 'error'}
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+    valid: List[int] = []
+    for index, query in enumerate(queries):
+        if isinstance(query, str) and query.strip():
+            valid.append(index)
+        else:
+            results[index] = error_item(index, query, ValueError("consulta vacía"))
+
+    with metrics.span('batch_query_embedding'):
+        embeddings = await gemini_client.generate_query_embeddings([queries[i] for i in valid])
+
+    searchable = []
+    for index, embedding in zip(valid, embeddings):
+        if isinstance(embedding, BaseException):
+            results[index] = error_item(index, queries[index], embedding)
+        else:
+            searchable.append((index, embedding))
+
+    if searchable:
+        found = await supabase_client.search_similar_documents_batch(
+            [embedding for _, embedding in searchable], limit, threshold
+        )
+        for (index, _), documents in zip(searchable, found):
+            results[index] = {'index': index, 'query': queries[index], 'documents': documents}
+
+    failed = sum(1 for item in results if 'error' in item)
+    metrics.inc('batch_queries_total', len(queries), tool='search')
+    if failed:
+        metrics.inc('batch_query_errors_total', failed, tool='search')
+    logger.info("Búsqueda por lote", extra={'queries': len(queries), 'errors': failed})
+    return results
+
+
+async def map_bounded(
+    items: List[Any],
+    worker: Callable[[int, Any], Awaitable[Any]],
+    concurrency: int,
+    on_done: Optional[Callable[[int], Awaitable[None]]] = None
+) -> List[Any]:
+    """
+    Ejecuta worker(index, item) para cada elemento con a lo sumo `concurrency`
+    en vuelo. Los errores quedan como excepción en su posición; on_done recibe
+    el número de elementos terminados (para reportar progreso).
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    done = 0
+
+    async def run(index: int, item: Any) -> Any:
+        nonlocal done
+        async with semaphore:
+            try:
+                return await worker(index, item)
+            finally:
+                done += 1
+                if on_done is not None:
+                    try:
+                        await on_done(done)
+                    except Exception:
+                        # El progreso es informativo: no debe tumbar el lote
+                        pass
+
+    return list(await asyncio.gather(
+        *(run(index, item) for index, item in enumerate(items)),
+        return_exceptions=True
+    ))
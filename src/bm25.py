@@ -0,0 +1,347 @@
+"""
+Índice léxico BM25 en memoria sobre el contenido de jp_documents: listas de
+postings en arrays compactos (número de documento y frecuencia por término),
+sin numpy. Sirve preguntas de palabras clave (una empresa, una tecnología)
+sin embedding de la consulta, y se fusiona con la búsqueda vectorial por RRF.
+"""
+import asyncio
+import bisect
+import heapq
+import math
+import re
+import time
+import unicodedata
+from array import array
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Palabras + sufijos de lenguajes como c++ o c#
+_WORD_RE = re.compile(r'[a-z0-9]+[+#]*')
+
+# Palabras vacías (español e inglés) que no aportan al ranking
+STOPWORDS = frozenset("""
+a al algo ante como con cual cuales cuando de del desde donde el ella ellas ellos en entre era es esa
+ese eso esta este esto fue ha han hay la las le les lo los mas me mi mis muy no nos o para pero por
+que quien se ser si sin sobre son su sus te tiene tu un una uno unos y ya yo
+an and are as at be by do does for from has have he his how i in is it its of on or that the their
+this to was what when where which who with you your
+""".split())
+
+# Tope de frecuencia por posting (array 'H', 16 bits)
+MAX_TF = 0xFFFF
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, sin acentos y sin palabras vacías"""
+    text = text.casefold()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    return [token for token in _WORD_RE.findall(text) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Índice invertido con puntaje BM25. Cada término tiene dos arrays paralelos
+    (documentos en 'I', frecuencias en 'H'); los documentos eliminados quedan
+    marcados y se purgan de los postings al compactar.
+    """
+
+    # Segundos a esperar antes de reintentar una carga fallida
+    RETRY_AFTER = 60.0
+    # Fracción de documentos eliminados que dispara la compactación
+    COMPACT_RATIO = 0.25
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._terms: Dict[str, int] = {}
+        self._docs: List[array] = []
+        self._tfs: List[array] = []
+        self._lengths = array('I')
+        self._alive = array('B')
+        self._ids: List[Any] = []
+        self._contents: List[Optional[str]] = []
+        self._positions: Dict[Any, int] = {}
+        self._total_length = 0
+        self._removed = 0
+        # k1 * (1 - b + b * longitud / promedio) por documento; se recalcula tras cada cambio
+        self._norms: Optional[array] = None
+        self.ready = False
+        # Instante (monotónico) de la última carga completa desde jp_documents
+        self.last_refresh: Optional[float] = None
+        # Marca para reconstruir con la próxima búsqueda sin esperar el intervalo
+        self.stale = False
+        self._lock = asyncio.Lock()
+        self._failed_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    # --- Escritura ---
+
+    def add(self, ids: Sequence[Any], contents: Sequence[str]) -> int:
+        """
+        Agrega documentos al índice; ignora IDs que ya existen
+
+        Returns:
+            Número de documentos agregados
+        """
+        added = 0
+        for doc_id, content in zip(ids, contents):
+            if doc_id is None or doc_id in self._positions or not content:
+                continue
+            number = len(self._ids)
+            counts: Dict[str, int] = {}
+            for token in tokenize(content):
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                term = self._terms.get(token)
+                if term is None:
+                    term = self._terms[token] = len(self._docs)
+                    self._docs.append(array('I'))
+                    self._tfs.append(array('H'))
+                self._docs[term].append(number)
+                self._tfs[term].append(min(tf, MAX_TF))
+            length = sum(counts.values())
+            self._lengths.append(length)
+            self._alive.append(1)
+            self._ids.append(doc_id)
+            self._contents.append(content)
+            self._positions[doc_id] = number
+            self._total_length += length
+            added += 1
+        if added:
+            self._norms = None
+        return added
+
+    def remove(self, ids: Iterable[Any]) -> int:
+        """
+        Marca documentos como eliminados (compacta si se acumulan muchos)
+
+        Returns:
+            Número de documentos eliminados
+        """
+        removed = 0
+        for doc_id in ids:
+            number = self._positions.pop(doc_id, None)
+            if number is None:
+                continue
+            self._alive[number] = 0
+            self._contents[number] = None
+            self._total_length -= self._lengths[number]
+            removed += 1
+        self._removed += removed
+        if removed:
+            self._norms = None
+        if self._removed and self._removed > self.COMPACT_RATIO * len(self._ids):
+            self.compact()
+        return removed
+
+    def compact(self) -> None:
+        """Renumera los documentos vivos y descarta sus postings eliminados"""
+        renumber = array('i', [-1]) * len(self._ids)
+        alive = [number for number in range(len(self._ids)) if self._alive[number]]
+        for new, old in enumerate(alive):
+            renumber[old] = new
+
+        terms, docs, tfs = {}, [], []
+        for token, term in self._terms.items():
+            kept_docs, kept_tfs = array('I'), array('H')
+            for number, tf in zip(self._docs[term], self._tfs[term]):
+                if renumber[number] >= 0:
+                    kept_docs.append(renumber[number])
+                    kept_tfs.append(tf)
+            if kept_docs:
+                terms[token] = len(docs)
+                docs.append(kept_docs)
+                tfs.append(kept_tfs)
+
+        self._terms, self._docs, self._tfs = terms, docs, tfs
+        self._lengths = array('I', (self._lengths[old] for old in alive))
+        self._alive = array('B', [1]) * len(alive)
+        self._ids = [self._ids[old] for old in alive]
+        self._contents = [self._contents[old] for old in alive]
+        self._positions = {doc_id: number for number, doc_id in enumerate(self._ids)}
+        self._removed = 0
+        self._norms = None
+
+    async def load(
+        self,
+        fetch_page: Callable[[Any, int], Awaitable[List[Dict[str, Any]]]],
+        page_size: int = 1000
+    ) -> None:
+        """
+        Construye el índice con todo jp_documents paginando por id
+
+        Args:
+            fetch_page: Corrutina (after_id, limit) -> filas con id y content
+            page_size: Filas por página
+        """
+        if self.ready:
+            return
+        if self._failed_at is not None and time.monotonic() - self._failed_at < self.RETRY_AFTER:
+            return
+
+        async with self._lock:
+            if self.ready:
+                return
+            try:
+                start = time.perf_counter()
+                last_id = None
+                while True:
+                    rows = await fetch_page(last_id, page_size)
+                    self.add([row.get('id') for row in rows], [row.get('content') or '' for row in rows])
+                    if len(rows) < page_size:
+                        break
+                    last_id = rows[-1].get('id')
+
+                self.ready = True
+                self.last_refresh = time.monotonic()
+                self._failed_at = None
+                logger.info(
+                    "Índice BM25 cargado",
+                    extra={
+                        'documents': len(self),
+                        'terms': len(self._terms),
+                        'build_ms': round((time.perf_counter() - start) * 1000, 1)
+                    }
+                )
+
+            except Exception as error:
+                self._failed_at = time.monotonic()
+                logger.error("No se pudo cargar el índice BM25: %s", error)
+
+    def needs_refresh(self, interval: float) -> bool:
+        """
+        True si pasaron `interval` segundos desde la última carga completa (0 =
+        solo al inicio): otros procesos pueden haber insertado o eliminado filas
+        """
+        if not self.ready or self.last_refresh is None:
+            return False
+        if self.stale:
+            return True
+        return interval > 0 and time.monotonic() - self.last_refresh >= interval
+
+    # --- Búsqueda ---
+
+    def idf(self, df: int) -> float:
+        """IDF de BM25 con +1 para que nunca sea negativo"""
+        count = len(self)
+        return math.log(1.0 + (count - df + 0.5) / (df + 0.5))
+
+    def _length_norms(self) -> array:
+        """Normalización por longitud de cada documento (infinita si fue eliminado, así aporta 0)"""
+        if self._norms is None:
+            k1, b = self.k1, self.b
+            average = self._total_length / len(self) if len(self) else 1.0
+            self._norms = array('d', (
+                k1 * (1.0 - b + b * length / (average or 1.0)) if alive else math.inf
+                for length, alive in zip(self._lengths, self._alive)
+            ))
+        return self._norms
+
+    def search(self, query: str, limit: int = 5) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        Top-k por BM25
+
+        Returns:
+            (documentos, confianza). Cada documento trae id, content y bm25
+            (puntaje crudo, sin relación con la similitud coseno). La confianza
+            (0-1) es el producto de:
+            - cobertura: fracción del IDF de la consulta que contiene el primer
+              documento; los términos que no están en el corpus cuentan con IDF
+              máximo, así que una consulta con palabras desconocidas no es confiable
+            - margen: 1 - segundo puntaje / primer puntaje; un término que
+              aparece en muchos chunks parecidos (una pregunta genérica) no
+              distingue a ninguno
+        """
+        tokens = set(tokenize(query))
+        if not tokens or not len(self) or limit <= 0:
+            return [], 0.0
+
+        norms = self._length_norms()
+        scores: Dict[int, float] = {}
+        get = scores.get
+        max_idf = self.idf(0)
+        total_idf = 0.0
+        weights: Dict[int, float] = {}
+        for token in tokens:
+            term = self._terms.get(token)
+            if term is None:
+                total_idf += max_idf
+                continue
+            docs, tfs = self._docs[term], self._tfs[term]
+            idf = self.idf(len(docs))
+            total_idf += idf
+            weights[term] = idf
+            weight = idf * (self.k1 + 1.0)
+            for number, tf in zip(docs, tfs):
+                scores[number] = get(number, 0.0) + weight * tf / (tf + norms[number])
+
+        # Uno más que limit para medir el margen del primero
+        top = [
+            item for item in heapq.nlargest(max(limit, 2), scores.items(), key=lambda item: item[1])
+            if item[1] > 0.0
+        ]
+        if not top:
+            return [], 0.0
+
+        best, best_score = top[0]
+        covered = sum(idf for term, idf in weights.items() if self._contains(term, best))
+        second_score = top[1][1] if len(top) > 1 else 0.0
+        confidence = (covered / total_idf) * (1.0 - second_score / best_score)
+
+        documents = [
+            {'id': self._ids[number], 'content': self._contents[number], 'bm25': score}
+            for number, score in top[:limit]
+        ]
+        return documents, confidence
+
+    def _contains(self, term: int, number: int) -> bool:
+        """Si el documento tiene el término (los postings están ordenados por documento)"""
+        docs = self._docs[term]
+        position = bisect.bisect_left(docs, number)
+        return position < len(docs) and docs[position] == number
+
+    def stats(self) -> Dict[str, Any]:
+        """Tamaño del índice y bytes ocupados por los postings"""
+        postings = sum(len(docs) for docs in self._docs)
+        posting_bytes = sum(
+            docs.itemsize * len(docs) + tfs.itemsize * len(tfs)
+            for docs, tfs in zip(self._docs, self._tfs)
+        )
+        return {
+            'ready': self.ready,
+            'documents': len(self),
+            'terms': len(self._terms),
+            'postings': postings,
+            'posting_bytes': posting_bytes,
+            'removed_pending': self._removed,
+            'refreshed_s_ago': time.monotonic() - self.last_refresh if self.last_refresh is not None else None,
+            'average_length': self._total_length / len(self) if len(self) else 0.0
+        }
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Dict[str, Any]]],
+    limit: int,
+    k: int = 60
+) -> List[Dict[str, Any]]:
+    """
+    Fusiona rankings por id con RRF: score = Σ 1 / (k + posición). Los campos
+    de un documento que aparece en varios rankings se combinan (ante un
+    conflicto gana el primer ranking), y se le agrega el puntaje 'rrf'.
+    """
+    fused: Dict[Any, float] = {}
+    documents: Dict[Any, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, 1):
+            doc_id = doc.get('id')
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+            documents[doc_id] = {**doc, **documents.get(doc_id, {})}
+    order = sorted(fused, key=fused.get, reverse=True)[:limit]
+    return [{**documents[doc_id], 'rrf': fused[doc_id]} for doc_id in order]
@@ -0,0 +1,252 @@
+"""
+Chunking perezoso de documentos: lee la fuente por bloques y produce chunks
+conforme se encuentran, sin cargar el documento completo en memoria
+"""
+import codecs
+import io
+import mmap
+import re
+from itertools import islice
+from typing import IO, Iterator, List, Union
+
+# Aproximación de tokens: palabras y signos de puntuación sueltos
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+
+def count_tokens(text: str) -> int:
+    """Número aproximado de tokens de un texto (palabras + puntuación)"""
+    return sum(1 for _ in _TOKEN_RE.finditer(text))
+
+
+def truncate_tokens(text: str, limit: int) -> str:
+    """Primeros limit tokens de un texto, cortando al final de un token"""
+    for index, match in enumerate(_TOKEN_RE.finditer(text)):
+        if index == limit - 1:
+            return text[:match.end()]
+    return text
+
+
+class _MmapTextReader:
+    """Lector de texto UTF-8 sobre un archivo mapeado en memoria"""
+
+    def __init__(self, mapped: mmap.mmap, encoding: str = 'utf-8'):
+        self._mapped = mapped
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self._position = 0
+
+    def read(self, size: int) -> str:
+        # Un bloque puede terminar a mitad de un carácter multibyte: seguir
+        # leyendo hasta decodificar algo o llegar al final del archivo
+        while self._position < len(self._mapped):
+            data = self._mapped[self._position:self._position + size]
+            self._position += len(data)
+            text = self._decoder.decode(data, final=self._position >= len(self._mapped))
+            if text:
+                return text
+        return ''
+
+
+class _TextWindow:
+    """
+    Ventana deslizante sobre la fuente. Las posiciones son absolutas
+    (desde el inicio del documento); solo se conserva el texto que aún
+    puede formar parte de un chunk.
+    """
+
+    def __init__(self, reader: IO[str], block_size: int):
+        self._reader = reader
+        self._block_size = block_size
+        self.text = ''
+        self.base = 0
+        self.eof = False
+
+    @property
+    def end(self) -> int:
+        return self.base + len(self.text)
+
+    def read_more(self) -> bool:
+        block = self._reader.read(self._block_size)
+        if not block:
+            self.eof = True
+            return False
+        self.text += block
+        return True
+
+    def fill(self, position: int) -> None:
+        """Lee hasta tener el carácter en position (o llegar al final)"""
+        while self.end <= position and self.read_more():
+            pass
+
+    def discard(self, position: int) -> None:
+        """Libera el texto anterior a position (en bloques, para no copiar en cada chunk)"""
+        if position - self.base >= self._block_size:
+            self.text = self.text[position - self.base:]
+            self.base = position
+
+    def slice(self, start: int, end: int) -> str:
+        return self.text[start - self.base:end - self.base]
+
+    def rfind(self, sub: str, start: int, end: int) -> int:
+        index = self.text.rfind(sub, start - self.base, end - self.base)
+        return index + self.base if index >= 0 else -1
+
+    def token_spans(self, start: int, count: int) -> List[re.Match]:
+        """
+        Primeros count tokens desde start. Se lee un token de más antes de
+        cortar para no partir una palabra en el borde de la ventana.
+        """
+        while True:
+            spans = list(islice(_TOKEN_RE.finditer(self.text, start - self.base), count + 1))
+            if len(spans) > count or self.eof:
+                return spans[:count]
+            self.read_more()
+
+
+def _last_separator(window: _TextWindow, start: int, end: int) -> int:
+    """Último punto o salto de línea dentro de [start, end)"""
+    return max(window.rfind('.', start, end), window.rfind('\n', start, end))
+
+
+def _iter_char_chunks(window: _TextWindow, chunk_size: int, overlap: int) -> Iterator[str]:
+    window.fill(chunk_size)
+    if window.eof and window.end <= chunk_size:
+        yield window.text
+        return
+
+    start = 0
+    while True:
+        window.fill(start + chunk_size)
+        end = start + chunk_size
+        has_more = end < window.end
+
+        # Si no es el último chunk, buscar el último punto o salto de línea
+        if has_more:
+            last_separator = _last_separator(window, start, end)
+            if last_separator > start + chunk_size // 2:
+                end = last_separator + 1
+
+        chunk = window.slice(start, end).strip()
+        if chunk:
+            yield chunk
+
+        if not has_more:
+            return
+        # Mover el inicio con overlap (siempre avanzando)
+        start = max(end - overlap, start + 1)
+        window.discard(start)
+
+
+def _iter_token_chunks(window: _TextWindow, chunk_size: int, overlap: int) -> Iterator[str]:
+    start = 0
+    while True:
+        spans = window.token_spans(start, chunk_size + 1)
+        if len(spans) <= chunk_size:
+            # Lo que queda cabe en un chunk
+            while window.read_more():
+                pass
+            chunk = window.slice(start, window.end).strip()
+            if chunk:
+                yield chunk
+            return
+
+        end = spans[chunk_size - 1].end() + window.base
+        middle = spans[chunk_size // 2 - 1].end() + window.base if chunk_size > 1 else start
+        last_separator = _last_separator(window, start, end)
+        if last_separator > middle:
+            end = last_separator + 1
+
+        chunk = window.slice(start, end).strip()
+        if chunk:
+            yield chunk
+
+        # Retroceder overlap tokens desde el final del chunk
+        in_chunk = sum(1 for span in spans if span.start() + window.base < end)
+        start = spans[max(in_chunk - overlap, 1)].start() + window.base
+        window.discard(start)
+
+
+def iter_chunks(
+    source: Union[str, IO[str]],
+    chunk_size: int = 500,
+    overlap: int = 50,
+    unit: str = 'chars',
+    block_size: int = DEFAULT_BLOCK_SIZE
+) -> Iterator[str]:
+    """
+    Divide un texto en chunks con superposición, de forma perezosa.
+    Corta en el último punto o salto de línea de la segunda mitad del chunk.
+
+    Args:
+        source: Texto completo o un objeto de texto con read(n)
+        chunk_size: Tamaño máximo de cada chunk (en caracteres o tokens)
+        overlap: Superposición entre chunks (en la misma unidad)
+        unit: 'chars' o 'tokens' (tokens aproximados: palabras y puntuación)
+        block_size: Caracteres leídos de la fuente por cada lectura
+
+    Yields:
+        Chunks de texto en orden
+    """
+    if unit not in ('chars', 'tokens'):
+        raise ValueError(f"Unidad de chunking no soportada: {unit}")
+    reader = io.StringIO(source) if isinstance(source, str) else source
+    window = _TextWindow(reader, max(block_size, 1))
+    if unit == 'tokens':
+        return _iter_token_chunks(window, chunk_size, overlap)
+    return _iter_char_chunks(window, chunk_size, overlap)
+
+
+def iter_file_chunks(
+    path: str,
+    chunk_size: int = 500,
+    overlap: int = 50,
+    unit: str = 'chars',
+    use_mmap: bool = False,
+    encoding: str = 'utf-8',
+    block_size: int = DEFAULT_BLOCK_SIZE
+) -> Iterator[str]:
+    """
+    Chunks de un archivo de texto leído por bloques; la memoria usada no
+    depende del tamaño del archivo.
+
+    Args:
+        path: Ruta del archivo
+        chunk_size: Tamaño máximo de cada chunk
+        overlap: Superposición entre chunks
+        unit: 'chars' o 'tokens'
+        use_mmap: Mapear el archivo en memoria en lugar de leerlo con read()
+        encoding: Codificación del archivo
+        block_size: Caracteres (o bytes con mmap) por lectura
+
+    Yields:
+        Chunks de texto en orden
+    """
+    if use_mmap:
+        with open(path, 'rb') as handle:
+            if handle.seek(0, io.SEEK_END) == 0:
+                # mmap no admite archivos vacíos
+                yield from iter_chunks('', chunk_size, overlap, unit)
+                return
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                reader = _MmapTextReader(mapped, encoding)
+                yield from iter_chunks(reader, chunk_size, overlap, unit, block_size)
+        return
+
+    with open(path, 'r', encoding=encoding, errors='replace') as handle:
+        yield from iter_chunks(handle, chunk_size, overlap, unit, block_size)
+
+
+def split_into_chunks(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+    """
+    Divide un texto en chunks con superposición.
+
+    Args:
+        text: Texto a dividir
+        chunk_size: Tamaño máximo de cada chunk
+        overlap: Superposición entre chunks
+
+    Returns:
+        Lista de chunks de texto
+    """
+    return list(iter_chunks(text, chunk_size, overlap))
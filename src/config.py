@@ -26,6 +26,150 @@ class Config:
     SIMILARITY_THRESHOLD: float = float(os.getenv('SIMILARITY_THRESHOLD', '0.6'))
     TOPK_DOCUMENTS: int = int(os.getenv('TOPK_DOCUMENTS', '6'))
     
+    # Presupuesto de tokens del contexto del prompt (0 = sin límite)
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500'))
+    
+    # Re-ranking por diversidad (MMR): se piden FETCH_FACTOR veces más candidatos
+    # y se eligen los k que equilibran relevancia (LAMBDA=1) y diversidad (LAMBDA=0)
+    RERANK_ENABLED: bool = os.getenv('RERANK_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    RERANK_FETCH_FACTOR: int = int(os.getenv('RERANK_FETCH_FACTOR', '4'))
+    RERANK_LAMBDA: float = float(os.getenv('RERANK_LAMBDA', '0.7'))
+    
+    # Herramientas por lote (search_documents_batch, generate_responses_batch)
+    BATCH_MAX_QUERIES: int = int(os.getenv('BATCH_MAX_QUERIES', '1000'))
+    BATCH_SEARCH_CONCURRENCY: int = int(os.getenv('BATCH_SEARCH_CONCURRENCY', '16'))
+    BATCH_GENERATE_CONCURRENCY: int = int(os.getenv('BATCH_GENERATE_CONCURRENCY', '16'))
+    
+    # Transporte HTTP asíncrono con pool keep-alive (en lugar de SDK + hilos)
+    ASYNC_HTTP_ENABLED: bool = os.getenv('ASYNC_HTTP_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    GEMINI_API_BASE: str = os.getenv('GEMINI_API_BASE', 'https://generativelanguage.googleapis.com')
+    HTTP2_ENABLED: bool = os.getenv('HTTP2_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+    HTTP_MAX_KEEPALIVE: int = int(os.getenv('HTTP_MAX_KEEPALIVE', '20'))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30'))
+    HTTP_TIMEOUT: float = float(os.getenv('HTTP_TIMEOUT', '30'))
+    
+    # Límites de tasa de Gemini (0 = sin límite) y reintentos con backoff
+    GEMINI_EMBED_RPM: int = int(os.getenv('GEMINI_EMBED_RPM', '0'))
+    GEMINI_EMBED_TPM: int = int(os.getenv('GEMINI_EMBED_TPM', '0'))
+    GEMINI_GENERATE_RPM: int = int(os.getenv('GEMINI_GENERATE_RPM', '0'))
+    GEMINI_GENERATE_TPM: int = int(os.getenv('GEMINI_GENERATE_TPM', '0'))
+    GEMINI_MAX_RETRIES: int = int(os.getenv('GEMINI_MAX_RETRIES', '5'))
+    GEMINI_RETRY_BASE_DELAY: float = float(os.getenv('GEMINI_RETRY_BASE_DELAY', '1.0'))
+    GEMINI_RETRY_MAX_DELAY: float = float(os.getenv('GEMINI_RETRY_MAX_DELAY', '60'))
+    GEMINI_MIN_CONCURRENCY: int = int(os.getenv('GEMINI_MIN_CONCURRENCY', '1'))
+    GEMINI_MAX_CONCURRENCY: int = int(os.getenv('GEMINI_MAX_CONCURRENCY', '16'))
+    
+    # Ingesta por lotes (batchEmbedContents acepta hasta 100 textos por request)
+    EMBED_BATCH_SIZE: int = int(os.getenv('EMBED_BATCH_SIZE', '100'))
+    EMBED_BATCH_CONCURRENCY: int = int(os.getenv('EMBED_BATCH_CONCURRENCY', '4'))
+    INSERT_BATCH_SIZE: int = int(os.getenv('INSERT_BATCH_SIZE', '500'))
+    INGEST_INSERT_CONCURRENCY: int = int(os.getenv('INGEST_INSERT_CONCURRENCY', '2'))
+    INGEST_QUEUE_SIZE: int = int(os.getenv('INGEST_QUEUE_SIZE', '4'))
+    
+    # Ingesta en segundo plano: store_document/store_file devuelven un ID de job
+    INGEST_BACKGROUND: bool = os.getenv('INGEST_BACKGROUND', 'false').lower() in ('1', 'true', 'yes')
+    INGEST_WORKERS: int = int(os.getenv('INGEST_WORKERS', '2'))
+    # Checkpoints de los jobs para reanudarlos tras un reinicio (vacío = solo en memoria)
+    INGEST_JOBS_DIR: str = os.getenv('INGEST_JOBS_DIR', '')
+    INGEST_JOB_HISTORY: int = int(os.getenv('INGEST_JOB_HISTORY', '100'))
+    
+    # Directorio desde el que store_file puede leer archivos
+    INGEST_FILE_ROOT: str = os.getenv('INGEST_FILE_ROOT', '.')
+    
+    # Deduplicación por huella de contenido (se desactiva sola si jp_documents no tiene
+    # las columnas content_hash y document_key; false = no escribirlas ni consultarlas)
+    CHUNK_DEDUP_ENABLED: bool = os.getenv('CHUNK_DEDUP_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    
+    # Cache de embeddings de consultas (EMBED_CACHE_SIZE=0 lo desactiva)
+    EMBED_CACHE_SIZE: int = int(os.getenv('EMBED_CACHE_SIZE', '1024'))
+    EMBED_CACHE_TTL: float = float(os.getenv('EMBED_CACHE_TTL', '86400'))
+    EMBED_CACHE_PATH: str = os.getenv('EMBED_CACHE_PATH', '')
+    
+    # Índice vectorial local en memoria (requiere numpy)
+    LOCAL_INDEX_ENABLED: bool = os.getenv('LOCAL_INDEX_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    LOCAL_INDEX_PAGE_SIZE: int = int(os.getenv('LOCAL_INDEX_PAGE_SIZE', '1000'))
+    LOCAL_INDEX_REFRESH_SECONDS: float = float(os.getenv('LOCAL_INDEX_REFRESH_SECONDS', '300'))
+    
+    # Índice léxico BM25 en memoria y recuperación híbrida (RRF con la búsqueda vectorial)
+    BM25_ENABLED: bool = os.getenv('BM25_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    BM25_K1: float = float(os.getenv('BM25_K1', '1.2'))
+    BM25_B: float = float(os.getenv('BM25_B', '0.75'))
+    # Confianza léxica (cobertura x margen, 0-1) desde la cual se responde sin embedding de la consulta
+    BM25_FAST_PATH_CONFIDENCE: float = float(os.getenv('BM25_FAST_PATH_CONFIDENCE', '0.8'))
+    # Fracción del mejor puntaje BM25 que necesita un resultado léxico para entrar a la fusión
+    BM25_MIN_RELATIVE_SCORE: float = float(os.getenv('BM25_MIN_RELATIVE_SCORE', '0.5'))
+    # Reconstrucción periódica del índice (cambios de otros workers, jobs o migraciones; 0 = solo al inicio)
+    BM25_REFRESH_SECONDS: float = float(os.getenv('BM25_REFRESH_SECONDS', '60'))
+    HYBRID_RRF_K: int = int(os.getenv('HYBRID_RRF_K', '60'))
+    HYBRID_FETCH_FACTOR: int = int(os.getenv('HYBRID_FETCH_FACTOR', '2'))
+    
+    # Snapshot local de embeddings mapeado en memoria (float16, int8 o float32)
+    EMBED_STORE_ENABLED: bool = os.getenv('EMBED_STORE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    EMBED_STORE_PATH: str = os.getenv('EMBED_STORE_PATH', '.embed_store')
+    EMBED_STORE_DTYPE: str = os.getenv('EMBED_STORE_DTYPE', 'int8')
+    EMBED_STORE_RESCORE: bool = os.getenv('EMBED_STORE_RESCORE', 'true').lower() in ('1', 'true', 'yes')
+    EMBED_STORE_RESCORE_FACTOR: int = int(os.getenv('EMBED_STORE_RESCORE_FACTOR', '4'))
+    EMBED_STORE_REFRESH_SECONDS: float = float(os.getenv('EMBED_STORE_REFRESH_SECONDS', '300'))
+    
+    # Cache semántico de respuestas de generate_response
+    ANSWER_CACHE_ENABLED: bool = os.getenv('ANSWER_CACHE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    ANSWER_CACHE_THRESHOLD: float = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))
+    ANSWER_CACHE_SIZE: int = int(os.getenv('ANSWER_CACHE_SIZE', '256'))
+    ANSWER_CACHE_TTL: float = float(os.getenv('ANSWER_CACHE_TTL', '3600'))
+    # SQLite compartido entre procesos (vacío = solo en memoria)
+    ANSWER_CACHE_PATH: str = os.getenv('ANSWER_CACHE_PATH', '')
+    
+    # Deadlines por etapa y presupuesto total de generate_response (0 = sin límite)
+    EMBED_TIMEOUT: float = float(os.getenv('EMBED_TIMEOUT', '10'))
+    SEARCH_TIMEOUT: float = float(os.getenv('SEARCH_TIMEOUT', '10'))
+    GENERATE_TIMEOUT: float = float(os.getenv('GENERATE_TIMEOUT', '45'))
+    RESPONSE_BUDGET_SECONDS: float = float(os.getenv('RESPONSE_BUDGET_SECONDS', '60'))
+    # Con menos segundos restantes que esto el contexto se recorta a DEGRADED_CONTEXT_TOKENS
+    DEGRADE_CONTEXT_BELOW: float = float(os.getenv('DEGRADE_CONTEXT_BELOW', '5'))
+    DEGRADED_CONTEXT_TOKENS: int = int(os.getenv('DEGRADED_CONTEXT_TOKENS', '500'))
+    
+    # Router de consultas: negativa fija sin llamar al LLM para preguntas fuera de tema o sin contexto
+    ROUTER_ENABLED: bool = os.getenv('ROUTER_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    ROUTER_CENTROIDS: int = int(os.getenv('ROUTER_CENTROIDS', '8'))
+    ROUTER_OFFTOPIC_THRESHOLD: float = float(os.getenv('ROUTER_OFFTOPIC_THRESHOLD', '0.2'))  # 0 = no clasificar
+    ROUTER_MIN_SIMILARITY: float = float(os.getenv('ROUTER_MIN_SIMILARITY', '0.5'))
+    ROUTER_SAMPLE_ROWS: int = int(os.getenv('ROUTER_SAMPLE_ROWS', '5000'))
+    ROUTER_REFRESH_SECONDS: float = float(os.getenv('ROUTER_REFRESH_SECONDS', '600'))  # 0 = solo al cambiar el corpus
+    
+    # Requests hedged de embedding y búsqueda: duplicado tras el p95 reciente
+    HEDGE_ENABLED: bool = os.getenv('HEDGE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    HEDGE_MIN_DELAY: float = float(os.getenv('HEDGE_MIN_DELAY', '0.05'))
+    HEDGE_MAX_RATIO: float = float(os.getenv('HEDGE_MAX_RATIO', '0.1'))
+    HEDGE_WINDOW: int = int(os.getenv('HEDGE_WINDOW', '200'))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+    
+    # Re-embedding masivo de jp_documents (python -m src.migration)
+    MIGRATION_CHECKPOINT_PATH: str = os.getenv('MIGRATION_CHECKPOINT_PATH', '.migration/reembed.json')
+    MIGRATION_COLUMN: str = os.getenv('MIGRATION_COLUMN', 'embedding')
+    MIGRATION_PAGE_SIZE: int = int(os.getenv('MIGRATION_PAGE_SIZE', '500'))
+    MIGRATION_WRITE_BATCH_SIZE: int = int(os.getenv('MIGRATION_WRITE_BATCH_SIZE', '100'))
+    MIGRATION_WRITE_CONCURRENCY: int = int(os.getenv('MIGRATION_WRITE_CONCURRENCY', '2'))
+    
+    # Servidor HTTP con varios procesos (python -m src.serve)
+    SERVE_WORKERS: int = int(os.getenv('SERVE_WORKERS', '0'))  # 0 = un worker por CPU
+    SERVE_HOST: str = os.getenv('SERVE_HOST', '127.0.0.1')
+    SERVE_PORT: int = int(os.getenv('SERVE_PORT', '8000'))
+    SERVE_PATH: str = os.getenv('SERVE_PATH', '/mcp')
+    # Lo fija src.serve al arrancar: los workers solo reanudan jobs anteriores
+    SERVE_STARTED_AT: float = float(os.getenv('SERVE_STARTED_AT', '0'))
+    
+    # Construir clientes y precargar índices en segundo plano al arrancar
+    WARMUP_ON_START: bool = os.getenv('WARMUP_ON_START', 'true').lower() in ('1', 'true', 'yes')
+    
+    # Enviar la respuesta en fragmentos como notificaciones de progreso
+    STREAM_RESPONSES: bool = os.getenv('STREAM_RESPONSES', 'true').lower() in ('1', 'true', 'yes')
+    
+    # Observabilidad: nivel y formato de logs (a stderr) y métricas en proceso
+    LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT: str = os.getenv('LOG_FORMAT', 'text')
+    METRICS_ENABLED: bool = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    
     @classmethod
     def validate_required_vars(cls) -> None:
         """Validar que las variables requeridas estén configuradas"""
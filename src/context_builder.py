@@ -0,0 +1,127 @@
+"""
+Construcción del contexto del prompt a partir de los documentos recuperados:
+fusiona chunks adyacentes, elimina el texto duplicado por el overlap y
+respeta un presupuesto de tokens
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+from .chunking import count_tokens, truncate_tokens
+from .config import config
+
+# Superposición mínima (en caracteres) para considerar que dos chunks se solapan
+MIN_OVERLAP_CHARS = 12
+
+# Tokens del prefijo "[n] " de cada sección
+SECTION_OVERHEAD_TOKENS = 3
+
+NO_CONTEXT = "No se recuperaron documentos relevantes."
+
+_BLANK_LINES_RE = re.compile(r'\s*\n\s*')
+_SPACES_RE = re.compile(r'[ \t\r\f\v]+')
+
+
+def _compact(text: str) -> str:
+    """Colapsa espacios repetidos y líneas en blanco; conserva los saltos de línea"""
+    return _BLANK_LINES_RE.sub('\n', _SPACES_RE.sub(' ', text)).strip()
+
+
+def _overlap(left: str, right: str) -> int:
+    """Longitud del sufijo más largo de left que es prefijo de right"""
+    longest = min(len(left), len(right))
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge_adjacent(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Ordena por id (orden de inserción = orden en el documento) y fusiona cada
+    chunk con el anterior cuando el final de uno se repite al inicio del otro
+    (el overlap del chunking), quitando el texto duplicado. Cada grupo
+    conserva la mejor similitud de sus chunks.
+    """
+    groups: List[Dict[str, Any]] = []
+    seen = set()
+    # Ids no numéricos conservan su orden original (sorted es estable)
+    by_position = sorted(
+        documents,
+        key=lambda item: item['id'] if isinstance(item.get('id'), int) else float('inf')
+    )
+    for doc in by_position:
+        content = (doc.get('content') or '').strip()
+        if not content or content in seen:
+            continue
+        seen.add(content)
+        similarity = doc.get('similarity') or 0.0
+
+        if groups:
+            previous = groups[-1]
+            shared = _overlap(previous['text'], content)
+            if shared:
+                previous['text'] += content[shared:]
+                previous['similarity'] = max(previous['similarity'], similarity)
+                previous['chunks'] += 1
+                continue
+
+        groups.append({'text': content, 'similarity': similarity, 'chunks': 1})
+    return groups
+
+
+def build_context(
+    documents: Optional[List[Dict[str, Any]]],
+    token_budget: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Arma el contexto compacto para el prompt de generate_response
+
+    Args:
+        documents: Resultados de match_documents ({'id', 'content', 'similarity'})
+        token_budget: Máximo de tokens del contexto (default: CONTEXT_TOKEN_BUDGET;
+            0 = sin límite)
+
+    Returns:
+        Dict con 'text' (contexto formateado), 'tokens', 'raw_tokens' (lo que
+        costaba interpolar la lista tal cual), 'saved_tokens', 'chunks' (chunks
+        usados), 'merged' (chunks fusionados con su vecino) y 'dropped' (grupos
+        que no cupieron en el presupuesto)
+    """
+    documents = documents or []
+    if token_budget is None:
+        token_budget = config.CONTEXT_TOKEN_BUDGET
+    raw_tokens = count_tokens(str(documents))
+
+    groups = _merge_adjacent(documents)
+    # Los más relevantes primero: si el presupuesto se acaba, se pierden los menos útiles
+    groups.sort(key=lambda group: group['similarity'], reverse=True)
+
+    sections: List[str] = []
+    used_tokens = 0
+    used_chunks = 0
+    dropped = 0
+    for group in groups:
+        tokens = count_tokens(group['text']) + SECTION_OVERHEAD_TOKENS
+        remaining = token_budget - used_tokens if token_budget > 0 else tokens
+        if tokens > remaining:
+            if sections or remaining <= SECTION_OVERHEAD_TOKENS:
+                dropped += 1
+                continue
+            # El grupo más relevante no cabe completo: se recorta en lugar de omitirlo
+            group['text'] = truncate_tokens(group['text'], remaining - SECTION_OVERHEAD_TOKENS) + ' …'
+            tokens = remaining
+        sections.append(f"[{len(sections) + 1}] {_compact(group['text'])}")
+        used_tokens += tokens
+        used_chunks += group['chunks']
+
+    text = '\n\n'.join(sections) if sections else NO_CONTEXT
+    tokens = count_tokens(text)
+    return {
+        'text': text,
+        'tokens': tokens,
+        'raw_tokens': raw_tokens,
+        'saved_tokens': max(raw_tokens - tokens, 0),
+        'chunks': used_chunks,
+        'merged': sum(group['chunks'] - 1 for group in groups),
+        'dropped': dropped
+    }
@@ -0,0 +1,237 @@
+"""
+Cache LRU + TTL para embeddings de consultas, con persistencia opcional en disco.
+Las lecturas y escrituras de SQLite corren en un hilo (asyncio.to_thread): el
+event loop solo toca el diccionario en memoria.
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Llaves por SELECT ... IN al leer del disco (límite de variables de SQLite)
+DISK_READ_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza espacios y mayúsculas para que consultas equivalentes compartan entrada"""
+    return ' '.join(text.split()).casefold()
+
+
+class EmbeddingCache:
+    """Cache acotado por tamaño y por tiempo de vida para vectores de embedding"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 86400, path: Optional[str] = None):
+        """
+        Args:
+            max_size: Número máximo de entradas en memoria (LRU)
+            ttl: Segundos que una entrada es válida (0 = sin expiración)
+            path: Archivo SQLite para persistir el cache entre reinicios (opcional)
+        """
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        # La conexión se usa desde hilos del pool: un hilo a la vez
+        self._db_lock = threading.Lock()
+        # Escrituras pendientes; una sola tarea las vuelca por lotes
+        self._pending: List[Tuple[str, float, bytes]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_hits = 0
+
+        if path:
+            self._open_db(path)
+
+    @staticmethod
+    def make_key(text: str, model: str, task_type: str) -> str:
+        """Llave del cache: texto normalizado + modelo + tipo de tarea"""
+        raw = f"{model}\x00{task_type}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _open_db(self, path: str) -> None:
+        """Abre (o crea) la base SQLite y precarga las entradas más recientes"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            'key TEXT PRIMARY KEY, created_at REAL NOT NULL, vector BLOB NOT NULL)'
+        )
+        if self.ttl:
+            self._db.execute(
+                'DELETE FROM embeddings WHERE created_at < ?',
+                (time.time() - self.ttl,)
+            )
+        self._db.commit()
+
+        rows = self._db.execute(
+            'SELECT key, created_at, vector FROM embeddings ORDER BY created_at DESC LIMIT ?',
+            (self.max_size,)
+        ).fetchall()
+        # Insertar de la más antigua a la más reciente para respetar el orden LRU
+        for key, created_at, blob in reversed(rows):
+            self._entries[key] = (created_at, self._decode(blob))
+
+    @staticmethod
+    def _encode(embedding: List[float]) -> bytes:
+        return array('f', embedding).tobytes()
+
+    @staticmethod
+    def _decode(blob: bytes) -> List[float]:
+        values = array('f')
+        values.frombytes(blob)
+        return values.tolist()
+
+    def _is_expired(self, created_at: float) -> bool:
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def _load_from_disk(self, keys: Sequence[str]) -> Dict[str, Tuple[float, List[float]]]:
+        """Entradas guardadas de varias llaves (se ejecuta en un hilo)"""
+        found: Dict[str, Tuple[float, List[float]]] = {}
+        with self._db_lock:
+            for start in range(0, len(keys), DISK_READ_BATCH):
+                batch = keys[start:start + DISK_READ_BATCH]
+                rows = self._db.execute(
+                    f"SELECT key, created_at, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for key, created_at, blob in rows:
+                    found[key] = (created_at, self._decode(blob))
+        return found
+
+    def _write_rows(self, rows: List[Tuple[str, float, bytes]]) -> None:
+        """Persiste un lote de entradas con un solo commit (se ejecuta en un hilo)"""
+        try:
+            with self._db_lock:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO embeddings (key, created_at, vector) VALUES (?, ?, ?)',
+                    rows
+                )
+                self._db.commit()
+        except sqlite3.Error as error:
+            logger.warning("No se pudo persistir embedding: %s", error)
+
+    async def _flush_pending(self) -> None:
+        try:
+            while self._pending:
+                rows, self._pending = self._pending, []
+                await asyncio.to_thread(self._write_rows, rows)
+        except asyncio.CancelledError:
+            # El loop se está cerrando: lo que quede se escribe aquí para no perderlo
+            rows, self._pending = self._pending, []
+            if rows:
+                self._write_rows(rows)
+            raise
+
+    def _put(self, key: str, created_at: float, embedding: List[float]) -> None:
+        self._entries[key] = (created_at, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _accept(self, key: str, entry: Optional[Tuple[float, List[float]]], from_disk: bool) -> Optional[List[float]]:
+        """Aplica el TTL a una entrada encontrada y actualiza el orden LRU"""
+        if entry is None:
+            self.misses += 1
+            return None
+
+        created_at, embedding = entry
+        if self._is_expired(created_at):
+            self._entries.pop(key, None)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        if from_disk:
+            self.disk_hits += 1
+            self._put(key, created_at, embedding)
+        elif key in self._entries:
+            self._entries.move_to_end(key)
+        self.hits += 1
+        return embedding
+
+    async def get(self, key: str) -> Optional[List[float]]:
+        """Devuelve el embedding cacheado o None si no existe o expiró"""
+        return (await self.get_many([key]))[0]
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        get() de varias llaves: las que no están en memoria se buscan en disco
+        con una sola lectura fuera del event loop
+        """
+        loaded: Dict[str, Tuple[float, List[float]]] = {}
+        missing = list(dict.fromkeys(key for key in keys if key not in self._entries))
+        if missing and self._db is not None:
+            loaded = await asyncio.to_thread(self._load_from_disk, missing)
+
+        # Foto de la memoria: subir entradas del disco puede desalojar otras pedidas
+        in_memory = {key: self._entries[key] for key in keys if key in self._entries}
+        results = []
+        for key in keys:
+            if key in in_memory:
+                results.append(self._accept(key, in_memory[key], from_disk=False))
+            else:
+                results.append(self._accept(key, loaded.get(key), from_disk=key in loaded))
+                if key in self._entries:
+                    in_memory[key] = self._entries[key]
+        return results
+
+    async def set(self, key: str, embedding: List[float]) -> None:
+        """
+        Guarda un embedding en memoria y, si hay persistencia, lo encola para
+        escribirlo en disco en segundo plano (sin esperar la escritura)
+        """
+        created_at = time.time()
+        self._put(key, created_at, embedding)
+        if self._db is not None:
+            self._pending.append((key, created_at, self._encode(embedding)))
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self._flush_pending())
+
+    async def flush(self) -> None:
+        """Espera a que las escrituras encoladas lleguen al disco"""
+        while self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+
+    def clear(self) -> None:
+        """Vacía el cache en memoria y en disco"""
+        self._entries.clear()
+        self._pending = []
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute('DELETE FROM embeddings')
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores del cache"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'disk_hits': self.disk_hits,
+            'pending_writes': len(self._pending),
+            'persistent': self._db is not None
+        }
@@ -0,0 +1,558 @@
+"""
+Snapshot local de jp_documents en archivos binarios mapeados en memoria,
+con vectores cuantizados (float16 o int8 con escala/offset por fila)
+
+Estructura del directorio:
+    meta.json      dim, dtype, modelo, generación, filas y último id (se escribe
+                   al final de cada append)
+    vectors.bin    filas normalizadas cuantizadas (filas x dim)
+    scales.bin     int8: escala y offset float32 por fila
+    exact.bin      float32 para re-puntuar los mejores candidatos (opcional)
+    ids.bin        id int64 por fila
+    offsets.bin    inicio int64 del contenido de cada fila en contents.bin (+1 final)
+    contents.bin   contenido UTF-8 concatenado
+    deleted.json   ids eliminados después de agregarse (tombstones)
+
+Los archivos solo crecen; varios procesos pueden mapearlos a la vez y
+comparten las páginas del cache del sistema operativo. Si cambia el modelo o
+el formato, o se invalida el snapshot (por ejemplo después de re-embeber el
+corpus), se borran y empieza una generación nueva que el refresh vuelve a
+llenar desde jp_documents.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .log import get_logger
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él no hay snapshot local
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso escritor
+    fcntl = None
+
+logger = get_logger(__name__)
+
+FORMAT_VERSION = 1
+DTYPES = ('float16', 'int8', 'float32')
+
+# Archivos de datos que se descartan al empezar una generación nueva
+DATA_FILES = ('vectors.bin', 'scales.bin', 'exact.bin', 'ids.bin', 'offsets.bin', 'contents.bin', 'deleted.json')
+
+# Filas por bloque al puntuar: acota la memoria temporal de la conversión a float32
+SCAN_BLOCK_ROWS = 65536
+
+
+def quantize_int8(vectors: "np.ndarray") -> tuple:
+    """
+    Cuantización afín por fila: x ≈ q * escala + offset, con q en [-127, 127]
+
+    Returns:
+        (q int8, escalas float32, offsets float32)
+    """
+    low = vectors.min(axis=1)
+    high = vectors.max(axis=1)
+    offsets = ((high + low) / 2).astype(np.float32)
+    scales = ((high - low) / 254).astype(np.float32)
+    scales[scales == 0] = 1.0
+    q = np.rint((vectors - offsets[:, None]) / scales[:, None])
+    return np.clip(q, -127, 127).astype(np.int8), scales, offsets
+
+
+class EmbeddingStore:
+    """Snapshot de embeddings mapeado en memoria con búsqueda por similitud coseno"""
+
+    # Segundos a esperar antes de reintentar un refresh fallido
+    RETRY_AFTER = 60.0
+
+    def __init__(
+        self,
+        path: str,
+        dim: int,
+        dtype: str = 'float16',
+        keep_exact: bool = True,
+        model: str = ''
+    ):
+        """
+        Args:
+            path: Directorio del snapshot (se crea si no existe)
+            dim: Dimensión de los embeddings
+            dtype: 'float16', 'int8' o 'float32' para vectors.bin
+            keep_exact: Guardar también float32 para re-puntuar los candidatos
+            model: Modelo de embeddings; un snapshot de otro modelo se reconstruye
+        """
+        if np is None:
+            raise RuntimeError("numpy no está instalado")
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype no soportado: {dtype} (usa {', '.join(DTYPES)})")
+        self.path = path
+        self.dim = dim
+        self.dtype = dtype
+        self.keep_exact = keep_exact and dtype != 'float32'
+        self.model = model
+        self.ready = False
+        self.last_refresh: Optional[float] = None
+        # Generación del último refresh y si el meta en disco es de otro modelo o formato
+        self._generation: Optional[int] = None
+        self._incompatible = False
+        self._failed_at: Optional[float] = None
+        self._meta: Dict[str, Any] = {}
+        self._meta_mtime: Optional[float] = None
+        self._count = 0
+        self._arrays: Dict[str, Any] = {}
+        self._deleted_mask: Optional["np.ndarray"] = None
+        self._id_set: Optional[set] = None
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def available() -> bool:
+        return np is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def needs_refresh(self, interval: float) -> bool:
+        """True si nunca se refrescó o pasaron `interval` segundos (0 = solo al inicio)"""
+        if not self.ready or self.last_refresh is None:
+            return True
+        return interval > 0 and time.monotonic() - self.last_refresh >= interval
+
+    # --- Archivos ---
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _row_files(self) -> Dict[str, tuple]:
+        """Archivo -> (dtype, valores por fila) de los arrays de longitud fija"""
+        files = {
+            'vectors.bin': (self.dtype, self.dim),
+            'ids.bin': ('int64', 1),
+        }
+        if self.dtype == 'int8':
+            files['scales.bin'] = ('float32', 2)
+        if self.keep_exact:
+            files['exact.bin'] = ('float32', self.dim)
+        return files
+
+    def _read_meta(self) -> Dict[str, Any]:
+        try:
+            with open(self._file('meta.json'), encoding='utf-8') as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return {}
+
+    def _compatible(self, meta: Dict[str, Any]) -> bool:
+        """True si el meta es de este modelo, dimensión y formato"""
+        return (
+            meta.get('version') == FORMAT_VERSION and meta.get('dim') == self.dim
+            and meta.get('dtype') == self.dtype and meta.get('exact', False) == self.keep_exact
+            and meta.get('model', '') == self.model
+        )
+
+    def _new_meta(self, generation: int) -> Dict[str, Any]:
+        # filled: una pasada completa por jp_documents terminó en esta generación
+        return {
+            'version': FORMAT_VERSION, 'dim': self.dim, 'dtype': self.dtype,
+            'exact': self.keep_exact, 'model': self.model, 'generation': generation,
+            'filled': False, 'count': 0, 'last_id': None
+        }
+
+    def _write_meta(self, meta: Dict[str, Any]) -> None:
+        path = self._file('meta.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as handle:
+            json.dump(meta, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(path + '.tmp', path)
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        """Un solo proceso escribe a la vez (flock sobre un archivo de lock)"""
+        with open(self._file('lock'), 'a') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _map(self, name: str, dtype: str, shape: tuple) -> "np.ndarray":
+        if not shape[0]:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode='r', shape=shape)
+
+    def open(self) -> bool:
+        """
+        Mapea el snapshot (o lo vuelve a mapear si otro proceso agregó filas).
+        Si otro proceso empezó una generación nueva, el snapshot deja de estar
+        listo hasta el próximo refresh.
+
+        Returns:
+            True si hay un snapshot compatible con al menos el meta escrito
+        """
+        try:
+            mtime = os.stat(self._file('meta.json')).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._meta_mtime:
+            return not self._incompatible
+
+        meta = self._read_meta()
+        self._incompatible = bool(meta) and not self._compatible(meta)
+        if self._incompatible:
+            # Otro modelo o formato: no se usa y el próximo refresh lo reconstruye
+            self._meta, self._meta_mtime, self._count, self._arrays = meta, mtime, 0, {}
+            self._deleted_mask, self._id_set = None, None
+            self.ready = False
+            return False
+        if self._generation is not None and meta.get('generation', 0) != self._generation:
+            self.ready = False
+        count = meta.get('count', 0)
+        arrays = {
+            name: self._map(name, dtype, (count, width) if width > 1 else (count,))
+            for name, (dtype, width) in self._row_files().items()
+        }
+        arrays['offsets.bin'] = self._map('offsets.bin', 'int64', (count + 1,)) if count else np.zeros(1, dtype=np.int64)
+        size = int(arrays['offsets.bin'][-1])
+        arrays['contents.bin'] = self._map('contents.bin', 'uint8', (size,))
+
+        self._meta, self._meta_mtime, self._count, self._arrays = meta, mtime, count, arrays
+        self._id_set = None
+        self._load_tombstones()
+        return True
+
+    def _load_tombstones(self) -> None:
+        try:
+            with open(self._file('deleted.json'), encoding='utf-8') as handle:
+                deleted = json.load(handle)
+        except FileNotFoundError:
+            deleted = []
+        self._deleted_mask = np.isin(self._arrays['ids.bin'], deleted) if deleted and self._count else None
+
+    def _ids(self) -> set:
+        if self._id_set is None:
+            self._id_set = set(self._arrays['ids.bin'].tolist()) if self._count else set()
+        return self._id_set
+
+    # --- Escritura ---
+
+    def append(self, ids: Sequence[Any], contents: Sequence[str], embeddings: Sequence[Sequence[float]]) -> int:
+        """
+        Agrega filas al final del snapshot; omite ids ya presentes y embeddings
+        de otra dimensión
+
+        Returns:
+            Filas agregadas
+        """
+        with self._write_lock():
+            # Otro proceso pudo haber agregado filas: partir de su meta
+            self._meta_mtime = None
+            self.open()
+            if self._incompatible:
+                return 0
+            meta = self._meta or self._new_meta(0)
+            known = self._ids()
+            rows = []
+            for doc_id, content, embedding in zip(ids, contents, embeddings):
+                if not isinstance(doc_id, int) or doc_id in known or len(embedding) != self.dim:
+                    continue
+                known.add(doc_id)
+                rows.append((doc_id, content or '', embedding))
+            if not rows:
+                return 0
+
+            exact = np.asarray([row[2] for row in rows], dtype=np.float32)
+            norms = np.linalg.norm(exact, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            exact /= norms
+            encoded = [row[1].encode('utf-8') for row in rows]
+            count = meta['count']
+            base = int(self._arrays['offsets.bin'][-1]) if count else 0
+
+            data = {
+                'ids.bin': np.asarray([row[0] for row in rows], dtype=np.int64),
+                'offsets.bin': base + np.cumsum([len(blob) for blob in encoded], dtype=np.int64),
+                'contents.bin': b''.join(encoded)
+            }
+            if not count:
+                data['offsets.bin'] = np.concatenate([np.zeros(1, dtype=np.int64), data['offsets.bin']])
+            if self.dtype == 'int8':
+                q, scales, offsets = quantize_int8(exact)
+                data['vectors.bin'] = q
+                data['scales.bin'] = np.stack([scales, offsets], axis=1)
+            else:
+                data['vectors.bin'] = exact.astype(self.dtype)
+            if self.keep_exact:
+                data['exact.bin'] = exact
+
+            # Descartar bytes de un append interrumpido antes de escribir el meta
+            lengths = self._file_lengths(count, base)
+            for name, values in data.items():
+                with open(self._file(name), 'ab') as handle:
+                    handle.truncate(lengths[name])
+                    handle.write(values if isinstance(values, bytes) else values.tobytes())
+                    handle.flush()
+                    os.fsync(handle.fileno())
+
+            new_ids = [row[0] for row in rows]
+            previous_last = meta.get('last_id')
+            meta = {
+                **meta,
+                'count': count + len(rows),
+                'last_id': max(new_ids + ([previous_last] if previous_last is not None else []))
+            }
+            self._write_meta(meta)
+            self._meta_mtime = None
+            self.open()
+            return len(rows)
+
+    def _file_lengths(self, count: int, content_bytes: int) -> Dict[str, int]:
+        """Bytes válidos de cada archivo según el meta actual"""
+        lengths = {
+            name: count * width * np.dtype(dtype).itemsize
+            for name, (dtype, width) in self._row_files().items()
+        }
+        lengths['offsets.bin'] = (count + 1) * 8 if count else 0
+        lengths['contents.bin'] = content_bytes
+        return lengths
+
+    def delete(self, ids: Iterable[Any]) -> None:
+        """Marca ids como eliminados (el espacio se recupera al reconstruir)"""
+        ids = [doc_id for doc_id in ids if isinstance(doc_id, int)]
+        if not ids:
+            return
+        with self._write_lock():
+            path = self._file('deleted.json')
+            try:
+                with open(path, encoding='utf-8') as handle:
+                    deleted = set(json.load(handle))
+            except FileNotFoundError:
+                deleted = set()
+            deleted.update(ids)
+            with open(path + '.tmp', 'w', encoding='utf-8') as handle:
+                json.dump(sorted(deleted), handle)
+            os.replace(path + '.tmp', path)
+            # Reescribir el meta avisa a los otros procesos que deben volver a abrirlo
+            meta = self._read_meta()
+            if meta and self._compatible(meta):
+                self._write_meta({**meta, 'deleted': len(deleted)})
+            self._meta_mtime = None
+        self.open()
+
+    def reset(self) -> None:
+        """
+        Descarta las filas y empieza una generación nueva vacía (cambio de
+        modelo o corpus re-embebido); el próximo refresh la vuelve a llenar.
+        Los mapas de otros procesos siguen siendo válidos hasta que la vean.
+        """
+        with self._write_lock():
+            try:
+                generation = int(self._read_meta().get('generation', 0)) + 1
+            except ValueError:
+                generation = 1
+            for name in DATA_FILES:
+                try:
+                    os.unlink(self._file(name))
+                except FileNotFoundError:
+                    pass
+            self._write_meta(self._new_meta(generation))
+            self._meta_mtime = None
+        self.ready = False
+        self.open()
+        logger.info("Snapshot de embeddings descartado", extra={'generation': generation})
+
+    def _mark_filled(self, generation: int) -> None:
+        """Anota que la generación ya tiene todo jp_documents (si nadie la reemplazó)"""
+        with self._write_lock():
+            meta = self._read_meta()
+            if meta.get('generation', 0) == generation and not meta.get('filled', True):
+                self._write_meta({**meta, 'filled': True})
+                self._meta_mtime = None
+
+    async def refresh(
+        self,
+        fetch_page: Callable[[Any, int], Awaitable[List[Dict[str, Any]]]],
+        page_size: int = 1000
+    ) -> int:
+        """
+        Agrega solo las filas nuevas (id mayor al último del snapshot), paginando
+        por id; el snapshot existente no se vuelve a descargar. Un snapshot de
+        otro modelo o formato se descarta, y una generación nueva se llena
+        desde el principio.
+
+        Args:
+            fetch_page: Corrutina (after_id, limit) -> filas con id, content y embedding
+            page_size: Filas por página
+
+        Returns:
+            Filas agregadas
+        """
+        from .vector_index import parse_embedding
+
+        if self._failed_at is not None and time.monotonic() - self._failed_at < self.RETRY_AFTER:
+            return 0
+        added = 0
+        try:
+            self.open()
+            if self._incompatible:
+                logger.warning(
+                    "El snapshot de embeddings es de otro modelo o formato, se reconstruye",
+                    extra={'model': self._meta.get('model'), 'dim': self._meta.get('dim')}
+                )
+                self.reset()
+            generation = self._meta.get('generation', 0)
+            # Una generación a medio llenar (o con inserts sueltos) se recorre desde el principio
+            filled = bool(self._meta) and self._meta.get('filled', True)
+            last_id = self._meta.get('last_id') if filled else None
+            while True:
+                rows = await fetch_page(last_id, page_size)
+                if not rows:
+                    break
+                added += self.append(
+                    [row.get('id') for row in rows],
+                    [row.get('content', '') for row in rows],
+                    [parse_embedding(row.get('embedding') or []) for row in rows]
+                )
+                if len(rows) < page_size:
+                    break
+                last_id = rows[-1].get('id')
+            if not filled:
+                self._mark_filled(generation)
+            self._generation = generation
+            self.open()
+            self.ready = self._meta.get('generation', 0) == generation
+            self._failed_at = None
+            self.last_refresh = time.monotonic()
+            logger.info("Snapshot de embeddings actualizado", extra={'rows': self._count, 'added': added})
+        except Exception as error:
+            self._failed_at = time.monotonic()
+            logger.error("No se pudo actualizar el snapshot de embeddings: %s", error)
+            if self._count:
+                # Mejor un snapshot algo atrasado que volver a la red en cada búsqueda
+                self.ready = True
+                self.last_refresh = self._failed_at
+        return added
+
+    # --- Lectura ---
+
+    def _approximate_scores(self, queries: "np.ndarray") -> "np.ndarray":
+        """Similitud (filas x consultas) contra las filas cuantizadas, bloque por bloque sobre el mapa"""
+        vectors = self._arrays['vectors.bin']
+        scores = np.empty((self._count, queries.shape[0]), dtype=np.float32)
+        for start in range(0, self._count, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, self._count)
+            block = vectors[start:end]
+            if block.dtype != np.float32:
+                block = block.astype(np.float32)
+            scores[start:end] = block @ queries.T
+        if self.dtype == 'int8':
+            # q·x * escala + offset * Σx, sin descuantizar la matriz
+            scales = self._arrays['scales.bin']
+            scores = scores * scales[:, 0:1] + scales[:, 1:2] * queries.sum(axis=1)
+        if self._deleted_mask is not None:
+            scores[self._deleted_mask] = -np.inf
+        return scores
+
+    def _top(
+        self,
+        query: "np.ndarray",
+        scores: "np.ndarray",
+        limit: int,
+        threshold: float,
+        rescore_factor: int
+    ) -> List[Dict[str, Any]]:
+        """Mejores filas de una consulta, re-puntuadas con float32 si está guardado"""
+        rescore = self.keep_exact and rescore_factor > 0
+        pool = limit * max(rescore_factor, 1) if rescore else limit
+        # Margen para el error de cuantización al filtrar por umbral
+        margin = 0.02 if rescore and self.dtype != 'float32' else 0.0
+        candidates = np.flatnonzero(scores > threshold - margin)
+        if candidates.size > pool:
+            candidates = candidates[np.argpartition(-scores[candidates], pool - 1)[:pool]]
+
+        if rescore and candidates.size:
+            candidates = np.sort(candidates)  # lectura secuencial del mapa
+            exact = self._arrays['exact.bin'][candidates] @ query
+            keep = exact > threshold
+            candidates, candidate_scores = candidates[keep], exact[keep]
+        else:
+            candidate_scores = scores[candidates]
+
+        order = np.argsort(-candidate_scores, kind='stable')[:limit]
+        offsets = self._arrays['offsets.bin']
+        contents = self._arrays['contents.bin']
+        ids = self._arrays['ids.bin']
+        return [
+            {
+                'id': int(ids[candidates[i]]),
+                'content': bytes(contents[offsets[candidates[i]]:offsets[candidates[i] + 1]]).decode('utf-8'),
+                'similarity': float(candidate_scores[i])
+            }
+            for i in order
+        ]
+
+    def search(
+        self,
+        embedding: Sequence[float],
+        limit: int = 5,
+        threshold: float = 0.6,
+        rescore_factor: int = 4
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k por similitud coseno con la semántica del RPC match_documents.
+        Con float32 guardado, los limit * rescore_factor mejores candidatos
+        aproximados se re-puntúan con los vectores exactos.
+        """
+        return self.search_batch([embedding], limit, threshold, rescore_factor)[0]
+
+    def search_batch(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        limit: int = 5,
+        threshold: float = 0.6,
+        rescore_factor: int = 4
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        search() para varias consultas: cada bloque del mapa se lee una sola
+        vez y se puntúa contra todas (bloque x consultas)
+        """
+        if not len(embeddings):
+            return []
+        self.open()
+        if not self._count or limit <= 0:
+            return [[] for _ in embeddings]
+
+        queries = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+        scores = self._approximate_scores(queries)
+        return [
+            self._top(queries[column], scores[:, column], limit, threshold, rescore_factor)
+            for column in range(queries.shape[0])
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        self.open()
+        row_bytes = sum(
+            width * np.dtype(dtype).itemsize
+            for name, (dtype, width) in self._row_files().items()
+            if name != 'exact.bin'
+        )
+        return {
+            'rows': self._count,
+            'dtype': self.dtype,
+            'rescore': self.keep_exact,
+            'deleted': int(self._deleted_mask.sum()) if self._deleted_mask is not None else 0,
+            'bytes_per_row': row_bytes,
+            'vector_bytes': self._count * row_bytes,
+            'last_id': self._meta.get('last_id'),
+            'generation': self._meta.get('generation', 0)
+        }
@@ -2,22 +2,125 @@
 Cliente para Google Gemini AI 
 """
 import asyncio
-from typing import List
-import google.generativeai as genai
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Union
+from .chunking import count_tokens
 from .config import config
+from .embedding_cache import EmbeddingCache
+from .lazy import LazyClient
+from .log import get_logger
+from .metrics import metrics
+from .rate_limit import RateLimiter
+
+if TYPE_CHECKING:
+    from .http_transport import GeminiHTTP
+
+logger = get_logger(__name__)
+
+
+def _genai() -> Any:
+    """Importa google.generativeai solo cuando se necesita (su import es lento)"""
+    import google.generativeai as genai
+    return genai
+
 
 class GeminiClient:
     """Cliente para interactuar con Google Gemini AI"""
     
-    def __init__(self):
-        if not config.GEMINI_API_KEY:
-            raise ValueError("GEMINI_API_KEY no está configurada")
-        genai.configure(api_key=config.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(config.GEMINI_MODEL)
+    def __init__(self, model: Any = None):
+        """
+        Args:
+            model: Modelo generativo a usar en lugar de GEMINI_MODEL
+                (por ejemplo un modelo falso para benchmarks sin red)
+        """
+        self._http: Optional["GeminiHTTP"] = None
+        if model is None:
+            if not config.GEMINI_API_KEY:
+                raise ValueError("GEMINI_API_KEY no está configurada")
+            if config.ASYNC_HTTP_ENABLED:
+                # API REST sobre el pool HTTP asíncrono compartido (sin hilos)
+                from .http_transport import GeminiHTTP
+                self._http = GeminiHTTP(config.GEMINI_API_KEY)
+            else:
+                genai = _genai()
+                genai.configure(api_key=config.GEMINI_API_KEY)
+                model = genai.GenerativeModel(config.GEMINI_MODEL)
+        self.model = model
+        # Cuotas separadas por modelo: embeddings y generación
+        self.embed_limiter = self._make_limiter(
+            "GEMINI-EMBED", config.GEMINI_EMBED_RPM, config.GEMINI_EMBED_TPM
+        )
+        self.generate_limiter = self._make_limiter(
+            "GEMINI-GENERATE", config.GEMINI_GENERATE_RPM, config.GEMINI_GENERATE_TPM
+        )
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        if config.EMBED_CACHE_SIZE > 0:
+            self.embedding_cache = EmbeddingCache(
+                max_size=config.EMBED_CACHE_SIZE,
+                ttl=config.EMBED_CACHE_TTL,
+                path=config.EMBED_CACHE_PATH or None
+            )
+    
+    @staticmethod
+    def _make_limiter(name: str, rpm: int, tpm: int) -> RateLimiter:
+        return RateLimiter(
+            name,
+            requests_per_minute=rpm,
+            tokens_per_minute=tpm,
+            max_retries=config.GEMINI_MAX_RETRIES,
+            base_delay=config.GEMINI_RETRY_BASE_DELAY,
+            max_delay=config.GEMINI_RETRY_MAX_DELAY,
+            min_concurrency=config.GEMINI_MIN_CONCURRENCY,
+            max_concurrency=config.GEMINI_MAX_CONCURRENCY
+        )
+    
+    def _embed_kwargs(self, content: Any, task_type: str) -> Dict[str, Any]:
+        """Argumentos para embed_content según el modelo configurado"""
+        kwargs = {
+            'model': config.GEMINI_EMBED_MODEL,
+            'content': content,
+            'task_type': task_type
+        }
+        # Para gemini-embedding-001, no se especifica output_dimensionality
+        # Este modelo produce embeddings de 768 dimensiones por defecto
+        if 'gemini-embedding-001' not in config.GEMINI_EMBED_MODEL:
+            # Para text-embedding-004 y modelos más nuevos
+            kwargs['output_dimensionality'] = config.EMBED_DIM
+        return kwargs
+    
+    @staticmethod
+    def _extract_embedding(result: Any) -> Any:
+        """Extrae el campo embedding de la respuesta (uno o varios vectores)"""
+        # Extraer embedding según la estructura de respuesta
+        if hasattr(result, 'embedding'):
+            emb = result.embedding
+            # Si es un dict con 'values'
+            if isinstance(emb, dict) and 'values' in emb:
+                return emb['values']
+            # Si tiene atributo values
+            if hasattr(emb, 'values'):
+                return list(emb.values)
+            # Si es una lista directamente
+            if isinstance(emb, list):
+                return emb
+        elif isinstance(result, dict) and 'embedding' in result:
+            emb = result['embedding']
+            if isinstance(emb, dict) and 'values' in emb:
+                return emb['values']
+            if isinstance(emb, list):
+                return emb
+        
+        raise RuntimeError("No se pudo extraer embedding de la respuesta")
+    
+    @staticmethod
+    def _query_cache_key(text: str) -> str:
+        """Llave del cache de consultas; incluye la dimensión para que un cambio de EMBED_DIM no sirva vectores viejos"""
+        return EmbeddingCache.make_key(text, f"{config.GEMINI_EMBED_MODEL}@{config.EMBED_DIM}", "RETRIEVAL_QUERY")
     
     async def generate_embedding(self, text: str) -> List[float]:
         """
-        Genera embedding para un texto usando Gemini
+        Genera embedding para un texto usando Gemini.
+        Las consultas repetidas se sirven desde el cache de embeddings.
         
         Args:
             text: Texto para generar embedding
@@ -25,53 +128,197 @@ class GeminiClient:
         Returns:
             Lista de números representando el embedding
         """
+        cache_key = None
+        if self.embedding_cache is not None:
+            cache_key = self._query_cache_key(text)
+            cached = await self.embedding_cache.get(cache_key)
+            metrics.inc('embedding_cache_lookups_total', result='hit' if cached is not None else 'miss')
+            if cached is not None:
+                return cached
+        
         try:
-            # Para gemini-embedding-001, no se especifica output_dimensionality
-            # Este modelo produce embeddings de 768 dimensiones por defecto
-            if 'gemini-embedding-001' in config.GEMINI_EMBED_MODEL:
-                result = await asyncio.to_thread(
-                    genai.embed_content,
-                    model=config.GEMINI_EMBED_MODEL,
-                    content=text,
-                    task_type="RETRIEVAL_QUERY"
-                )
-            else:
-                # Para text-embedding-004 y modelos más nuevos
-                result = await asyncio.to_thread(
-                    genai.embed_content,
-                    model=config.GEMINI_EMBED_MODEL,
-                    content=text,
-                    task_type="RETRIEVAL_QUERY",
-                    output_dimensionality=config.EMBED_DIM
-                )
-            
-            # Extraer embedding según la estructura de respuesta
-            if hasattr(result, 'embedding'):
-                emb = result.embedding
-                # Si es un dict con 'values'
-                if isinstance(emb, dict) and 'values' in emb:
-                    return emb['values']
-                # Si tiene atributo values
-                if hasattr(emb, 'values'):
-                    return list(emb.values)
-                # Si es una lista directamente
-                if isinstance(emb, list):
-                    return emb
-            elif isinstance(result, dict) and 'embedding' in result:
-                emb = result['embedding']
-                if isinstance(emb, dict) and 'values' in emb:
-                    return emb['values']
-                if isinstance(emb, list):
-                    return emb
-            
-            raise RuntimeError("No se pudo extraer embedding de la respuesta")
+            with metrics.span('query_embedding'):
+                embedding = await self._embed_one(text, "RETRIEVAL_QUERY")
+            if cache_key is not None:
+                await self.embedding_cache.set(cache_key, embedding)
+            return embedding
             
         except Exception as error:
-            print(f"Error generando embedding: {error}")
-            import traceback
-            traceback.print_exc()
+            logger.error("Error generando embedding: %s", error, exc_info=True)
             raise error
     
+    async def generate_query_embeddings(
+        self,
+        queries: List[str]
+    ) -> List[Union[List[float], BaseException]]:
+        """
+        Embeddings de muchas consultas: las que están en el cache se sirven de
+        ahí y el resto (sin repetidas) va en requests por lote a Gemini.
+
+        Args:
+            queries: Consultas en lenguaje natural
+
+        Returns:
+            Un embedding por consulta, en el mismo orden; las consultas de un
+            lote fallido reciben la excepción en su posición
+        """
+        results: List[Any] = [None] * len(queries)
+        keys: List[Optional[str]] = [None] * len(queries)
+        pending: Dict[str, List[int]] = {}
+        cached: List[Optional[List[float]]] = [None] * len(queries)
+        if self.embedding_cache is not None:
+            keys = [self._query_cache_key(query) for query in queries]
+            # Una sola lectura del disco para todas las consultas que no están en memoria
+            cached = await self.embedding_cache.get_many(keys)
+        for index, query in enumerate(queries):
+            if self.embedding_cache is not None:
+                metrics.inc('embedding_cache_lookups_total', result='hit' if cached[index] is not None else 'miss')
+                if cached[index] is not None:
+                    results[index] = cached[index]
+                    continue
+            pending.setdefault(query, []).append(index)
+
+        if pending:
+            texts = list(pending)
+            embeddings = await self.generate_embeddings(
+                texts, task_type="RETRIEVAL_QUERY", return_exceptions=True
+            )
+            for text, embedding in zip(texts, embeddings):
+                for index in pending[text]:
+                    results[index] = embedding
+                if keys[pending[text][0]] is not None and not isinstance(embedding, BaseException):
+                    await self.embedding_cache.set(keys[pending[text][0]], embedding)
+        return results
+
+    async def _embed_one(self, text: str, task_type: str) -> List[float]:
+        """Un request de embedding, con límite de tasa y reintentos"""
+        return await self.embed_limiter.call(
+            lambda: self._send_embed_one(text, task_type),
+            tokens=count_tokens(text)
+        )
+    
+    async def _send_embed_one(self, text: str, task_type: str) -> List[float]:
+        """Un request de embedding por el transporte activo"""
+        if self._http is not None:
+            return await self._http.embed(text, task_type)
+        result = await asyncio.to_thread(
+            _genai().embed_content,
+            **self._embed_kwargs(text, task_type)
+        )
+        return self._extract_embedding(result)
+    
+    async def _embed_batch(self, texts: List[str], task_type: str) -> List[List[float]]:
+        """Un solo request a Gemini para un lote de textos, con límite de tasa y reintentos"""
+        # Cada texto del lote cuenta como un request en la cuota de embeddings
+        with metrics.span('embedding_batch'):
+            embeddings = await self.embed_limiter.call(
+                lambda: self._send_embed_batch(texts, task_type),
+                requests=len(texts),
+                tokens=sum(count_tokens(text) for text in texts)
+            )
+        metrics.inc('embedded_texts_total', len(texts))
+        return embeddings
+    
+    async def _send_embed_batch(self, texts: List[str], task_type: str) -> List[List[float]]:
+        """Un solo request a Gemini para un lote de textos por el transporte activo"""
+        if self._http is not None:
+            embeddings = await self._http.embed_batch(texts, task_type)
+        else:
+            result = await asyncio.to_thread(
+                _genai().embed_content,
+                **self._embed_kwargs(texts, task_type)
+            )
+            embeddings = self._extract_embedding(result)
+        if len(embeddings) != len(texts):
+            raise RuntimeError(
+                f"Se esperaban {len(texts)} embeddings, se recibieron {len(embeddings)}"
+            )
+        return [list(emb) for emb in embeddings]
+    
+    async def generate_embeddings(
+        self,
+        texts: List[str],
+        task_type: str = "RETRIEVAL_DOCUMENT",
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        return_exceptions: bool = False
+    ) -> List[Union[List[float], BaseException]]:
+        """
+        Genera embeddings para muchos textos agrupándolos en lotes
+        
+        Args:
+            texts: Textos para generar embeddings
+            task_type: Tipo de tarea (RETRIEVAL_DOCUMENT para chunks almacenados)
+            batch_size: Textos por request (default del config: EMBED_BATCH_SIZE)
+            concurrency: Lotes en vuelo al mismo tiempo (default: EMBED_BATCH_CONCURRENCY)
+            return_exceptions: Si es True, los textos de un lote fallido reciben la
+                excepción en su posición en lugar de abortar toda la operación
+            
+        Returns:
+            Lista de embeddings en el mismo orden que los textos
+        """
+        if not texts:
+            return []
+        
+        batch_size = max(1, batch_size or config.EMBED_BATCH_SIZE)
+        semaphore = asyncio.Semaphore(max(1, concurrency or config.EMBED_BATCH_CONCURRENCY))
+        
+        async def run_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self._embed_batch(batch, task_type)
+        
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        batch_results = await asyncio.gather(
+            *(run_batch(batch) for batch in batches),
+            return_exceptions=return_exceptions
+        )
+        
+        embeddings: List[Union[List[float], BaseException]] = []
+        for batch, result in zip(batches, batch_results):
+            if isinstance(result, BaseException):
+                logger.warning("Error generando embeddings del lote: %s", result, extra={'texts': len(batch)})
+                embeddings.extend([result] * len(batch))
+            else:
+                embeddings.extend(result)
+        return embeddings
+    
+    async def _generate(self, prompt: str) -> str:
+        """Una generación completa, con límite de tasa y reintentos"""
+        return await self.generate_limiter.call(
+            lambda: self._send_generate(prompt),
+            tokens=count_tokens(prompt)
+        )
+    
+    async def _send_generate(self, prompt: str) -> str:
+        """Una generación completa por el transporte activo"""
+        if self._http is not None:
+            return await self._http.generate(prompt)
+        response = await asyncio.to_thread(self.model.generate_content, prompt)
+        return response.text if response else ''
+    
+    def _stream(self, prompt: str) -> AsyncIterator[str]:
+        """Generación en streaming con límite de tasa y reintentos antes del primer fragmento"""
+        return self.generate_limiter.stream(
+            lambda: self._send_stream(prompt),
+            tokens=count_tokens(prompt)
+        )
+    
+    async def _send_stream(self, prompt: str) -> AsyncIterator[str]:
+        """Fragmentos de texto de una generación en streaming por el transporte activo"""
+        if self._http is not None:
+            async for text in self._http.generate_stream(prompt):
+                yield text
+            return
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Fragmentos sin partes de texto (p. ej. solo metadatos de seguridad)
+                continue
+            if text:
+                yield text
+    
     async def generate_text(self, prompt: str) -> str:
         """
         Genera texto usando Gemini
@@ -83,26 +330,45 @@ class GeminiClient:
             Texto generado por el modelo
         """
         try:
-            response = await asyncio.to_thread(
-                self.model.generate_content,
-                prompt
-            )
+            with metrics.span('generation'):
+                text = await self._generate(prompt)
             
-            if response and response.text:
-                return response.text
+            if text:
+                return text
             else:
                 raise RuntimeError("No se recibió respuesta del modelo")
                 
         except Exception as error:
-            print(f"Error generando texto: {error}")
-            import traceback
-            traceback.print_exc()
+            logger.error("Error generando texto: %s", error, exc_info=True)
+            raise error
+    
+    async def generate_text_stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Genera texto usando Gemini entregando los fragmentos conforme llegan
+        
+        Args:
+            prompt: Prompt para generar el texto
+            
+        Yields:
+            Fragmentos de texto en el orden en que los produce el modelo
+        """
+        try:
+            received = False
+            with metrics.span('generation'):
+                start = time.perf_counter()
+                async for text in self._stream(prompt):
+                    if not received:
+                        metrics.observe('generation_first_token_seconds', time.perf_counter() - start)
+                    received = True
+                    yield text
+            
+            if not received:
+                raise RuntimeError("No se recibió respuesta del modelo")
+                
+        except Exception as error:
+            logger.error("Error generando texto en streaming: %s", error, exc_info=True)
             raise error
 
 
-# Instancia global del cliente - con manejo de errores
-try:
-    gemini_client = GeminiClient()
-except Exception as e:
-    print(f"⚠️  Warning: No se pudo crear cliente Gemini: {e}")
-    gemini_client = None
+# Instancia global del cliente: se construye en el primer uso
+gemini_client: GeminiClient = LazyClient(GeminiClient, "Gemini")
@@ -0,0 +1,179 @@
+"""
+Deadlines por etapa y requests "hedged": si una llamada tarda más que el p95
+reciente de su etapa se lanza un duplicado y se usa la primera respuesta
+(la otra se cancela). Recorta la cola de latencia (p99) a cambio de una
+fracción acotada de llamadas extra.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from .config import config
+from .log import get_logger
+from .metrics import metrics
+
+logger = get_logger(__name__)
+
+T = TypeVar('T')
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Una etapa no respondió dentro de su deadline (o del presupuesto total)"""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"{stage}: sin respuesta en {timeout:.2f} s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+class LatencyTracker:
+    """Ventana de las latencias recientes de una etapa para estimar su p95"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=max(1, window))
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Percentil q (0-1) de la ventana; None si aún no hay suficientes muestras"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class Budget:
+    """Presupuesto de tiempo total de una request (0 = sin límite)"""
+
+    def __init__(self, seconds: float):
+        self.deadline = time.monotonic() + seconds if seconds > 0 else None
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def timeout(self, stage_timeout: float) -> Optional[float]:
+        """Deadline de una etapa: el menor entre el suyo y lo que queda del presupuesto"""
+        limits = [limit for limit in (stage_timeout or None, self.remaining()) if limit is not None]
+        return min(limits) if limits else None
+
+
+_trackers: Dict[str, LatencyTracker] = {}
+# Llamadas y hedges por etapa, para no superar HEDGE_MAX_RATIO
+_calls: Dict[str, int] = {}
+_hedges: Dict[str, int] = {}
+
+
+def tracker(stage: str) -> LatencyTracker:
+    if stage not in _trackers:
+        _trackers[stage] = LatencyTracker(config.HEDGE_WINDOW, config.HEDGE_MIN_SAMPLES)
+    return _trackers[stage]
+
+
+def hedge_delay(stage: str) -> Optional[float]:
+    """Espera antes de lanzar el duplicado: el p95 reciente, con un piso de HEDGE_MIN_DELAY"""
+    if not config.HEDGE_ENABLED:
+        return None
+    p95 = tracker(stage).percentile(0.95)
+    if p95 is None:
+        return None
+    return max(p95, config.HEDGE_MIN_DELAY)
+
+
+def _may_hedge(stage: str) -> bool:
+    # Cota de carga extra: a lo sumo HEDGE_MAX_RATIO hedges por llamada
+    return _hedges.get(stage, 0) < config.HEDGE_MAX_RATIO * _calls.get(stage, 0)
+
+
+async def hedged(
+    stage: str,
+    factory: Callable[[], Awaitable[T]],
+    timeout: Optional[float] = None
+) -> T:
+    """
+    Ejecuta factory() con deadline y, si tarda más que el p95 de la etapa,
+    lanza un segundo intento y devuelve el primero que termine bien
+
+    Args:
+        stage: Nombre de la etapa ('embed', 'search'); cada una tiene su p95
+        factory: Crea la corrutina de la llamada (se invoca una vez por intento)
+        timeout: Segundos máximos para la etapa (None = sin deadline)
+
+    Returns:
+        El resultado del intento ganador
+
+    Raises:
+        DeadlineExceeded: Ningún intento terminó a tiempo
+    """
+    _calls[stage] = _calls.get(stage, 0) + 1
+    start = time.monotonic()
+    deadline = start + timeout if timeout is not None else None
+    delay = hedge_delay(stage)
+    hedge_at = start + delay if delay is not None else None
+    primary = asyncio.ensure_future(factory())
+    attempts = [primary]
+
+    try:
+        while True:
+            limits = [limit for limit in (deadline, hedge_at) if limit is not None]
+            wait = max(min(limits) - time.monotonic(), 0.0) if limits else None
+            done, _ = await asyncio.wait(attempts, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            error = None
+            for task in done:
+                attempts.remove(task)
+                if task.exception() is None:
+                    tracker(stage).record(time.monotonic() - start)
+                    if task is not primary:
+                        metrics.inc('hedge_wins_total', stage=stage)
+                    return task.result()
+                error = task.exception()
+            if not attempts:
+                # Los errores no se hedgean: los reintentos son del limitador
+                raise error
+
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                metrics.inc('deadline_exceeded_total', stage=stage)
+                raise DeadlineExceeded(stage, timeout)
+            if hedge_at is not None and now >= hedge_at:
+                hedge_at = None
+                if _may_hedge(stage):
+                    # El original sigue en vuelo pasado el p95: lanzar el duplicado
+                    _hedges[stage] = _hedges.get(stage, 0) + 1
+                    metrics.inc('hedged_requests_total', stage=stage)
+                    logger.debug("Request hedged", extra={'stage': stage, 'delay_s': round(delay, 3)})
+                    attempts.append(asyncio.ensure_future(factory()))
+    finally:
+        # El perdedor (o todos, si venció el deadline) se cancela
+        for task in attempts:
+            task.cancel()
+        if attempts:
+            await asyncio.gather(*attempts, return_exceptions=True)
+
+
+async def with_deadline(stage: str, awaitable: Awaitable[T], timeout: Optional[float]) -> T:
+    """Espera una etapa que no se hedgea (la generación) con su deadline"""
+    if timeout is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        metrics.inc('deadline_exceeded_total', stage=stage)
+        raise DeadlineExceeded(stage, timeout) from None
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    """p50/p95 recientes, llamadas y hedges de cada etapa"""
+    return {
+        stage: {
+            'p50_s': tracker(stage).percentile(0.5) or 0.0,
+            'p95_s': tracker(stage).percentile(0.95) or 0.0,
+            'calls': _calls.get(stage, 0),
+            'hedges': _hedges.get(stage, 0)
+        }
+        for stage in sorted(_trackers)
+    }
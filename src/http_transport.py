@@ -0,0 +1,202 @@
+"""
+Transporte HTTP asíncrono con pool de conexiones keep-alive compartido
+para Gemini (REST v1beta) y Supabase (PostgREST)
+"""
+import importlib.util
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from .config import config
+
+_http_client = None
+
+
+def get_http_client() -> Any:
+    """
+    Cliente httpx.AsyncClient compartido por todo el proceso. Las conexiones
+    se reutilizan entre requests (keep-alive) y se usa HTTP/2 si el paquete h2
+    está instalado, de modo que la concurrencia la limita el pool y no el
+    número de hilos.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        import httpx
+
+        http2 = config.HTTP2_ENABLED and importlib.util.find_spec('h2') is not None
+        _http_client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(config.HTTP_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=config.HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Cierra el pool compartido (al apagar el servidor o entre benchmarks)"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+class GeminiHTTP:
+    """Llamadas a la API REST de Gemini sobre el pool compartido"""
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None):
+        self.base_url = (base_url or config.GEMINI_API_BASE).rstrip('/')
+        self.headers = {'x-goog-api-key': api_key, 'Content-Type': 'application/json'}
+
+    @staticmethod
+    def _model_path(model: str) -> str:
+        return model if model.startswith('models/') else f"models/{model}"
+
+    def _embed_request(self, text: str, task_type: str) -> Dict[str, Any]:
+        model = self._model_path(config.GEMINI_EMBED_MODEL)
+        request = {
+            'model': model,
+            'content': {'parts': [{'text': text}]},
+            'taskType': task_type
+        }
+        # Mismo criterio que el SDK: gemini-embedding-001 usa su dimensión por defecto
+        if 'gemini-embedding-001' not in config.GEMINI_EMBED_MODEL:
+            request['outputDimensionality'] = config.EMBED_DIM
+        return request
+
+    async def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = await get_http_client().post(
+            f"{self.base_url}/v1beta/{path}",
+            headers=self.headers,
+            json=payload
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def embed(self, text: str, task_type: str) -> List[float]:
+        model = self._model_path(config.GEMINI_EMBED_MODEL)
+        data = await self._post(f"{model}:embedContent", self._embed_request(text, task_type))
+        return data['embedding']['values']
+
+    async def embed_batch(self, texts: Sequence[str], task_type: str) -> List[List[float]]:
+        model = self._model_path(config.GEMINI_EMBED_MODEL)
+        data = await self._post(
+            f"{model}:batchEmbedContents",
+            {'requests': [self._embed_request(text, task_type) for text in texts]}
+        )
+        return [item['values'] for item in data['embeddings']]
+
+    @staticmethod
+    def _candidate_text(data: Dict[str, Any]) -> str:
+        parts = []
+        for candidate in data.get('candidates', [])[:1]:
+            for part in candidate.get('content', {}).get('parts', []):
+                parts.append(part.get('text', ''))
+        return ''.join(parts)
+
+    async def generate(self, prompt: str) -> str:
+        model = self._model_path(config.GEMINI_MODEL)
+        data = await self._post(
+            f"{model}:generateContent",
+            {'contents': [{'parts': [{'text': prompt}]}]}
+        )
+        return self._candidate_text(data)
+
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        model = self._model_path(config.GEMINI_MODEL)
+        async with get_http_client().stream(
+            'POST',
+            f"{self.base_url}/v1beta/{model}:streamGenerateContent",
+            params={'alt': 'sse'},
+            headers=self.headers,
+            json={'contents': [{'parts': [{'text': prompt}]}]}
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line.startswith('data:'):
+                    text = self._candidate_text(json.loads(line[5:]))
+                    if text:
+                        yield text
+
+
+class PostgrestHTTP:
+    """Llamadas a la API PostgREST de Supabase sobre el pool compartido"""
+
+    def __init__(self, url: str, key: str):
+        self.base_url = f"{url.rstrip('/')}/rest/v1"
+        self.headers = {
+            'apikey': key,
+            'Authorization': f"Bearer {key}",
+            'Content-Type': 'application/json'
+        }
+
+    @staticmethod
+    def _in_filter(values: Sequence[Any]) -> str:
+        return f"in.({','.join(json.dumps(value) if isinstance(value, str) else str(value) for value in values)})"
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, str]] = None,
+        payload: Any = None,
+        representation: bool = False
+    ) -> List[Dict[str, Any]]:
+        headers = dict(self.headers)
+        if representation:
+            headers['Prefer'] = 'return=representation'
+        response = await get_http_client().request(
+            method,
+            f"{self.base_url}/{path}",
+            params=params,
+            headers=headers,
+            json=payload
+        )
+        response.raise_for_status()
+        return response.json() if response.content else []
+
+    async def insert(self, table: str, rows: Any) -> List[Dict[str, Any]]:
+        return await self._request('POST', table, payload=rows, representation=True)
+
+    async def update(
+        self,
+        table: str,
+        row_id: Any,
+        values: Dict[str, Any],
+        columns: str = 'id'
+    ) -> List[Dict[str, Any]]:
+        # PATCH filtrado por id: si la fila ya no existe no se crea, la respuesta viene vacía
+        return await self._request(
+            'PATCH', table, params={'id': f"eq.{row_id}", 'select': columns},
+            payload=values, representation=True
+        )
+
+    async def rpc(self, function: str, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return await self._request('POST', f"rpc/{function}", payload=payload)
+
+    async def select(
+        self,
+        table: str,
+        columns: str,
+        after_id: Any = None,
+        limit: Optional[int] = None,
+        eq: Optional[Dict[str, Any]] = None,
+        in_: Optional[Dict[str, Sequence[Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        params = {'select': columns.replace(' ', ''), 'order': 'id.asc'}
+        if after_id is not None:
+            params['id'] = f"gt.{after_id}"
+        if limit is not None:
+            params['limit'] = str(limit)
+        for column, value in (eq or {}).items():
+            params[column] = f"eq.{value}"
+        for column, values in (in_ or {}).items():
+            params[column] = self._in_filter(values)
+        return await self._request('GET', table, params=params)
+
+    async def delete(self, table: str, ids: Sequence[Any]) -> List[Dict[str, Any]]:
+        return await self._request(
+            'DELETE', table, params={'id': self._in_filter(ids)}, representation=True
+        )
@@ -0,0 +1,72 @@
+"""
+Recuperación híbrida: BM25 local primero; si su confianza es alta se responde
+sin embedding de la consulta, y si no se fusiona con la búsqueda vectorial
+por reciprocal rank fusion (RRF)
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .bm25 import reciprocal_rank_fusion
+from .config import config
+from .log import get_logger
+from .metrics import metrics
+
+logger = get_logger(__name__)
+
+
+async def hybrid_search(
+    query: str,
+    supabase_client: Any,
+    embed: Callable[[], Awaitable[List[float]]],
+    vector_search: Callable[[List[float], int], Awaitable[List[Dict[str, Any]]]],
+    limit: int,
+    threshold: float,
+    query_embedding: Optional[List[float]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[List[float]]]:
+    """
+    Busca documentos combinando el índice léxico y el vectorial
+
+    Args:
+        query: Consulta en lenguaje natural
+        supabase_client: Cliente de búsqueda (search_lexical)
+        embed: Corrutina que genera el embedding de la consulta (solo se
+            llama si el atajo léxico no alcanza)
+        vector_search: Corrutina (embedding, limit) -> documentos por similitud
+        limit: Número máximo de documentos a retornar
+        threshold: Umbral de similitud del llamador; la confianza léxica también
+            debe alcanzarlo para tomar el atajo
+        query_embedding: Embedding ya calculado, si lo hay (entonces no hay atajo:
+            la búsqueda vectorial ya no cuesta un embedding)
+
+    Returns:
+        (documentos, embedding de la consulta o None si no hizo falta). Solo
+        los resultados vectoriales traen 'similarity' (coseno); los léxicos
+        traen 'bm25' y los fusionados además 'rrf'.
+    """
+    lexical, confidence = [], 0.0
+    if config.BM25_ENABLED:
+        fetch_limit = limit * max(config.HYBRID_FETCH_FACTOR, 1)
+        lexical, confidence = await supabase_client.search_lexical(query, fetch_limit)
+
+        # Coincidencia léxica clara (una empresa, una tecnología): sin embedding ni búsqueda vectorial
+        fast_path = max(config.BM25_FAST_PATH_CONFIDENCE, threshold)
+        if query_embedding is None and lexical and confidence >= fast_path:
+            metrics.inc('hybrid_searches_total', path='lexical')
+            logger.debug("Atajo léxico", extra={'confidence': round(confidence, 3)})
+            return lexical[:limit], None
+        if lexical:
+            # Solo los candidatos cercanos al mejor puntaje léxico entran a la fusión
+            cutoff = config.BM25_MIN_RELATIVE_SCORE * lexical[0]['bm25']
+            lexical = [doc for doc in lexical if doc['bm25'] >= cutoff]
+
+    if query_embedding is None:
+        query_embedding = await embed()
+    if not query_embedding:
+        return [], query_embedding
+
+    vector = await vector_search(query_embedding, limit)
+    if not lexical:
+        metrics.inc('hybrid_searches_total', path='vector')
+        return vector, query_embedding
+
+    metrics.inc('hybrid_searches_total', path='fused')
+    return reciprocal_rank_fusion([vector, lexical], limit, config.HYBRID_RRF_K), query_embedding
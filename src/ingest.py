@@ -0,0 +1,328 @@
+"""
+Pipeline de ingesta: chunking -> embeddings por lote -> inserts multi-fila
+"""
+import asyncio
+import hashlib
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from .config import config
+from .metrics import metrics
+
+
+def chunk_hash(chunk: str) -> str:
+    """Huella del contenido de un chunk (se guarda en jp_documents.content_hash)"""
+    return hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+
+
+def notify_corpus_changed(
+    result: Dict[str, Any],
+    supabase: Any,
+    answer_cache: Any = None,
+    router: Any = None
+) -> bool:
+    """
+    Hook después de una ingesta que agregó o eliminó filas: invalida las
+    respuestas cacheadas (versión del corpus), los centroides del router y
+    los índices locales, que se recalculan en segundo plano
+
+    Returns:
+        True si el corpus cambió
+    """
+    if not (result['stored'] or result['removed']):
+        return False
+    if answer_cache is not None:
+        answer_cache.bump_corpus_version()
+    if router is not None:
+        router.stale = True
+    supabase.mark_indexes_stale()
+    return True
+
+
+def _timed_chunks(chunks: Iterable[str]) -> Iterator[str]:
+    """Itera los chunks midiendo solo el tiempo de chunking (no la espera en las colas)"""
+    iterator = iter(chunks)
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield chunk
+    finally:
+        metrics.record_stage('chunking', elapsed)
+
+
+async def ingest_chunks(
+    chunks: Iterable[str],
+    gemini: Any,
+    supabase: Any,
+    embed_batch_size: Optional[int] = None,
+    embed_concurrency: Optional[int] = None,
+    insert_concurrency: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    document_key: Optional[str] = None,
+    dedup: Optional[bool] = None,
+    delete_removed: bool = False,
+    skip: int = 0,
+    on_progress: Optional[Callable[[str, List[int]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Ejecuta la ingesta como tres etapas conectadas por colas acotadas.
+    Mientras un lote se inserta, el siguiente ya se está embebiendo, así que
+    el tiempo total se acerca al de la etapa más lenta y no a la suma de ambas.
+    Las colas acotadas aplican backpressure: el chunking no avanza más de
+    queue_size lotes por delante de los embeddings.
+
+    Args:
+        chunks: Iterable de chunks (puede ser un generador perezoso)
+        gemini: Cliente con generate_embeddings
+        supabase: Cliente con store_embeddings_bulk
+        embed_batch_size: Chunks por request de embeddings (default: EMBED_BATCH_SIZE)
+        embed_concurrency: Lotes embebiéndose a la vez (default: EMBED_BATCH_CONCURRENCY)
+        insert_concurrency: Inserts en vuelo a la vez (default: INGEST_INSERT_CONCURRENCY)
+        queue_size: Lotes en espera entre etapas (default: INGEST_QUEUE_SIZE)
+        document_key: Identificador del documento de origen de los chunks
+        dedup: Guardar la huella de cada chunk y omitir los que ya existen en el
+            mismo documento (default: CHUNK_DEDUP_ENABLED); sin document_key solo
+            se omiten los repetidos dentro del contenido. Se desactiva si
+            jp_documents no tiene las columnas de huella
+        delete_removed: Con document_key, eliminar las filas del documento cuyos
+            chunks ya no aparecen en el contenido nuevo
+        skip: Chunks iniciales ya persistidos (reanudación de un job): solo se
+            calcula su huella, no se embeben ni se insertan
+        on_progress: Callback (resultado, chunk_ids) con resultado 'stored',
+            'reused' o 'error' conforme los chunks terminan (chunk_id empieza en 1)
+
+    Returns:
+        Dict con 'total', 'stored' ({'chunk_id', 'doc_id', 'size'}), 'errors',
+        'reused' (chunks sin cambios), 'resumed' (chunks omitidos por skip),
+        'removed' (filas eliminadas) y 'stale' (filas obsoletas que no se eliminaron)
+    """
+    if dedup is None:
+        dedup = config.CHUNK_DEDUP_ENABLED
+    # Sin las columnas content_hash/document_key: inserts simples, sin huellas
+    track_hashes = dedup and await supabase.supports_dedup()
+    dedup = track_hashes
+    # Las huellas solo se comparan con las filas del mismo documento: el mismo
+    # texto en otro documento (o sin documento) es otro chunk
+    lookup_existing = dedup and document_key is not None
+    embed_batch_size = max(1, embed_batch_size or config.EMBED_BATCH_SIZE)
+    embed_workers = max(1, embed_concurrency or config.EMBED_BATCH_CONCURRENCY)
+    insert_workers = max(1, insert_concurrency or config.INGEST_INSERT_CONCURRENCY)
+    queue_size = max(1, queue_size or config.INGEST_QUEUE_SIZE)
+
+    embed_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    insert_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    total = 0
+    reused = 0
+    resumed = 0
+    seen: Set[str] = set()
+    stored: List[Dict[str, Any]] = []
+    errors: List[tuple] = []
+
+    def notify(outcome: str, chunk_ids: List[int]) -> None:
+        if on_progress is not None and chunk_ids:
+            on_progress(outcome, chunk_ids)
+
+    source = _timed_chunks(chunks)
+
+    def read_slice() -> List[tuple]:
+        # Lectura del archivo, chunking y huellas en un hilo: el loop sigue atendiendo requests
+        return [(chunk, chunk_hash(chunk)) for chunk in islice(source, embed_batch_size)]
+
+    async def produce() -> None:
+        nonlocal total, reused, resumed
+        batch: List[tuple] = []
+        while True:
+            pulled = await asyncio.to_thread(read_slice)
+            if not pulled:
+                break
+            for chunk, fingerprint in pulled:
+                total += 1
+                if total <= skip:
+                    # Persistido antes de la interrupción: cuenta para las filas obsoletas
+                    seen.add(fingerprint)
+                    resumed += 1
+                    continue
+                if dedup and fingerprint in seen:
+                    # Chunk repetido dentro del mismo documento
+                    reused += 1
+                    notify('reused', [total])
+                    continue
+                seen.add(fingerprint)
+                batch.append((total, chunk, fingerprint))
+                if len(batch) >= embed_batch_size:
+                    await embed_queue.put(batch)
+                    batch = []
+        if batch:
+            await embed_queue.put(batch)
+        for _ in range(embed_workers):
+            await embed_queue.put(None)
+
+    async def embed() -> None:
+        nonlocal reused
+        while True:
+            batch = await embed_queue.get()
+            if batch is None:
+                break
+
+            if lookup_existing:
+                # Los chunks sin cambios no se vuelven a embeber ni a insertar
+                try:
+                    existing = await supabase.find_existing_hashes(
+                        [fingerprint for _, _, fingerprint in batch],
+                        document_key
+                    )
+                except Exception as error:
+                    message = f"No se pudo verificar duplicados: {error}"
+                    errors.extend((chunk_id, message) for chunk_id, _, _ in batch)
+                    notify('error', [chunk_id for chunk_id, _, _ in batch])
+                    continue
+                unchanged = [chunk_id for chunk_id, _, fingerprint in batch if fingerprint in existing]
+                reused += len(unchanged)
+                notify('reused', unchanged)
+                batch = [item for item in batch if item[2] not in existing]
+                if not batch:
+                    continue
+
+            embeddings = await gemini.generate_embeddings(
+                [chunk for _, chunk, _ in batch],
+                task_type="RETRIEVAL_DOCUMENT",
+                batch_size=len(batch),
+                concurrency=1,
+                return_exceptions=True
+            )
+
+            # Separar los chunks cuyo embedding falló
+            ready = []
+            failed = []
+            for (chunk_id, chunk, fingerprint), embedding in zip(batch, embeddings):
+                if isinstance(embedding, BaseException):
+                    errors.append((chunk_id, str(embedding)))
+                    failed.append(chunk_id)
+                else:
+                    ready.append((chunk_id, chunk, fingerprint, embedding))
+            notify('error', failed)
+            if ready:
+                await insert_queue.put(ready)
+
+    async def insert() -> None:
+        while True:
+            batch = await insert_queue.get()
+            if batch is None:
+                break
+            results = await supabase.store_embeddings_bulk([
+                {
+                    'content': chunk,
+                    'embedding': embedding,
+                    'content_hash': fingerprint if track_hashes else None,
+                    'document_key': document_key if track_hashes else None
+                }
+                for _, chunk, fingerprint, embedding in batch
+            ])
+            outcomes: Dict[str, List[int]] = {'stored': [], 'error': []}
+            for (chunk_id, chunk, _, _), result in zip(batch, results):
+                if result['success']:
+                    stored.append({
+                        'chunk_id': chunk_id,
+                        'doc_id': result['id'],
+                        'size': len(chunk)
+                    })
+                    outcomes['stored'].append(chunk_id)
+                else:
+                    errors.append((chunk_id, result['message']))
+                    outcomes['error'].append(chunk_id)
+            for outcome, chunk_ids in outcomes.items():
+                notify(outcome, chunk_ids)
+
+    async def embed_stage() -> None:
+        await asyncio.gather(*(embed() for _ in range(embed_workers)))
+        for _ in range(insert_workers):
+            await insert_queue.put(None)
+
+    tasks = [
+        asyncio.ensure_future(produce()),
+        asyncio.ensure_future(embed_stage()),
+        *(asyncio.ensure_future(insert()) for _ in range(insert_workers))
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # Si una etapa falla, detener las demás para no quedar bloqueados en las colas
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    # Filas del documento cuyos chunks ya no existen en la versión nueva
+    removed = 0
+    stale: List[Any] = []
+    if dedup and document_key is not None:
+        rows = await supabase.fetch_document_hashes(document_key)
+        stale = [row['id'] for row in rows if row.get('content_hash') not in seen]
+        if delete_removed and stale:
+            removed = await supabase.delete_documents(stale)
+            stale = []
+
+    metrics.inc('ingested_chunks_total', len(stored), result='stored')
+    metrics.inc('ingested_chunks_total', reused, result='reused')
+    metrics.inc('ingested_chunks_total', len(errors), result='error')
+
+    stored.sort(key=lambda item: item['chunk_id'])
+    errors.sort(key=lambda item: item[0])
+    return {
+        'total': total,
+        'stored': stored,
+        'errors': [f"Chunk {chunk_id}: {message}" for chunk_id, message in errors],
+        'reused': reused,
+        'resumed': resumed,
+        'removed': removed,
+        'stale': len(stale)
+    }
+
+
+def format_ingest_summary(result: Dict[str, Any]) -> str:
+    """Resumen legible del resultado de ingest_chunks para las herramientas MCP"""
+    stored_chunks = result['stored']
+    errors = result['errors']
+    reused = result.get('reused', 0)
+    resumed = result.get('resumed', 0)
+
+    if not stored_chunks and not reused and not resumed:
+        return f" No se pudo almacenar ningún chunk. Errores: {'; '.join(errors)}"
+
+    if stored_chunks:
+        summary = f" Documento almacenado exitosamente\n"
+    else:
+        summary = f" Documento sin cambios\n"
+    summary += f" Total de chunks: {result['total']}\n"
+    summary += f" Chunks almacenados: {len(stored_chunks)}\n"
+    summary += f" Chunks reutilizados: {reused}\n"
+    if resumed:
+        summary += f" Chunks ya procesados antes de reanudar: {resumed}\n"
+    if result.get('removed'):
+        summary += f" Chunks eliminados: {result['removed']}\n"
+    if result.get('stale'):
+        summary += f" Chunks obsoletos (usa delete_removed para eliminarlos): {result['stale']}\n"
+    if errors:
+        summary += f"❌ Errores: {len(errors)}\n"
+    if stored_chunks:
+        summary += f"\n Detalles:\n"
+    for chunk_info in stored_chunks[:5]:  # Mostrar primeros 5
+        summary += f"   - Chunk {chunk_info['chunk_id']}: ID {chunk_info['doc_id']} ({chunk_info['size']} chars)\n"
+    if len(stored_chunks) > 5:
+        summary += f"   ... y {len(stored_chunks) - 5} chunks más\n"
+
+    if errors:
+        summary += f"\n Errores encontrados:\n"
+        for error in errors[:3]:
+            summary += f"   - {error}\n"
+
+    return summary
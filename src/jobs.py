@@ -0,0 +1,472 @@
+"""
+Cola de jobs de ingesta en segundo plano con checkpoint local: store_document
+devuelve un ID de job de inmediato y un pool de workers hace la ingesta
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .log import get_logger
+from .metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso servidor
+    fcntl = None
+
+logger = get_logger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+# Mensajes de error que se conservan por job (el resto solo se cuenta)
+MAX_ERROR_MESSAGES = 5
+
+
+class _Watermark:
+    """
+    Mayor n tal que los chunks 1..n ya están persistidos. Los chunks terminan
+    fuera de orden (varios lotes en vuelo); los que llegan adelantados esperan
+    en un set hasta que el hueco se cierra.
+    """
+
+    def __init__(self, start: int = 0):
+        self.value = start
+        self._ahead: set = set()
+
+    def advance(self, chunk_ids: List[int]) -> None:
+        self._ahead.update(chunk_id for chunk_id in chunk_ids if chunk_id > self.value)
+        while self.value + 1 in self._ahead:
+            self._ahead.remove(self.value + 1)
+            self.value += 1
+
+
+class IngestionJob:
+    """Estado de un job de ingesta; se serializa tal cual al checkpoint"""
+
+    FIELDS = (
+        'id', 'kind', 'params', 'status', 'watermark', 'total', 'stored', 'reused',
+        'resumed', 'removed', 'errors', 'error_messages', 'attempts', 'summary',
+        'created_at', 'started_at', 'finished_at'
+    )
+
+    def __init__(self, job_id: str, kind: str, params: Dict[str, Any]):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        # Chunks del prefijo ya persistido: al reanudar se omiten
+        self.watermark = 0
+        self.total = 0
+        self.stored = 0
+        self.reused = 0
+        self.resumed = 0
+        self.removed = 0
+        self.errors = 0
+        self.error_messages: List[str] = []
+        self.attempts = 0
+        self.summary = ''
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Solo en memoria
+        self.content: Optional[str] = None
+        self.cancel_requested = False
+        self._task: Optional[asyncio.Task] = None
+        self._progress: Optional[_Watermark] = None
+        self._run_started: Optional[float] = None
+        self._run_chunks = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IngestionJob":
+        job = cls(data['id'], data['kind'], data.get('params') or {})
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(job, field, data[field])
+        return job
+
+    def record(self, outcome: str, chunk_ids: List[int]) -> None:
+        """Callback de progreso de ingest_chunks"""
+        self._run_chunks += len(chunk_ids)
+        self.total = max(self.total, max(chunk_ids))
+        if outcome == 'stored':
+            self.stored += len(chunk_ids)
+        elif outcome == 'reused':
+            self.reused += len(chunk_ids)
+        else:
+            self.errors += len(chunk_ids)
+            return
+        # Un chunk con error detiene la marca: al reanudar se reintenta
+        self._progress.advance(chunk_ids)
+        self.watermark = self._progress.value
+
+    def throughput(self) -> float:
+        """Chunks procesados por segundo en la ejecución actual (o la última)"""
+        if self._run_started is None or not self._run_chunks:
+            return 0.0
+        end = self.finished_at if self.status in FINISHED and self.finished_at else time.time()
+        return self._run_chunks / max(end - self._run_started, 1e-9)
+
+    def status_dict(self) -> Dict[str, Any]:
+        data = {key: value for key, value in self.to_dict().items() if key != 'params'}
+        data['document_key'] = self.params.get('document_key')
+        data['chunks_per_s'] = self.throughput()
+        return data
+
+
+Progress = Callable[[str, List[int]], None]
+Runner = Callable[[IngestionJob, Progress], Awaitable[Dict[str, Any]]]
+
+
+class IngestionQueue:
+    """
+    Pool de workers asyncio que ejecuta jobs de ingesta en orden de llegada.
+    Con state_dir, cada job guarda su estado (y el contenido a ingerir) en
+    disco; tras un reinicio, resume() vuelve a encolar los que no terminaron
+    y la ingesta continúa desde la marca del último chunk persistido.
+
+    Varios procesos pueden compartir state_dir (servidor con varios workers):
+    cada job lo ejecuta el proceso que lo recibió, get()/list() leen los
+    checkpoints de los demás y cancel() les deja una marca en disco.
+    """
+
+    # Segundos mínimos entre checkpoints de progreso de un mismo job
+    CHECKPOINT_INTERVAL = 1.0
+
+    def __init__(
+        self,
+        runner: Runner,
+        workers: int = 2,
+        state_dir: Optional[str] = None,
+        history: int = 100
+    ):
+        """
+        Args:
+            runner: Corrutina (job, on_progress) que ejecuta la ingesta desde
+                job.watermark y devuelve el resultado de ingest_chunks
+            workers: Jobs ejecutándose al mismo tiempo
+            state_dir: Directorio de checkpoints (None = solo en memoria); se
+                crea con el primer job, no al arrancar
+            history: Jobs terminados que se conservan para consultar su estado
+        """
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.state_dir = state_dir
+        self.history = max(0, history)
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker_tasks: List[asyncio.Task] = []
+        self._last_checkpoint: Dict[str, float] = {}
+        self._resume_lock = None
+
+    # --- Persistencia ---
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def content_path(self, job: IngestionJob) -> Optional[str]:
+        """Archivo con el contenido de un job de documento (si hay persistencia)"""
+        if not self.state_dir:
+            return None
+        return os.path.join(self.state_dir, f"{job.id}.txt")
+
+    def _cancel_path(self, job_id: str) -> str:
+        return os.path.join(self.state_dir, f"{job_id}.cancel")
+
+    def _load(self, job_id: str) -> Optional[IngestionJob]:
+        """Estado de un job según su checkpoint (p. ej. de otro proceso)"""
+        if not self.state_dir:
+            return None
+        try:
+            with open(self._state_path(job_id), encoding='utf-8') as handle:
+                return IngestionJob.from_dict(json.load(handle))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _load_all(self) -> List[IngestionJob]:
+        if not self.state_dir or not os.path.isdir(self.state_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.state_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.state_dir, name), encoding='utf-8') as handle:
+                    entries.append(IngestionJob.from_dict(json.load(handle)))
+            except (OSError, ValueError, KeyError) as error:
+                logger.warning("Checkpoint ilegible %s: %s", name, error)
+        return entries
+
+    def _cancel_marked(self, job: IngestionJob) -> bool:
+        """Otro proceso pidió cancelar el job (archivo <id>.cancel)"""
+        return bool(self.state_dir) and os.path.exists(self._cancel_path(job.id))
+
+    def _checkpoint(self, job: IngestionJob, force: bool = False) -> None:
+        if not self.state_dir:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_checkpoint.get(job.id, 0.0) < self.CHECKPOINT_INTERVAL:
+            return
+        self._last_checkpoint[job.id] = now
+        path = self._state_path(job.id)
+        try:
+            # Escritura atómica: un corte a mitad no deja un checkpoint corrupto
+            with open(path + '.tmp', 'w', encoding='utf-8') as handle:
+                json.dump(job.to_dict(), handle, ensure_ascii=False)
+            os.replace(path + '.tmp', path)
+        except OSError as error:
+            logger.warning("No se pudo guardar el checkpoint del job %s: %s", job.id, error)
+
+    def _forget(self, job: IngestionJob) -> None:
+        self._jobs.pop(job.id, None)
+        self._last_checkpoint.pop(job.id, None)
+        if self.state_dir:
+            for path in (self._state_path(job.id), self.content_path(job), self._cancel_path(job.id)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _prune(self) -> None:
+        """Conserva solo los `history` jobs terminados más recientes"""
+        finished = sorted(
+            (job for job in self._jobs.values() if job.status in FINISHED),
+            key=lambda job: job.finished_at or 0.0
+        )
+        for job in finished[:max(len(finished) - self.history, 0)]:
+            self._forget(job)
+
+    # --- Ciclo de vida ---
+
+    def _ensure_workers(self) -> None:
+        self._worker_tasks = [task for task in self._worker_tasks if not task.done()]
+        while len(self._worker_tasks) < self.workers:
+            self._worker_tasks.append(asyncio.create_task(self._worker()))
+
+    def _claim_resume(self) -> bool:
+        """
+        Con varios procesos sobre el mismo state_dir solo uno reanuda: el que
+        obtiene el lock, que conserva mientras vive
+        """
+        if fcntl is None:
+            return True
+        handle = open(os.path.join(self.state_dir, 'resume.lock'), 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._resume_lock = handle
+        return True
+
+    async def resume(self, before: Optional[float] = None) -> int:
+        """
+        Carga los checkpoints y vuelve a encolar los jobs interrumpidos
+
+        Args:
+            before: Solo reanudar jobs creados antes de este timestamp (los
+                posteriores pertenecen a otro proceso del mismo servidor)
+
+        Returns:
+            Número de jobs reanudados
+        """
+        # Sin directorio nunca hubo un job que reanudar: no se crea ni se toma el lock
+        if not self.state_dir or not os.path.isdir(self.state_dir) or not self._claim_resume():
+            return 0
+        resumed = 0
+        for job in sorted(self._load_all(), key=lambda job: job.created_at):
+            if job.id in self._jobs or (before is not None and job.created_at >= before):
+                continue
+            self._jobs[job.id] = job
+            if job.status not in FINISHED:
+                job.status = QUEUED
+                await self._queue.put(job.id)
+                resumed += 1
+        if resumed:
+            self._ensure_workers()
+            logger.info("Jobs de ingesta reanudados", extra={'jobs': resumed})
+        self._prune()
+        return resumed
+
+    async def close(self) -> None:
+        """
+        Detiene los workers. Los jobs en curso conservan su checkpoint como
+        pendientes y se reanudan en el próximo arranque.
+        """
+        for job in self._jobs.values():
+            if job.status == RUNNING:
+                self._checkpoint(job, force=True)
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        if self._resume_lock is not None:
+            self._resume_lock.close()
+            self._resume_lock = None
+
+    # --- API ---
+
+    async def submit(
+        self,
+        kind: str,
+        params: Dict[str, Any],
+        content: Optional[str] = None
+    ) -> IngestionJob:
+        """
+        Encola un job de ingesta
+
+        Args:
+            kind: 'document' (contenido en línea) o 'file' (ruta en params['path'])
+            params: Parámetros de chunking e ingesta
+            content: Texto a ingerir para los jobs de documento
+
+        Returns:
+            El job creado (status 'queued')
+        """
+        job = IngestionJob(uuid.uuid4().hex[:12], kind, params)
+        if self.state_dir:
+            os.makedirs(self.state_dir, exist_ok=True)
+        path = self.content_path(job) if content is not None else None
+        if path:
+            # El contenido va a disco para poder reanudar tras un reinicio
+            with open(path, 'w', encoding='utf-8') as handle:
+                handle.write(content)
+        else:
+            job.content = content
+        self._jobs[job.id] = job
+        self._checkpoint(job, force=True)
+        await self._queue.put(job.id)
+        self._ensure_workers()
+        metrics.inc('ingestion_jobs_total', status='submitted')
+        logger.info("Job de ingesta encolado", extra={'job_id': job.id, 'kind': kind})
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id) or self._load(job_id)
+
+    def list(self) -> List[IngestionJob]:
+        # Los jobs de otros procesos del servidor se ven por su checkpoint
+        jobs = {job.id: job for job in self._load_all()}
+        jobs.update(self._jobs)
+        return sorted(jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    async def cancel(self, job_id: str) -> bool:
+        """
+        Cancela un job encolado o en curso. Los chunks ya insertados se
+        conservan.
+
+        Returns:
+            False si el job no existe o ya había terminado
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            # Job de otro proceso: su dueño ve la marca en el próximo lote
+            job = self._load(job_id)
+            if job is None or job.status in FINISHED:
+                return False
+            with open(self._cancel_path(job_id), 'w'):
+                pass
+            return True
+        if job.status in FINISHED:
+            return False
+        job.cancel_requested = True
+        task = job._task
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        else:
+            self._finish(job, CANCELLED)
+        return True
+
+    # --- Ejecución ---
+
+    def _finish(self, job: IngestionJob, status: str) -> None:
+        job.status = status
+        job.finished_at = time.time()
+        self._checkpoint(job, force=True)
+        if status == COMPLETED and self.state_dir:
+            # El contenido ya no hace falta; el estado queda para ingestion_status
+            try:
+                os.remove(self.content_path(job))
+            except FileNotFoundError:
+                pass
+        metrics.inc('ingestion_jobs_total', status=status)
+        logger.info(
+            "Job de ingesta terminado",
+            extra={'job_id': job.id, 'status': status, 'stored': job.stored, 'errors': job.errors}
+        )
+        self._prune()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED or job.cancel_requested:
+                continue
+            if self._cancel_marked(job):
+                job.cancel_requested = True
+                self._finish(job, CANCELLED)
+                continue
+            job._task = asyncio.ensure_future(self._run(job))
+            try:
+                await asyncio.shield(job._task)
+            except asyncio.CancelledError:
+                if not job._task.done():
+                    # Se detiene el servidor: el job queda pendiente en su checkpoint
+                    job._task.cancel()
+                    await asyncio.gather(job._task, return_exceptions=True)
+                    raise
+            finally:
+                job._task = None
+
+    async def _run(self, job: IngestionJob) -> None:
+        job.status = RUNNING
+        job.attempts += 1
+        job.started_at = job.started_at or time.time()
+        job._run_started = time.time()
+        job._run_chunks = 0
+        job._progress = _Watermark(job.watermark)
+        # Los contadores de la ejecución anterior se recalculan desde la marca
+        job.stored = job.reused = job.errors = 0
+        job.error_messages = []
+        self._checkpoint(job, force=True)
+
+        def progress(outcome: str, chunk_ids: List[int]) -> None:
+            job.record(outcome, chunk_ids)
+            self._checkpoint(job)
+            if not job.cancel_requested and self._cancel_marked(job):
+                job.cancel_requested = True
+                job._task.cancel()
+
+        try:
+            result = await self.runner(job, progress)
+        except asyncio.CancelledError:
+            if job.cancel_requested:
+                self._finish(job, CANCELLED)
+            else:
+                job.status = QUEUED
+                self._checkpoint(job, force=True)
+            raise
+        except Exception as error:
+            job.error_messages.append(str(error))
+            self._finish(job, FAILED)
+            return
+
+        job.total = result['total']
+        job.resumed = result.get('resumed', 0)
+        job.removed = result.get('removed', 0)
+        job.error_messages = result['errors'][:MAX_ERROR_MESSAGES]
+        job.summary = result.get('summary', '')
+        self._finish(job, COMPLETED)
+
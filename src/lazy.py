@@ -0,0 +1,51 @@
+"""
+Construcción perezosa de clientes para un arranque en frío rápido
+"""
+import threading
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar('T')
+
+
+class LazyClient(Generic[T]):
+    """
+    Proxy que construye el cliente real (y hace los imports pesados del SDK)
+    la primera vez que se usa uno de sus atributos. Si la construcción falla,
+    el error se lanza en ese uso y se reintenta en el siguiente.
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str):
+        self._factory = factory
+        self._name = name
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+        self._warned = False
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> T:
+        """Devuelve el cliente real, creándolo si aún no existe"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    try:
+                        self._instance = self._factory()
+                    except Exception as error:
+                        if not self._warned:
+                            logger.warning("No se pudo crear cliente %s: %s", self._name, error)
+                            self._warned = True
+                        raise
+        return self._instance
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self.get(), item)
+
+    def __repr__(self) -> str:
+        state = 'inicializado' if self.initialized else 'sin inicializar'
+        return f"<LazyClient {self._name} ({state})>"
@@ -0,0 +1,88 @@
+"""
+Logging estructurado por niveles. Se escribe a stderr: con el transporte
+stdio de MCP, stdout transporta el protocolo.
+"""
+import json
+import logging
+import sys
+from typing import Any, Dict, Optional
+
+from .config import config
+
+# Logger raíz del paquete: los módulos usan get_logger(__name__)
+PACKAGE_LOGGER = 'src'
+
+# Atributos estándar de LogRecord; el resto son campos pasados con extra={...}
+_STANDARD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_configured = False
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD_FIELDS}
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Texto legible con los campos extra al final como clave=valor"""
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea, para agregadores de logs"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            **_extra_fields(record)
+        }
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None) -> None:
+    """
+    Configura el logger del paquete (no el logger raíz de la aplicación)
+
+    Args:
+        level: DEBUG, INFO, WARNING, ERROR u OFF (default: LOG_LEVEL)
+        fmt: 'text' o 'json' (default: LOG_FORMAT)
+    """
+    global _configured
+    _configured = True
+    level = (level or config.LOG_LEVEL).upper()
+    fmt = (fmt or config.LOG_FORMAT).lower()
+
+    logger = logging.getLogger(PACKAGE_LOGGER)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.propagate = False
+
+    if level == 'OFF':
+        # Por encima de CRITICAL: las llamadas se descartan en isEnabledFor
+        logger.setLevel(logging.CRITICAL + 1)
+        return
+
+    handler = logging.StreamHandler(sys.stderr)
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(KeyValueFormatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(getattr(logging, level, logging.INFO))
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger de un módulo del paquete; configura el logging en el primer uso"""
+    if not _configured:
+        configure_logging()
+    return logging.getLogger(name)
@@ -2,100 +2,381 @@
 Servidor FastMCP para búsqueda semántica con Gemini y Supabase
 Entry point para FastMCP Cloud deployment
 """
+import asyncio
+import json
 import os
 import sys
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
 
 # Agregar el directorio actual al path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from fastmcp import FastMCP
+from fastmcp import Context, FastMCP
 from src.gemini import gemini_client
 from src.supabase_client import supabase_client
 from src.config import config
+from src.http_transport import close_http_client
+from src.lazy import LazyClient
+from src.chunking import iter_chunks, iter_file_chunks
+from src.ingest import format_ingest_summary, ingest_chunks, notify_corpus_changed
+from src.singleflight import SingleFlight, make_key
+from src.log import get_logger
+from src.metrics import metrics
+from src.context_builder import build_context
+from src.batch import check_queries, error_item, map_bounded, search_batch
+from src.jobs import IngestionJob, IngestionQueue
+from src.hedging import Budget, DeadlineExceeded, hedged, with_deadline
+from src.hybrid import hybrid_search
+
+# Nombre fijo: al ejecutarse como script __name__ es __main__
+logger = get_logger('src.main')
+
+
+async def warm_up() -> None:
+    """
+    Construye los clientes y precarga el índice local en segundo plano,
+    cuando el servidor ya está aceptando requests.
+    """
+    try:
+        # Ceder el loop primero para no retrasar el arranque del transporte
+        await asyncio.sleep(0)
+        for client in (gemini_client, supabase_client):
+            if isinstance(client, LazyClient):
+                await asyncio.to_thread(client.get)
+        if hasattr(supabase_client, 'ensure_local_index'):
+            await supabase_client.ensure_local_index()
+        if hasattr(supabase_client, 'ensure_embedding_store'):
+            await supabase_client.ensure_embedding_store()
+        if hasattr(supabase_client, 'ensure_lexical_index'):
+            await supabase_client.ensure_lexical_index()
+        await asyncio.to_thread(_get_answer_cache)
+        router = await asyncio.to_thread(_get_router)
+        if router is not None:
+            await router.build(_fetch_embeddings_page, config.LOCAL_INDEX_PAGE_SIZE)
+        logger.info("Warm-up completado")
+    except Exception as e:
+        logger.warning("Warm-up incompleto: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Lanza el warm-up sin bloquear el arranque del servidor"""
+    task = asyncio.create_task(warm_up()) if config.WARMUP_ON_START else None
+    # Jobs de ingesta interrumpidos por un reinicio continúan desde su checkpoint
+    try:
+        await _get_ingestion_queue().resume(before=config.SERVE_STARTED_AT or None)
+    except Exception as e:
+        logger.warning("No se pudieron reanudar los jobs de ingesta: %s", e)
+    try:
+        yield
+    finally:
+        if task is not None:
+            task.cancel()
+        if _ingestion_queue is not None:
+            await _ingestion_queue.close()
+        await close_http_client()
+
 
 # Crear servidor FastMCP
-mcp = FastMCP("JpChatbotMCP")
+mcp = FastMCP("JpChatbotMCP", lifespan=lifespan)
+
+# Cache semántico de respuestas (se invalida al almacenar documentos nuevos)
+_answer_cache = None
+_answer_cache_loaded = False
+
+
+# Router de consultas fuera de tema / sin contexto (centroides del corpus)
+_router = None
+_router_loaded = False
+
+
+# Cola de ingesta en segundo plano (se crea en el primer uso)
+_ingestion_queue = None
+
+
+# Consultas idénticas en curso comparten un solo trabajo (embedding, búsqueda y generación)
+_flights = SingleFlight()
+# Clientes MCP que esperan cada respuesta en curso; todos reciben el streaming
+_response_listeners: Dict[tuple, List[Context]] = {}
+
+
+def _get_answer_cache():
+    """Crea el cache de respuestas en el primer uso (importa numpy de forma diferida)"""
+    global _answer_cache, _answer_cache_loaded
+    if not _answer_cache_loaded:
+        _answer_cache_loaded = True
+        if config.ANSWER_CACHE_ENABLED:
+            from src.answer_cache import SemanticAnswerCache
+            if SemanticAnswerCache.available():
+                _answer_cache = SemanticAnswerCache(
+                    dim=config.EMBED_DIM,
+                    max_size=config.ANSWER_CACHE_SIZE,
+                    ttl=config.ANSWER_CACHE_TTL,
+                    threshold=config.ANSWER_CACHE_THRESHOLD,
+                    path=config.ANSWER_CACHE_PATH or None
+                )
+    return _answer_cache
+
+
+def _get_router():
+    """Crea el router en el primer uso (importa numpy de forma diferida)"""
+    global _router, _router_loaded
+    if not _router_loaded:
+        _router_loaded = True
+        if config.ROUTER_ENABLED:
+            from src.router import QueryRouter
+            if QueryRouter.available():
+                _router = QueryRouter(
+                    dim=config.EMBED_DIM,
+                    centroids=config.ROUTER_CENTROIDS,
+                    off_topic_threshold=config.ROUTER_OFFTOPIC_THRESHOLD,
+                    min_similarity=config.ROUTER_MIN_SIMILARITY,
+                    sample_rows=config.ROUTER_SAMPLE_ROWS,
+                    refresh_seconds=config.ROUTER_REFRESH_SECONDS
+                )
+    return _router
+
+
+async def _fetch_embeddings_page(after_id: Any, limit: int) -> List[Dict[str, Any]]:
+    return await supabase_client._select('id, embedding', after_id, limit)
+
+
+def _get_ingestion_queue() -> IngestionQueue:
+    global _ingestion_queue
+    if _ingestion_queue is None:
+        _ingestion_queue = IngestionQueue(
+            _run_ingestion_job,
+            workers=config.INGEST_WORKERS,
+            state_dir=config.INGEST_JOBS_DIR or None,
+            history=config.INGEST_JOB_HISTORY
+        )
+    return _ingestion_queue
+
+
+def _corpus_changed(result: Dict[str, Any]) -> None:
+    """El corpus cambió: las respuestas cacheadas pueden estar desactualizadas"""
+    notify_corpus_changed(result, supabase_client, _get_answer_cache(), _router)
+
+
+async def _run_ingestion_job(job: IngestionJob, on_progress) -> Dict[str, Any]:
+    """Ejecuta un job de la cola de ingesta desde su marca de reanudación"""
+    params = job.params
+    if job.kind == 'file':
+        source = params['path']
+    elif job.content is not None:
+        source = job.content
+    else:
+        # newline='' conserva el texto exacto: los chunks (y sus huellas) no cambian
+        with open(_get_ingestion_queue().content_path(job), encoding='utf-8', newline='') as handle:
+            source = handle.read()
+
+    if job.kind == 'file':
+        chunks = iter_file_chunks(
+            source,
+            params['chunk_size'],
+            params['chunk_overlap'],
+            unit=params['chunk_unit'],
+            use_mmap=params.get('use_mmap', False)
+        )
+    else:
+        chunks = iter_chunks(source, params['chunk_size'], params['chunk_overlap'], unit=params['chunk_unit'])
+
+    with metrics.span('ingestion_job'):
+        result = await ingest_chunks(
+            chunks,
+            gemini_client,
+            supabase_client,
+            document_key=params.get('document_key'),
+            delete_removed=params.get('delete_removed', False),
+            skip=job.watermark,
+            on_progress=on_progress
+        )
+    _corpus_changed(result)
+    result['summary'] = format_ingest_summary(result)
+    return result
+
+
+async def _enqueue(kind: str, params: Dict[str, Any], content: str = None) -> str:
+    job = await _get_ingestion_queue().submit(kind, params, content)
+    return (
+        f"⏳ Ingesta encolada. ID del job: {job.id}\n"
+        f"Consulta el avance con ingestion_status(job_id=\"{job.id}\")."
+    )
 
 
 @mcp.tool()
-async def store_document(content: str, chunk_size: int = 500, chunk_overlap: int = 50) -> str:
+async def store_document(
+    content: str,
+    chunk_size: int = 500,
+    chunk_overlap: int = 50,
+    document_key: str = None,
+    delete_removed: bool = False,
+    chunk_unit: str = "chars",
+    background: bool = None
+) -> str:
     """
     Almacena un documento dividiéndolo en chunks óptimos para RAG y generando embeddings.
+    Los chunks que ya existen (misma huella de contenido) no se vuelven a procesar.
+    Con background=True la ingesta se encola y se devuelve un ID de job de inmediato.
     
     Args:
         content: Contenido del documento a almacenar
         chunk_size: Tamaño máximo de cada chunk en caracteres (default: 500)
         chunk_overlap: Superposición entre chunks para mantener contexto (default: 50)
+        document_key: Identificador del documento (p. ej. "cv") para re-ingestas incrementales
+        delete_removed: Eliminar los chunks del documento que ya no aparecen en el contenido
+        chunk_unit: Unidad de chunk_size y chunk_overlap: "chars" o "tokens" (aproximados)
+        background: Encolar la ingesta en segundo plano (default: INGEST_BACKGROUND)
     
     Returns:
-        Resultado de la operación con los IDs de los chunks creados
+        Resultado de la operación con los chunks reutilizados, agregados y eliminados,
+        o el ID del job si la ingesta se encoló
     """
     try:
-        # Dividir el contenido en chunks
-        chunks = _split_into_chunks(content, chunk_size, chunk_overlap)
+        if background if background is not None else config.INGEST_BACKGROUND:
+            return await _enqueue('document', {
+                'chunk_size': chunk_size,
+                'chunk_overlap': chunk_overlap,
+                'chunk_unit': chunk_unit,
+                'document_key': document_key,
+                'delete_removed': delete_removed
+            }, content)
         
-        stored_chunks = []
-        errors = []
+        # Dividir el contenido en chunks (de forma perezosa: el embedding empieza con el primero)
+        chunks = iter_chunks(content, chunk_size, chunk_overlap, unit=chunk_unit)
         
-        # Procesar cada chunk
-        for i, chunk in enumerate(chunks, 1):
-            try:
-                # Generar embedding del chunk
-                embedding = await gemini_client.generate_embedding(chunk)
-                
-                # Almacenar en la base de datos
-                result = await supabase_client.store_embedding(chunk, embedding)
-                
-                if result['success']:
-                    stored_chunks.append({
-                        'chunk_id': i,
-                        'doc_id': result['id'],
-                        'size': len(chunk)
-                    })
-                else:
-                    errors.append(f"Chunk {i}: {result['message']}")
-                    
-            except Exception as e:
-                errors.append(f"Chunk {i}: {str(e)}")
+        # Embeddings e inserts corren como etapas de un pipeline con colas acotadas
+        with metrics.span('tool.store_document'):
+            result = await ingest_chunks(
+                chunks,
+                gemini_client,
+                supabase_client,
+                document_key=document_key,
+                delete_removed=delete_removed
+            )
+        
+        _corpus_changed(result)
         
-        # Formatear resultado
-        if stored_chunks:
-            result = f" Documento almacenado exitosamente\n"
-            result += f" Total de chunks: {len(chunks)}\n"
-            result += f" Chunks almacenados: {len(stored_chunks)}\n"
-            if errors:
-                result += f"❌ Errores: {len(errors)}\n"
-            result += f"\n Detalles:\n"
-            for chunk_info in stored_chunks[:5]:  # Mostrar primeros 5
-                result += f"   - Chunk {chunk_info['chunk_id']}: ID {chunk_info['doc_id']} ({chunk_info['size']} chars)\n"
-            if len(stored_chunks) > 5:
-                result += f"   ... y {len(stored_chunks) - 5} chunks más\n"
-            
-            if errors:
-                result += f"\n Errores encontrados:\n"
-                for error in errors[:3]:
-                    result += f"   - {error}\n"
-            
-            return result
-        else:
-            return f" No se pudo almacenar ningún chunk. Errores: {'; '.join(errors)}"
+        return format_ingest_summary(result)
         
     except Exception as e:
         return f" Error: {str(e)}"
+
+
+@mcp.tool()
+async def store_file(
+    path: str,
+    chunk_size: int = 500,
+    chunk_overlap: int = 50,
+    document_key: str = None,
+    delete_removed: bool = False,
+    chunk_unit: str = "chars",
+    use_mmap: bool = False,
+    background: bool = None
+) -> str:
+    """
+    Almacena un archivo de texto local leyéndolo por bloques; la memoria usada
+    no depende del tamaño del archivo. Con background=True la ingesta se encola
+    y se devuelve un ID de job de inmediato.
+    
+    Args:
+        path: Ruta del archivo, relativa a INGEST_FILE_ROOT
+        chunk_size: Tamaño máximo de cada chunk (default: 500)
+        chunk_overlap: Superposición entre chunks (default: 50)
+        document_key: Identificador del documento (default: la ruta del archivo)
+        delete_removed: Eliminar los chunks del documento que ya no aparecen en el archivo
+        chunk_unit: Unidad de chunk_size y chunk_overlap: "chars" o "tokens" (aproximados)
+        use_mmap: Leer el archivo mapeándolo en memoria
+        background: Encolar la ingesta en segundo plano (default: INGEST_BACKGROUND)
+    
+    Returns:
+        Resultado de la operación con los chunks reutilizados, agregados y eliminados,
+        o el ID del job si la ingesta se encoló
+    """
+    try:
+        root = os.path.realpath(config.INGEST_FILE_ROOT)
+        full_path = os.path.realpath(os.path.join(root, path))
+        if os.path.commonpath([root, full_path]) != root:
+            return f" Error: la ruta debe estar dentro de {root}"
+        if not os.path.isfile(full_path):
+            return f" Error: no existe el archivo {path}"
+        
+        if background if background is not None else config.INGEST_BACKGROUND:
+            return await _enqueue('file', {
+                'path': full_path,
+                'chunk_size': chunk_size,
+                'chunk_overlap': chunk_overlap,
+                'chunk_unit': chunk_unit,
+                'use_mmap': use_mmap,
+                'document_key': document_key or os.path.relpath(full_path, root),
+                'delete_removed': delete_removed
+            })
+        
+        chunks = iter_file_chunks(
+            full_path,
+            chunk_size,
+            chunk_overlap,
+            unit=chunk_unit,
+            use_mmap=use_mmap
+        )
+        with metrics.span('tool.store_file'):
+            result = await ingest_chunks(
+                chunks,
+                gemini_client,
+                supabase_client,
+                document_key=document_key or os.path.relpath(full_path, root),
+                delete_removed=delete_removed
+            )
+        
+        _corpus_changed(result)
+        
+        return format_ingest_summary(result)
+        
+    except Exception as e:
+        return f" Error: {str(e)}"
+
     
 @mcp.tool()
-async def generate_response(query: str) -> str:
+async def generate_response(query: str, ctx: Context | None = None) -> str:
     """
     Herramienta para generar una respuesta basada en el query del usuario.
+    Si el cliente envía un progressToken, la respuesta se transmite en fragmentos
+    como notificaciones de progreso conforme el modelo la genera. Las consultas
+    idénticas que llegan mientras otra está en curso comparten su generación.
     Args:
         query: Pregunta o consulta del usuario
     Returns:
-        Respuesta generada
+        Respuesta generada completa
     """
-    
-    context = await match_documents(query)
-    
-    PROMPT = f"""
+    key = make_key('generate_response', query)
+    listeners = _response_listeners.setdefault(key, [])
+    if ctx is not None:
+        listeners.append(ctx)
+    try:
+        with metrics.span('tool.generate_response'):
+            return await _flights.do(key, lambda: _generate_response(query, key, listeners))
+    finally:
+        if ctx is not None and ctx in listeners:
+            listeners.remove(ctx)
+
+
+async def _generate_response(
+    query: str,
+    key: tuple,
+    listeners: List[Context],
+    query_embedding: list[float] = None
+) -> str:
+    """Genera la respuesta una sola vez para todas las llamadas coalescidas"""
+    try:
+        return await _answer_query(query, listeners, query_embedding)
+    finally:
+        _response_listeners.pop(key, None)
+
+
+def _build_prompt(query: str, context: str) -> str:
+    """Prompt de generación con el contexto recuperado por el sistema RAG"""
+    return f"""
     Eres un asistente especializado cuya única función es responder preguntas sobre el
     currículum, trayectoria profesional, educación, proyectos, experiencia laboral y habilidades
     de Juan Pablo Aboytes Dessens.
@@ -121,69 +402,452 @@ async def generate_response(query: str) -> str:
 
     Respuesta:
     """
+
+
+async def _answer_query(
+    query: str,
+    listeners: List[Context],
+    query_embedding: list[float] = None
+) -> str:
+    # Cada etapa tiene su deadline y todas comparten el presupuesto de la request
+    budget = Budget(config.RESPONSE_BUDGET_SECONDS)
+    answer_cache = _get_answer_cache()
+    try:
+        if query_embedding is None:
+            query_embedding = await _embed_query(query, budget)
+        
+        # Preguntas claramente fuera del corpus: negativa sin búsqueda ni LLM
+        router = _get_router()
+        if router is not None:
+            from src.router import OFF_TOPIC, OFF_TOPIC_ANSWER
+            router.schedule_build(_fetch_embeddings_page, config.LOCAL_INDEX_PAGE_SIZE)
+            if router.route_query(query_embedding) == OFF_TOPIC:
+                return OFF_TOPIC_ANSWER
+        
+        # Reutilizar la respuesta de una consulta casi idéntica
+        corpus_version = None
+        if answer_cache is not None:
+            corpus_version = answer_cache.corpus_version
+            cached = answer_cache.lookup(query_embedding)
+            metrics.inc('answer_cache_lookups_total', result='hit' if cached is not None else 'miss')
+            if cached is not None:
+                if router is not None:
+                    router.route_cached()
+                return cached
+        
+        documents = await match_documents(query, query_embedding=query_embedding, budget=budget)
+    except DeadlineExceeded as error:
+        return _degraded_answer(error, answer_cache, query_embedding)
+    
+    # Ningún chunk recuperado es relevante: el modelo solo podría negarse
+    if router is not None:
+        from src.router import NO_CONTEXT, NO_CONTEXT_ANSWER
+        if router.route_documents(documents) == NO_CONTEXT:
+            return NO_CONTEXT_ANSWER
+    
+    # Con poco presupuesto restante, un contexto más chico acorta la generación
+    remaining = budget.remaining()
+    token_budget = None
+    if remaining is not None and remaining < config.DEGRADE_CONTEXT_BELOW:
+        token_budget = config.DEGRADED_CONTEXT_TOKENS
+        metrics.inc('degraded_responses_total', stage='context', fallback='small_context')
     
-    response = await gemini_client.generate_text(PROMPT)
+    with metrics.span('prompt_build'):
+        # Contexto compacto: chunks fusionados sin overlap y dentro del presupuesto
+        context = build_context(documents, token_budget)
+        PROMPT = _build_prompt(query, context['text'])
+    metrics.inc('context_tokens_total', context['tokens'])
+    metrics.inc('context_tokens_saved_total', context['saved_tokens'])
+    logger.debug(
+        "Contexto construido",
+        extra={key: context[key] for key in ('tokens', 'saved_tokens', 'chunks', 'merged', 'dropped')}
+    )
+    
+    if config.STREAM_RESPONSES and listeners:
+        generation = _stream_to_clients(PROMPT, listeners)
+    else:
+        generation = gemini_client.generate_text(PROMPT)
+    try:
+        response = await with_deadline('generate', generation, budget.timeout(config.GENERATE_TIMEOUT))
+    except DeadlineExceeded as error:
+        return _degraded_answer(error, answer_cache, query_embedding)
+    
+    if answer_cache is not None:
+        answer_cache.store(query_embedding, response, corpus_version)
         
     return response
 
 
+async def _embed_query(query: str, budget: Budget = None) -> list[float]:
+    """Embedding de la consulta con deadline y hedge tras el p95 reciente"""
+    return await hedged(
+        'embed',
+        lambda: gemini_client.generate_embedding(query),
+        budget.timeout(config.EMBED_TIMEOUT) if budget else config.EMBED_TIMEOUT or None
+    )
+
 
-async def match_documents(query : str) -> str:
+def _degraded_answer(error: DeadlineExceeded, answer_cache, query_embedding) -> str:
     """
-    Herramienta para a partir del query buscar informacion en la base de conocimientos.
+    Respuesta cuando una etapa agota su deadline: una respuesta cacheada que
+    supere el umbral normal del cache (otra petición pudo guardarla mientras
+    tanto) o un aviso, en lugar de dejar colgado al cliente. Nunca una
+    respuesta a otra pregunta parecida.
     """
+    logger.warning("Deadline agotado", extra={'stage': error.stage, 'timeout_s': round(error.timeout, 2)})
+    if answer_cache is not None and query_embedding:
+        cached = answer_cache.lookup(query_embedding)
+        if cached is not None:
+            metrics.inc('degraded_responses_total', stage=error.stage, fallback='cache')
+            return cached
+    metrics.inc('degraded_responses_total', stage=error.stage, fallback='notice')
+    return "⏳ No fue posible responder a tiempo: el servicio está respondiendo lento. Intenta de nuevo en unos momentos."
+
+
+async def _stream_to_clients(prompt: str, listeners: List[Context]) -> str:
+    """
+    Consume la respuesta del modelo en streaming, reenvía cada fragmento a los
+    clientes MCP que esperan la respuesta como notificación de progreso y
+    devuelve el texto completo.
+    """
+    parts = []
+    async for piece in gemini_client.generate_text_stream(prompt):
+        parts.append(piece)
+        for ctx in list(listeners):
+            try:
+                await ctx.report_progress(progress=len(parts), total=None, message=piece)
+            except Exception:
+                # El cliente se desconectó: no interrumpir la generación compartida
+                if ctx in listeners:
+                    listeners.remove(ctx)
+    return ''.join(parts)
+
+
+@mcp.tool()
+async def ingestion_status(job_id: str = None) -> str:
+    """
+    Muestra el avance de los jobs de ingesta en segundo plano.
+    Args:
+        job_id: ID devuelto por store_document/store_file (default: todos los recientes)
+    Returns:
+        Estado, chunks procesados, throughput y errores del job (o resumen de cada job)
+    """
+    queue = _get_ingestion_queue()
+    if job_id is None:
+        jobs = queue.list()
+        if not jobs:
+            return "No hay jobs de ingesta."
+        result = "📥 Jobs de ingesta:\n"
+        for job in jobs:
+            result += (
+                f"   - {job.id} [{job.status}] {job.params.get('document_key') or job.kind}: "
+                f"{job.watermark} chunks listos, {job.errors} errores\n"
+            )
+        return result
     
-    query_embedding = await gemini_client.generate_embedding(query)
-    
-    if not query_embedding:
-        print(" No se pudo generar el embedding")
-        return
-    
-    results = await supabase_client.search_similar_documents(
-        embedding=query_embedding,
-        limit=5,
-        threshold=0.5
-    )
-    
+    job = queue.get(job_id)
+    if job is None:
+        return f"❌ No existe el job {job_id}"
+    status = job.status_dict()
+    result = f"📥 Job {job.id} ({job.kind})\n"
+    result += f"   - Estado: {status['status']}\n"
+    if status['document_key']:
+        result += f"   - Documento: {status['document_key']}\n"
+    result += f"   - Chunks procesados: {status['total']} (persistidos hasta el {status['watermark']})\n"
+    result += f"   - Almacenados: {status['stored']}, reutilizados: {status['reused']}\n"
+    if status['resumed']:
+        result += f"   - Reanudaciones: {status['attempts'] - 1} ({status['resumed']} chunks ya estaban listos)\n"
+    result += f"   - Throughput: {status['chunks_per_s']:.1f} chunks/s\n"
+    result += f"   - Errores: {status['errors']}\n"
+    for message in status['error_messages']:
+        result += f"     · {message}\n"
+    if status['summary']:
+        result += f"\n{status['summary']}"
+    return result
+
+
+@mcp.tool()
+async def cancel_ingestion(job_id: str) -> str:
+    """
+    Cancela un job de ingesta encolado o en curso. Los chunks ya almacenados se conservan.
+    Args:
+        job_id: ID devuelto por store_document/store_file
+    Returns:
+        Resultado de la cancelación
+    """
+    if await _get_ingestion_queue().cancel(job_id):
+        return f"🛑 Job {job_id} cancelado."
+    job = _get_ingestion_queue().get(job_id)
+    if job is None:
+        return f"❌ No existe el job {job_id}"
+    return f"El job {job_id} ya había terminado ({job.status})."
+
+
+@mcp.tool()
+async def search_documents_batch(
+    queries: list[str],
+    limit: int = None,
+    threshold: float = None
+) -> str:
+    """
+    Busca documentos similares para una lista de consultas. Los embeddings de
+    todas las consultas se piden en lotes y la búsqueda es una sola pasada
+    vectorizada cuando el índice local está cargado.
+    Args:
+        queries: Consultas en lenguaje natural
+        limit: Número máximo de documentos por consulta (default: TOPK_DOCUMENTS)
+        threshold: Umbral de similitud 0-1 (default: SIMILARITY_THRESHOLD)
+    Returns:
+        JSON con un elemento por consulta, en el mismo orden:
+        {"index", "query", "documents"} o {"index", "query", "error"}
+    """
+    try:
+        check_queries(queries)
+        with metrics.span('tool.search_documents_batch'):
+            results = await search_batch(
+                queries,
+                gemini_client,
+                supabase_client,
+                limit if limit is not None else config.TOPK_DOCUMENTS,
+                threshold if threshold is not None else config.SIMILARITY_THRESHOLD
+            )
+        return json.dumps(results, ensure_ascii=False, default=str)
+    except Exception as e:
+        return f"❌ Error en la búsqueda por lote: {str(e)}"
+
+
+@mcp.tool()
+async def generate_responses_batch(queries: list[str], ctx: Context | None = None) -> str:
+    """
+    Genera respuestas para una lista de consultas (conjuntos de evaluación,
+    FAQs precalculadas). Los embeddings se piden en lotes y las generaciones
+    corren con concurrencia acotada (BATCH_GENERATE_CONCURRENCY). Si el cliente
+    envía un progressToken, se notifica cada respuesta terminada.
+    Args:
+        queries: Preguntas o consultas del usuario
+    Returns:
+        JSON con un elemento por consulta, en el mismo orden:
+        {"index", "query", "response"} o {"index", "query", "error"}
+    """
+    try:
+        check_queries(queries)
+        with metrics.span('tool.generate_responses_batch'):
+            results = await _generate_batch(queries, ctx)
+        return json.dumps(results, ensure_ascii=False)
+    except Exception as e:
+        return f"❌ Error en la generación por lote: {str(e)}"
+
+
+async def _generate_batch(queries: List[str], ctx: Context | None) -> List[Dict[str, Any]]:
+    valid = [i for i, query in enumerate(queries) if isinstance(query, str) and query.strip()]
+    with metrics.span('batch_query_embedding'):
+        embeddings = dict(zip(valid, await gemini_client.generate_query_embeddings(
+            [queries[i] for i in valid]
+        )))
+
+    async def answer(index: int, query: Any) -> str:
+        if index not in embeddings:
+            raise ValueError("consulta vacía")
+        if isinstance(embeddings[index], BaseException):
+            raise embeddings[index]
+        # Misma clave que generate_response: se comparte con llamadas en curso
+        key = make_key('generate_response', query)
+        listeners = _response_listeners.setdefault(key, [])
+        return await _flights.do(
+            key, lambda: _generate_response(query, key, listeners, embeddings[index])
+        )
+
+    async def report(done: int) -> None:
+        if ctx is not None:
+            await ctx.report_progress(progress=done, total=len(queries))
+
+    responses = await map_bounded(queries, answer, config.BATCH_GENERATE_CONCURRENCY, report)
+    results = [
+        error_item(index, query, response) if isinstance(response, BaseException)
+        else {'index': index, 'query': query, 'response': response}
+        for index, (query, response) in enumerate(zip(queries, responses))
+    ]
+    failed = sum(1 for item in results if 'error' in item)
+    metrics.inc('batch_queries_total', len(queries), tool='generate')
+    if failed:
+        metrics.inc('batch_query_errors_total', failed, tool='generate')
+    logger.info("Generación por lote", extra={'queries': len(queries), 'errors': failed})
     return results
-    
 
-def _split_into_chunks(text: str, chunk_size: int = 500, overlap: int = 50) -> list[str]:
+
+@mcp.tool()
+async def cache_stats() -> str:
     """
-    Divide un texto en chunks con superposición.
+    Muestra los contadores del cache de embeddings, del cache de respuestas
+    y de la coalescencia de consultas idénticas.
+    Returns:
+        Aciertos, fallos, desalojos y tamaño actual de cada cache
+    """
+    try:
+        cache = gemini_client.embedding_cache
+    except Exception:
+        cache = None
+    if cache is None:
+        result = "El cache de embeddings está desactivado.\n"
+    else:
+        stats = cache.stats()
+        result = "🗂️ Cache de embeddings:\n"
+        result += f"   - Entradas: {stats['size']}/{stats['max_size']}\n"
+        result += f"   - Aciertos: {stats['hits']} (desde disco: {stats['disk_hits']})\n"
+        result += f"   - Fallos: {stats['misses']}\n"
+        result += f"   - Tasa de aciertos: {stats['hit_rate']:.2%}\n"
+        result += f"   - Desalojos: {stats['evictions']}\n"
+        result += f"   - Expirados: {stats['expirations']}\n"
+        result += f"   - Persistente: {'sí' if stats['persistent'] else 'no'}\n"
+    
+    answer_cache = _get_answer_cache()
+    if answer_cache is None:
+        result += "\nEl cache de respuestas está desactivado.\n"
+    else:
+        stats = answer_cache.stats()
+        result += "\n💬 Cache de respuestas:\n"
+        result += f"   - Entradas: {stats['size']}/{stats['max_size']}\n"
+        result += f"   - Umbral de similitud: {stats['threshold']}\n"
+        result += f"   - Versión del corpus: {stats['corpus_version']}\n"
+        result += f"   - Aciertos: {stats['hits']}\n"
+        result += f"   - Fallos: {stats['misses']}\n"
+        result += f"   - Tasa de aciertos: {stats['hit_rate']:.2%}\n"
+        result += f"   - Desalojos: {stats['evictions']}\n"
+        result += f"   - Invalidadas: {stats['invalidations']}\n"
+        result += f"   - Compartido entre procesos: {'sí' if stats['shared'] else 'no'}\n"
     
+    router = _get_router()
+    if router is not None:
+        stats = router.stats()
+        result += "\n🧭 Router de consultas:\n"
+        result += f"   - Centroides: {stats['centroids']}{'' if stats['ready'] else ' (sin calcular)'}\n"
+        result += f"   - Consultas: {stats['queries']} ({stats['passed']} pasaron el filtro de tema)\n"
+        result += f"   - Fuera de tema: {stats['off_topic']} (umbral {stats['off_topic_threshold']})\n"
+        result += f"   - Desde el cache de respuestas: {stats['cached']}\n"
+        result += f"   - Sin contexto: {stats['no_context']}\n"
+        result += f"   - Respondidas por el LLM: {stats['answered']}\n"
+        result += f"   - Llamadas al LLM ahorradas: {stats['llm_calls_saved']} ({stats['short_circuit_rate']:.2%})\n"
+        result += f"   - Puntaje p05/p50: {stats['score_p05']:.3f} / {stats['score_p50']:.3f}\n"
+
+    lexical_index = getattr(supabase_client, 'lexical_index', None)
+    if lexical_index is not None:
+        stats = lexical_index.stats()
+        result += "\n🔤 Índice BM25:\n"
+        result += f"   - Documentos: {stats['documents']}{'' if stats['ready'] else ' (sin cargar)'}\n"
+        result += f"   - Términos: {stats['terms']}\n"
+        result += f"   - Postings: {stats['postings']} ({stats['posting_bytes'] / 1024:.1f} KiB)\n"
+        if stats['refreshed_s_ago'] is not None:
+            result += f"   - Reconstruido hace: {stats['refreshed_s_ago']:.0f} s (cada {config.BM25_REFRESH_SECONDS:g} s)\n"
+        result += f"   - Atajo léxico desde confianza: {config.BM25_FAST_PATH_CONFIDENCE}\n"
+
+    stats = _flights.stats()
+    result += "\n🔀 Consultas coalescidas:\n"
+    result += f"   - Ejecuciones: {stats['executions']}\n"
+    result += f"   - Compartidas: {stats['coalesced']}\n"
+    result += f"   - En curso: {stats['in_flight']}\n"
+    return result
+
+
+@mcp.tool()
+async def server_metrics(format: str = "summary") -> str:
+    """
+    Muestra las métricas del servidor: latencia por etapa (embedding de la consulta,
+    búsqueda vectorial, prompt, generación, chunking e inserts) y contadores.
     Args:
-        text: Texto a dividir
-        chunk_size: Tamaño máximo de cada chunk
-        overlap: Superposición entre chunks
-        
+        format: "summary" (texto legible), "json" o "prometheus"
     Returns:
-        Lista de chunks de texto
+        Métricas en el formato pedido
     """
-    if len(text) <= chunk_size:
-        return [text]
+    if not metrics.enabled:
+        return "Las métricas están desactivadas (METRICS_ENABLED=false)."
+    if format == "prometheus":
+        return metrics.render_prometheus()
     
-    chunks = []
-    start = 0
+    snapshot = metrics.snapshot()
+    if format == "json":
+        return json.dumps(snapshot, indent=2, ensure_ascii=False)
     
-    while start < len(text):
-        end = start + chunk_size
-        
-        # Si no es el último chunk, buscar el último punto o salto de línea
-        if end < len(text):
-            # Buscar el último separador natural (punto, salto de línea, etc.)
-            last_period = text.rfind('.', start, end)
-            last_newline = text.rfind('\n', start, end)
-            last_separator = max(last_period, last_newline)
-            
-            if last_separator > start + chunk_size // 2:
-                end = last_separator + 1
-        
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-        
-        # Mover el inicio con overlap
-        start = end - overlap if end < len(text) else end
+    result = f"📈 Métricas (últimos {snapshot['uptime_s']:.0f}s)\n"
+    result += "\n⏱️ Latencia por etapa:\n"
+    for stage, stats in snapshot['stages'].items():
+        result += (
+            f"   - {stage}: {stats['count']} llamadas, p50 {stats['p50_ms']:.1f} ms, "
+            f"p95 {stats['p95_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms"
+        )
+        result += f", {stats['errors']} errores\n" if stats['errors'] else "\n"
+    result += "\n🔢 Contadores:\n"
+    for name, value in snapshot['counters'].items():
+        result += f"   - {name}: {value:g}\n"
+    return result
+
+
+@mcp.resource("metrics://prometheus", mime_type="text/plain")
+def prometheus_metrics() -> str:
+    """Métricas del servidor en el formato de texto de Prometheus"""
+    return metrics.render_prometheus()
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request):
+    """Endpoint de scraping para Prometheus cuando el servidor corre por HTTP"""
+    from starlette.responses import PlainTextResponse
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+async def match_documents(query : str, query_embedding: list[float] = None, budget: Budget = None) -> str:
+    """
+    Herramienta para a partir del query buscar informacion en la base de conocimientos.
+    Si ya se tiene el embedding del query se puede pasar para no recalcularlo.
+    Las búsquedas idénticas en curso se comparten; budget acota sus deadlines.
+    """
+    return await _flights.do(
+        make_key('match_documents', query),
+        lambda: _match_documents(query, query_embedding, budget)
+    )
+
+
+async def _match_documents(query: str, query_embedding: list[float] = None, budget: Budget = None) -> str:
+    limit = 5
+    fetch_limit = limit * max(config.RERANK_FETCH_FACTOR, 1) if config.RERANK_ENABLED else limit
     
-    return chunks
+    def vector_search(embedding: list[float], count: int):
+        return hedged(
+            'search',
+            lambda: supabase_client.search_similar_documents(
+                embedding=embedding,
+                limit=count,
+                threshold=0.5
+            ),
+            budget.timeout(config.SEARCH_TIMEOUT) if budget else config.SEARCH_TIMEOUT or None
+        )
+    
+    # BM25 local primero: con una coincidencia léxica clara y sin embedding previo no hay búsqueda vectorial
+    results, query_embedding = await hybrid_search(
+        query, supabase_client, lambda: _embed_query(query, budget), vector_search, fetch_limit, 0.5, query_embedding
+    )
+    
+    if not results and not query_embedding:
+        logger.warning("No se pudo generar el embedding", extra={'query_chars': len(query)})
+        return
+
+    if config.RERANK_ENABLED and query_embedding and results and len(results) > limit:
+        results = await _rerank(query_embedding, results, limit)
+
+    return results[:limit]
+
+
+async def _rerank(query_embedding: list[float], results: list, limit: int) -> list:
+    """Reduce los candidatos sobre-recuperados a los `limit` más diversos (MMR)"""
+    from src.rerank import rerank_documents
+
+    with metrics.span('rerank'):
+        embeddings = await supabase_client.fetch_embeddings([doc['id'] for doc in results])
+        reranked = rerank_documents(
+            query_embedding, results, embeddings, limit, config.RERANK_LAMBDA
+        )
+    metrics.inc('rerank_candidates_total', len(results))
+    logger.debug(
+        "Re-ranking MMR",
+        extra={'candidates': len(results), 'with_embedding': len(embeddings), 'kept': len(reranked)}
+    )
+    return reranked
@@ -0,0 +1,226 @@
+"""
+Métricas en proceso: contadores e histogramas de latencia por etapa, con
+exportación en el formato de texto de Prometheus
+"""
+import asyncio
+import bisect
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import config
+
+# Límites de los buckets de latencia en segundos
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (
+        (key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+class Histogram:
+    """Histograma de buckets fijos con suma y conteo (acumulativo al exportar)"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count', 'min', 'max')
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Cuantil estimado interpolando dentro del bucket que lo contiene,
+        acotado por el mínimo y el máximo observados
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = max(self.buckets[index - 1] if index else 0.0, self.min)
+                upper = min(self.buckets[index] if index < len(self.buckets) else self.max, self.max)
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.max
+
+
+class _Span:
+    """Mide la duración de un bloque y la registra en el histograma de su etapa"""
+
+    __slots__ = ('_registry', '_stage', '_start')
+
+    def __init__(self, registry: "MetricsRegistry", stage: str):
+        self._registry = registry
+        self._stage = stage
+
+    def __enter__(self) -> "_Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        # Cancelar o cerrar un stream antes de tiempo no es un error de la etapa
+        failed = exc_type is not None and not issubclass(exc_type, (asyncio.CancelledError, GeneratorExit))
+        self._registry.record_stage(self._stage, time.perf_counter() - self._start, failed)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class MetricsRegistry:
+    """
+    Registro de contadores e histogramas etiquetados. Las operaciones son
+    un diccionario y una suma bajo un lock; con enabled=False no hacen nada.
+    """
+
+    def __init__(self, namespace: str = 'jp', enabled: bool = True):
+        self.namespace = namespace
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self._started = time.time()
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        """Suma value al contador name con las etiquetas dadas"""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Registra una observación (en segundos) en el histograma name"""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def record_stage(self, stage: str, seconds: float, failed: bool = False) -> None:
+        """Registra la duración de una etapa medida por fuera de span()"""
+        self.observe('stage_duration_seconds', seconds, stage=stage)
+        if failed:
+            self.inc('stage_errors_total', stage=stage)
+
+    def span(self, stage: str) -> Any:
+        """
+        Context manager que mide una etapa:
+
+            with metrics.span('vector_search'):
+                ...
+        """
+        return _Span(self, stage) if self.enabled else _NOOP_SPAN
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._started = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Resumen legible: latencias por etapa (ms) y contadores"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (h.count, h.sum, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99))
+                          for key, h in self._histograms.items()}
+
+        stages: Dict[str, Dict[str, float]] = {}
+        for (name, labels), (count, total, p50, p95, p99) in sorted(histograms.items()):
+            if name != 'stage_duration_seconds':
+                continue
+            stage = dict(labels).get('stage', '')
+            stages[stage] = {
+                'count': count,
+                'errors': int(counters.get(('stage_errors_total', labels), 0)),
+                'mean_ms': total / count * 1000 if count else 0.0,
+                'p50_ms': p50 * 1000,
+                'p95_ms': p95 * 1000,
+                'p99_ms': p99 * 1000
+            }
+        return {
+            'uptime_s': time.time() - self._started,
+            'stages': stages,
+            'counters': {
+                name + _format_labels(labels): value
+                for (name, labels), value in sorted(counters.items())
+                if name != 'stage_errors_total'
+            }
+        }
+
+    def render_prometheus(self) -> str:
+        """Todas las métricas en el formato de texto de Prometheus (v0.0.4)"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (list(h.counts), h.sum, h.count, h.buckets))
+                for key, h in self._histograms.items()
+            )
+
+        lines: List[str] = []
+        declared = set()
+        for (name, labels), value in counters:
+            full_name = f"{self.namespace}_{name}"
+            if full_name not in declared:
+                declared.add(full_name)
+                lines.append(f"# TYPE {full_name} counter")
+            lines.append(f"{full_name}{_format_labels(labels)} {value:g}")
+
+        for (name, labels), (counts, total, count, buckets) in histograms:
+            full_name = f"{self.namespace}_{name}"
+            if full_name not in declared:
+                declared.add(full_name)
+                lines.append(f"# TYPE {full_name} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{full_name}_bucket{_format_labels(labels, ('le', f'{bound:g}'))} {cumulative}")
+            lines.append(f"{full_name}_bucket{_format_labels(labels, ('le', '+Inf'))} {count}")
+            lines.append(f"{full_name}_sum{_format_labels(labels)} {total:g}")
+            lines.append(f"{full_name}_count{_format_labels(labels)} {count}")
+
+        return '\n'.join(lines) + '\n'
+
+
+# Registro global del proceso
+metrics = MetricsRegistry(enabled=config.METRICS_ENABLED)
@@ -0,0 +1,319 @@
+"""
+Re-embedding masivo de jp_documents, para cambiar GEMINI_EMBED_MODEL o
+EMBED_DIM: recorre la tabla por keyset (id), genera los embeddings nuevos por
+lotes con concurrencia acotada y los escribe con updates por id. El avance
+se guarda en un checkpoint y una corrida interrumpida continúa donde quedó.
+Al terminar invalida las copias locales de la tabla (índices y snapshot) y
+las respuestas cacheadas.
+
+Uso:
+    python -m src.migration [--column embedding] [--page-size 500] [--restart]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import config
+from .log import get_logger
+from .metrics import metrics
+
+logger = get_logger(__name__)
+
+# IDs con error que se muestran en el resumen (el checkpoint los guarda todos)
+MAX_FAILED_SHOWN = 10
+
+
+class MigrationState:
+    """Avance de una migración; se serializa tal cual al checkpoint"""
+
+    FIELDS = (
+        'model', 'dim', 'column', 'status', 'last_id', 'processed', 'skipped',
+        'failed_ids', 'elapsed', 'runs', 'started_at', 'finished_at'
+    )
+
+    def __init__(self, model: str, dim: int, column: str):
+        self.model = model
+        self.dim = dim
+        self.column = column
+        self.status = 'running'
+        # Última fila (por id) cuyo lote ya quedó escrito o registrado como fallido
+        self.last_id: Any = None
+        self.processed = 0
+        self.skipped = 0
+        self.failed_ids: List[Any] = []
+        # Segundos acumulados de todas las corridas
+        self.elapsed = 0.0
+        self.runs = 0
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MigrationState":
+        state = cls(data['model'], data['dim'], data['column'])
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(state, field, data[field])
+        return state
+
+    def rows_per_second(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+
+class ReembedMigration:
+    """
+    Migra los embeddings de jp_documents al modelo y la dimensión actuales
+    del config. Con una columna destino distinta de 'embedding' la búsqueda
+    sigue usando la columna vieja hasta que se renombran (ver README).
+    """
+
+    def __init__(
+        self,
+        gemini: Any,
+        supabase: Any,
+        checkpoint_path: Optional[str] = None,
+        column: Optional[str] = None,
+        page_size: Optional[int] = None,
+        write_batch_size: Optional[int] = None,
+        write_concurrency: Optional[int] = None
+    ):
+        """
+        Args:
+            gemini: Cliente Gemini (generate_embeddings)
+            supabase: Cliente Supabase (_select por keyset y update_embeddings)
+            checkpoint_path: Archivo de checkpoint (default: MIGRATION_CHECKPOINT_PATH)
+            column: Columna destino de los embeddings (default: MIGRATION_COLUMN)
+            page_size: Filas leídas por página (default: MIGRATION_PAGE_SIZE)
+            write_batch_size: Filas por lote de escritura (default: MIGRATION_WRITE_BATCH_SIZE)
+            write_concurrency: Lotes de escritura en vuelo (default: MIGRATION_WRITE_CONCURRENCY)
+        """
+        self.gemini = gemini
+        self.supabase = supabase
+        self.checkpoint_path = checkpoint_path or config.MIGRATION_CHECKPOINT_PATH
+        self.column = column or config.MIGRATION_COLUMN
+        self.page_size = max(1, page_size or config.MIGRATION_PAGE_SIZE)
+        self.write_batch_size = max(1, write_batch_size or config.MIGRATION_WRITE_BATCH_SIZE)
+        self.write_concurrency = max(1, write_concurrency or config.MIGRATION_WRITE_CONCURRENCY)
+
+    # --- Checkpoint ---
+
+    def load_state(self) -> Optional[MigrationState]:
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as handle:
+                return MigrationState.from_dict(json.load(handle))
+        except FileNotFoundError:
+            return None
+
+    def _save_state(self, state: MigrationState) -> None:
+        directory = os.path.dirname(os.path.abspath(self.checkpoint_path))
+        os.makedirs(directory, exist_ok=True)
+        # Escritura atómica: un corte a mitad no deja un checkpoint corrupto
+        with open(self.checkpoint_path + '.tmp', 'w', encoding='utf-8') as handle:
+            json.dump(state.to_dict(), handle)
+        os.replace(self.checkpoint_path + '.tmp', self.checkpoint_path)
+
+    def _initial_state(self, restart: bool) -> MigrationState:
+        state = None if restart else self.load_state()
+        if state is None:
+            return MigrationState(config.GEMINI_EMBED_MODEL, config.EMBED_DIM, self.column)
+        target = (config.GEMINI_EMBED_MODEL, config.EMBED_DIM, self.column)
+        if (state.model, state.dim, state.column) != target:
+            raise ValueError(
+                f"El checkpoint {self.checkpoint_path} es de otra migración "
+                f"({state.model}, {state.dim} dimensiones, columna {state.column}); "
+                f"usa --restart para empezar de nuevo"
+            )
+        return state
+
+    # --- Ejecución ---
+
+    async def _process(self, rows: List[Dict[str, Any]], state: MigrationState) -> List[Any]:
+        """Re-embebe y escribe un grupo de filas; devuelve los ids que fallaron"""
+        rows = [row for row in rows if row.get('content')]
+        if not rows:
+            return []
+        embeddings = await self.gemini.generate_embeddings(
+            [row['content'] for row in rows],
+            task_type="RETRIEVAL_DOCUMENT",
+            return_exceptions=True
+        )
+
+        ready, failed = [], []
+        for row, embedding in zip(rows, embeddings):
+            if isinstance(embedding, BaseException):
+                failed.append(row['id'])
+                continue
+            if len(embedding) != state.dim:
+                # Modelo y EMBED_DIM no coinciden: no tiene sentido seguir
+                raise ValueError(
+                    f"{state.model} devolvió {len(embedding)} dimensiones y EMBED_DIM es {state.dim}"
+                )
+            ready.append({'id': row['id'], 'embedding': embedding})
+
+        semaphore = asyncio.Semaphore(self.write_concurrency)
+
+        async def write(batch: List[Dict[str, Any]]) -> None:
+            async with semaphore:
+                try:
+                    await self.supabase.update_embeddings(batch, dim=state.dim, column=state.column)
+                except Exception as error:
+                    logger.warning("Falló la escritura del lote: %s", error, extra={'rows': len(batch)})
+                    failed.extend(row['id'] for row in batch)
+
+        await asyncio.gather(*(
+            write(ready[start:start + self.write_batch_size])
+            for start in range(0, len(ready), self.write_batch_size)
+        ))
+        return failed
+
+    async def run(
+        self,
+        restart: bool = False,
+        on_progress: Optional[Callable[[MigrationState], None]] = None
+    ) -> MigrationState:
+        """
+        Ejecuta (o reanuda) la migración hasta el final de la tabla
+
+        Args:
+            restart: Ignorar el checkpoint y empezar desde la primera fila
+            on_progress: Se llama con el estado después de cada página
+
+        Returns:
+            Estado final (también queda en el checkpoint)
+        """
+        state = self._initial_state(restart)
+        if state.status == 'completed' and not state.failed_ids:
+            return state
+        state.status = 'running'
+        state.runs += 1
+        run_start = time.perf_counter()
+        run_elapsed = state.elapsed
+
+        def checkpoint(rows: int, skipped: int) -> None:
+            state.processed += rows
+            state.skipped += skipped
+            state.elapsed = run_elapsed + time.perf_counter() - run_start
+            self._save_state(state)
+            metrics.inc('migrated_rows_total', rows)
+            if on_progress is not None:
+                on_progress(state)
+
+        # Primero se reintentan las filas que fallaron en corridas anteriores
+        retry, state.failed_ids = state.failed_ids, []
+        for start in range(0, len(retry), self.page_size):
+            rows = await self.supabase._select('id, content', in_={'id': retry[start:start + self.page_size]})
+            failed = await self._process(rows, state)
+            state.failed_ids.extend(failed)
+            checkpoint(len(rows) - len(failed), 0)
+
+        # Paginación por keyset: la página siguiente se pide mientras se procesa la actual
+        def fetch(after_id: Any):
+            return self.supabase._select('id, content', after_id, self.page_size)
+
+        next_page = asyncio.ensure_future(fetch(state.last_id))
+        try:
+            while True:
+                with metrics.span('migration_page'):
+                    page = await next_page
+                    if not page:
+                        break
+                    if len(page) == self.page_size:
+                        next_page = asyncio.ensure_future(fetch(page[-1]['id']))
+                    failed = await self._process(page, state)
+                state.failed_ids.extend(failed)
+                state.last_id = page[-1]['id']
+                skipped = sum(1 for row in page if not row.get('content'))
+                checkpoint(len(page) - len(failed) - skipped, skipped)
+                if len(page) < self.page_size:
+                    break
+        finally:
+            if not next_page.done():
+                next_page.cancel()
+
+        state.status = 'completed'
+        state.finished_at = time.time()
+        checkpoint(0, 0)
+        # Las copias locales de jp_documents tienen los embeddings anteriores
+        self.supabase.invalidate_local_copies()
+        return state
+
+
+def format_migration_summary(state: MigrationState) -> str:
+    """Resumen legible del estado de una migración"""
+    summary = f"🔁 Migración de embeddings ({state.model}, {state.dim} dimensiones → columna {state.column})\n"
+    summary += f"   - Estado: {state.status}\n"
+    summary += f"   - Filas migradas: {state.processed} (sin contenido: {state.skipped})\n"
+    summary += f"   - Último id: {state.last_id}\n"
+    summary += f"   - Throughput: {state.rows_per_second():.1f} filas/s en {state.elapsed:.1f} s ({state.runs} corridas)\n"
+    if state.failed_ids:
+        shown = ', '.join(str(row_id) for row_id in state.failed_ids[:MAX_FAILED_SHOWN])
+        more = f" y {len(state.failed_ids) - MAX_FAILED_SHOWN} más" if len(state.failed_ids) > MAX_FAILED_SHOWN else ""
+        summary += f"❌ Filas con error (se reintentan en la próxima corrida): {shown}{more}\n"
+    return summary
+
+
+def bump_answer_cache_version() -> None:
+    """
+    Invalida las respuestas cacheadas por los servidores: con ANSWER_CACHE_PATH
+    la versión del corpus se comparte por SQLite (en memoria, cada proceso las
+    descarta al vencer ANSWER_CACHE_TTL o al reiniciarse)
+    """
+    from .answer_cache import open_shared_cache
+    answer_cache = open_shared_cache()
+    if answer_cache is not None:
+        answer_cache.bump_corpus_version()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--column', default=config.MIGRATION_COLUMN)
+    parser.add_argument('--page-size', type=int, default=config.MIGRATION_PAGE_SIZE)
+    parser.add_argument('--checkpoint', default=config.MIGRATION_CHECKPOINT_PATH)
+    parser.add_argument('--restart', action='store_true', help='ignorar el checkpoint existente')
+    args = parser.parse_args()
+
+    from .gemini import gemini_client
+    from .http_transport import close_http_client
+    from .supabase_client import supabase_client
+
+    migration = ReembedMigration(
+        gemini_client, supabase_client,
+        checkpoint_path=args.checkpoint,
+        column=args.column,
+        page_size=args.page_size
+    )
+
+    def report(state: MigrationState) -> None:
+        logger.info(
+            "Migración en curso",
+            extra={
+                'last_id': state.last_id,
+                'rows': state.processed,
+                'failed': len(state.failed_ids),
+                'rows_per_s': round(state.rows_per_second(), 1)
+            }
+        )
+
+    async def run() -> MigrationState:
+        try:
+            return await migration.run(restart=args.restart, on_progress=report)
+        finally:
+            await close_http_client()
+
+    state = asyncio.run(run())
+    if state.status == 'completed':
+        bump_answer_cache_version()
+    # stdout queda libre (mismo criterio que el servidor): el resumen va al log, en stderr
+    logger.info(
+        "Migración terminada\n%s", format_migration_summary(state).rstrip(),
+        extra={'status': state.status, 'rows': state.processed, 'failed': len(state.failed_ids)}
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""
+Limitador de tasa adaptativo para las llamadas a Gemini: token bucket de
+requests y tokens por minuto, ventana de concurrencia AIMD y reintentos con
+backoff exponencial con jitter
+"""
+import asyncio
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+from .log import get_logger
+from .metrics import metrics
+
+logger = get_logger(__name__)
+
+T = TypeVar('T')
+
+# Códigos HTTP que indican que el servicio está limitando la tasa
+THROTTLE_STATUS = {429, 503}
+# Códigos HTTP transitorios que vale la pena reintentar
+RETRYABLE_STATUS = THROTTLE_STATUS | {500, 502, 504}
+# Fragmentos de mensaje con los que el SDK reporta cuota agotada
+_THROTTLE_MARKERS = ('429', 'resource_exhausted', 'resource exhausted', 'quota', 'rate limit')
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """Código HTTP de un error de httpx o de google.api_core, si lo tiene"""
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is None:
+        status = getattr(error, 'code', None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    """True si el error indica límite de tasa o cuota (429/503)"""
+    status = _status_code(error)
+    if status is not None:
+        return status in THROTTLE_STATUS
+    message = str(error).lower()
+    return any(marker in message for marker in _THROTTLE_MARKERS)
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """True si el error es transitorio: límite de tasa, 5xx, timeout o conexión"""
+    if is_throttle_error(error):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # Timeouts y errores de conexión (incluye los de httpx por nombre de clase)
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    return type(error).__name__ in ('ConnectError', 'ReadTimeout', 'ConnectTimeout', 'RemoteProtocolError')
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Segundos indicados por la cabecera Retry-After de la respuesta, si existe"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket con recarga continua. La capacidad es el límite por minuto,
+    así que se admite una ráfaga de hasta un minuto de cuota. Un límite de 0
+    desactiva el bucket.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self._rate = self.capacity / 60
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        """Espera hasta poder consumir amount unidades (en orden de llegada)"""
+        if self.capacity <= 0:
+            return
+        # Un request mayor que la capacidad nunca cabría: se limita a un minuto
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self._tokens < amount:
+                await asyncio.sleep((amount - self._tokens) / self._rate)
+                self._refill()
+            self._tokens -= amount
+
+    def drain(self) -> None:
+        """Vacía el bucket (tras un 429, la cuota real está agotada)"""
+        if self.capacity > 0:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+
+
+class AdaptiveConcurrency:
+    """
+    Ventana de concurrencia AIMD: crece en uno por cada ventana completa de
+    requests exitosos y se reduce a la mitad cuando el servicio limita la
+    tasa. Solo se reduce una vez por cada ronda de requests, para que una
+    ráfaga de 429 simultáneos no la colapse hasta el mínimo.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.active = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> float:
+        """Espera un lugar en la ventana; devuelve el instante de inicio"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+        return time.monotonic()
+
+    async def release(self, started: float, throttled: bool) -> None:
+        async with self._condition:
+            self.active -= 1
+            if throttled:
+                if started >= self._last_decrease:
+                    self.limit = max(float(self.minimum), self.limit / 2)
+                    self._last_decrease = time.monotonic()
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class RateLimiter:
+    """
+    Controla las llamadas a un modelo: espera cuota en los buckets de RPM y
+    TPM, ocupa un lugar en la ventana adaptativa y reintenta los errores
+    transitorios con backoff exponencial con jitter completo. Tras un 429
+    todas las llamadas en curso pausan hasta que pasa el backoff, en lugar
+    de seguir golpeando la API.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        min_concurrency: int = 1,
+        max_concurrency: int = 16
+    ):
+        self.name = name
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.window = AdaptiveConcurrency(max_concurrency, min_concurrency, max_concurrency)
+        self._resume_at = 0.0
+        self._stats = {'calls': 0, 'retries': 0, 'throttled': 0, 'failures': 0}
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = _retry_after(error)
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    async def _admit(self, requests: float, tokens: float) -> float:
+        pause = self._resume_at - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        await self.requests.acquire(requests)
+        await self.tokens.acquire(tokens)
+        return await self.window.acquire()
+
+    async def _on_error(self, error: BaseException, attempt: int) -> None:
+        """Decide si reintentar; si no, relanza el error"""
+        throttled = is_throttle_error(error)
+        if throttled:
+            self._stats['throttled'] += 1
+            metrics.inc('rate_limit_throttled_total', limiter=self.name)
+            self.requests.drain()
+        if attempt >= self.max_retries or not is_retryable_error(error):
+            self._stats['failures'] += 1
+            raise error
+        delay = self._backoff(attempt, error)
+        if throttled:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+        self._stats['retries'] += 1
+        metrics.inc('rate_limit_retries_total', limiter=self.name)
+        logger.warning(
+            "Reintento %d/%d en %.1fs: %s",
+            attempt + 1, self.max_retries, delay, type(error).__name__,
+            extra={'limiter': self.name, 'window': int(self.window.limit)}
+        )
+        await asyncio.sleep(delay)
+
+    async def call(
+        self,
+        operation: Callable[[], Awaitable[T]],
+        requests: float = 1,
+        tokens: float = 0
+    ) -> T:
+        """
+        Ejecuta operation respetando los límites y reintentando errores transitorios
+
+        Args:
+            operation: Función sin argumentos que crea la corrutina (una por intento)
+            requests: Requests que consume la llamada en la cuota RPM
+            tokens: Tokens estimados que consume la llamada en la cuota TPM
+
+        Returns:
+            El resultado de operation
+        """
+        self._stats['calls'] += 1
+        attempt = 0
+        while True:
+            started = await self._admit(requests, tokens)
+            try:
+                result = await operation()
+            except BaseException as error:
+                # Cancelaciones incluidas: el lugar en la ventana siempre se libera
+                retryable = isinstance(error, Exception)
+                await self.window.release(started, retryable and is_throttle_error(error))
+                if not retryable:
+                    raise
+                await self._on_error(error, attempt)
+                attempt += 1
+                continue
+            await self.window.release(started, False)
+            return result
+
+    async def stream(
+        self,
+        operation: Callable[[], AsyncIterator[T]],
+        requests: float = 1,
+        tokens: float = 0
+    ) -> AsyncIterator[T]:
+        """
+        Como call, para un stream. Solo se reintenta si el error ocurre antes del
+        primer fragmento; después ya se entregó texto y el error se propaga.
+        """
+        self._stats['calls'] += 1
+        attempt = 0
+        while True:
+            started = await self._admit(requests, tokens)
+            received = False
+            released = False
+            try:
+                async for item in operation():
+                    if not received:
+                        # La ventana limita requests en vuelo, no la lectura del stream
+                        received = True
+                        released = True
+                        await self.window.release(started, False)
+                    yield item
+            except BaseException as error:
+                retryable = isinstance(error, Exception)
+                if not released:
+                    await self.window.release(started, retryable and is_throttle_error(error))
+                if not retryable:
+                    raise
+                if received:
+                    self._stats['failures'] += 1
+                    raise
+                await self._on_error(error, attempt)
+                attempt += 1
+                continue
+            if not released:
+                await self.window.release(started, False)
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            'concurrency_limit': int(self.window.limit),
+            'in_flight': self.window.active
+        }
@@ -0,0 +1,93 @@
+"""
+Re-ranking por diversidad con Maximal Marginal Relevance (MMR) vectorizado
+"""
+from typing import Any, Dict, List, Mapping, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él no se re-rankea
+    np = None
+
+
+def available() -> bool:
+    return np is not None
+
+
+def mmr(
+    query: Sequence[float],
+    candidates: "np.ndarray",
+    k: int,
+    lambda_: float = 0.7
+) -> List[int]:
+    """
+    Selecciona k candidatos maximizando
+    lambda * sim(consulta, d) - (1 - lambda) * max sim(d, ya elegidos)
+
+    Las similitudes consulta-candidato y candidato-candidato se calculan con
+    dos productos de matrices; cada paso de la selección es O(n) vectorizado.
+
+    Args:
+        query: Embedding de la consulta
+        candidates: Matriz (n, dim) con los embeddings de los candidatos
+        k: Número de candidatos a devolver
+        lambda_: 1 = solo relevancia, 0 = solo diversidad
+
+    Returns:
+        Posiciones de los candidatos elegidos, en orden de selección
+    """
+    matrix = np.asarray(candidates, dtype=np.float32)
+    count = matrix.shape[0]
+    k = min(k, count)
+    if k <= 0:
+        return []
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = matrix / norms
+    vector = np.asarray(query, dtype=np.float32)
+    vector = vector / (np.linalg.norm(vector) or 1.0)
+
+    relevance = matrix @ vector
+    similarity = matrix @ matrix.T
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = similarity[selected[0]].copy()
+    available_mask = np.ones(count, dtype=bool)
+    available_mask[selected[0]] = False
+
+    while len(selected) < k:
+        scores = lambda_ * relevance - (1 - lambda_) * redundancy
+        scores[~available_mask] = -np.inf
+        choice = int(np.argmax(scores))
+        selected.append(choice)
+        available_mask[choice] = False
+        np.maximum(redundancy, similarity[choice], out=redundancy)
+    return selected
+
+
+def rerank_documents(
+    query_embedding: Sequence[float],
+    documents: List[Dict[str, Any]],
+    embeddings: Mapping[Any, Sequence[float]],
+    k: int,
+    lambda_: float = 0.7
+) -> List[Dict[str, Any]]:
+    """
+    Re-rankea resultados de búsqueda con MMR y devuelve los k más útiles
+
+    Args:
+        query_embedding: Embedding de la consulta
+        documents: Candidatos ({'id', 'content', 'similarity'}) ordenados por similitud
+        embeddings: Embeddings de los candidatos por id
+        k: Número de documentos a devolver
+        lambda_: Balance entre relevancia (1) y diversidad (0)
+
+    Returns:
+        Hasta k documentos en orden MMR. Los candidatos sin embedding conocido
+        no participan; si no hay embeddings se devuelven los k primeros.
+    """
+    scored = [doc for doc in documents if doc.get('id') in embeddings]
+    if len(scored) <= 1 or np is None:
+        return documents[:k]
+    matrix = np.stack([np.asarray(embeddings[doc['id']], dtype=np.float32) for doc in scored])
+    return [scored[position] for position in mmr(query_embedding, matrix, k, lambda_)]
@@ -0,0 +1,260 @@
+"""
+Enrutamiento de consultas antes de la generación: las preguntas claramente
+fuera del tema del corpus y las que no recuperan ningún chunk relevante
+reciben la negativa fija sin pagar la búsqueda vectorial ni la llamada al LLM
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # sin numpy solo se aplica la regla de "sin contexto"
+    np = None
+
+from .log import get_logger
+from .metrics import metrics
+from .vector_index import parse_embedding
+
+logger = get_logger(__name__)
+
+OFF_TOPIC_ANSWER = (
+    "Solo puedo responder preguntas sobre el currículum, la trayectoria profesional, "
+    "la educación, los proyectos, la experiencia laboral y las habilidades de "
+    "Juan Pablo Aboytes Dessens."
+)
+NO_CONTEXT_ANSWER = (
+    "No encontré información sobre eso en la base de conocimiento del currículum "
+    "de Juan Pablo Aboytes Dessens."
+)
+
+# Rutas de una consulta
+OFF_TOPIC = 'off_topic'
+NO_CONTEXT = 'no_context'
+CACHED = 'cached'
+ANSWER = 'answer'
+
+# Puntajes recientes que se conservan para calibrar el umbral
+SCORE_WINDOW = 500
+
+
+def _kmeans(vectors: "np.ndarray", k: int, iterations: int, seed: int = 0) -> "np.ndarray":
+    """k-means esférico: centroides normalizados que maximizan la similitud coseno"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(k):
+            members = vectors[assignment == cluster]
+            if len(members):
+                total = members.sum(axis=0)
+                centroids[cluster] = total / max(float(np.linalg.norm(total)), 1e-12)
+    return centroids
+
+
+class QueryRouter:
+    """
+    Clasificador local sobre el embedding de la consulta: la similitud coseno
+    máxima contra k centroides del corpus (k-means sobre una muestra de
+    jp_documents). Por debajo de off_topic_threshold la consulta se considera
+    fuera de tema. Sin centroides (aún no construidos, o sin numpy) solo se
+    aplica la regla de sin contexto.
+    """
+
+    # Segundos antes de reintentar una construcción fallida
+    RETRY_AFTER = 60.0
+
+    def __init__(
+        self,
+        dim: int,
+        centroids: int = 8,
+        off_topic_threshold: float = 0.2,
+        min_similarity: float = 0.5,
+        sample_rows: int = 5000,
+        refresh_seconds: float = 0.0
+    ):
+        """
+        Args:
+            dim: Dimensiones del embedding
+            centroids: Número de centroides del corpus
+            off_topic_threshold: Similitud máxima a un centroide bajo la cual la
+                consulta está fuera de tema (0 = no clasificar)
+            min_similarity: Similitud que debe superar algún chunk recuperado
+                para llamar al LLM
+            sample_rows: Filas de jp_documents que se usan para los centroides
+            refresh_seconds: Cada cuántos segundos se recalculan aunque no se
+                hayan marcado desactualizados (0 = solo cuando cambia el corpus)
+        """
+        self.dim = dim
+        self.k = max(1, centroids)
+        self.off_topic_threshold = off_topic_threshold
+        self.min_similarity = min_similarity
+        self.sample_rows = max(1, sample_rows)
+        self.refresh_seconds = refresh_seconds
+
+        self._centroids: Optional["np.ndarray"] = None
+        self.stale = True
+        # Instante (monotónico) del último intento de construcción
+        self._built_at: Optional[float] = None
+        self._failed_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._scores: List[float] = []
+
+        # Decisiones de route_query (todas las consultas) y desenlace final de cada una
+        self.query_routes = {OFF_TOPIC: 0, ANSWER: 0}
+        self.routes = {OFF_TOPIC: 0, NO_CONTEXT: 0, CACHED: 0, ANSWER: 0}
+
+    @staticmethod
+    def available() -> bool:
+        return np is not None
+
+    @property
+    def ready(self) -> bool:
+        return self._centroids is not None
+
+    # --- Centroides ---
+
+    def fit(self, vectors: Sequence[Sequence[float]]) -> None:
+        """Calcula los centroides a partir de embeddings del corpus"""
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(matrix, axis=1)
+        matrix = matrix[norms > 0] / norms[norms > 0, None]
+        if not len(matrix):
+            self._centroids = None
+            return
+        self._centroids = _kmeans(matrix, min(self.k, len(matrix)), iterations=10)
+        logger.info("Centroides del router calculados", extra={'rows': len(matrix), 'centroids': len(self._centroids)})
+
+    async def build(
+        self,
+        fetch_page: Callable[[Any, int], Awaitable[List[Dict[str, Any]]]],
+        page_size: int = 1000
+    ) -> None:
+        """
+        Recorre jp_documents por id (hasta sample_rows filas) y recalcula los
+        centroides; los anteriores siguen en uso mientras tanto
+
+        Args:
+            fetch_page: Corrutina (after_id, limit) -> filas con id y embedding
+            page_size: Filas por página
+        """
+        vectors, last_id = [], None
+        # Un cambio del corpus durante la construcción vuelve a marcarlos desactualizados
+        self.stale = False
+        self._built_at = time.monotonic()
+        try:
+            while len(vectors) < self.sample_rows:
+                rows = await fetch_page(last_id, min(page_size, self.sample_rows - len(vectors)))
+                vectors.extend(
+                    embedding for embedding in (parse_embedding(row.get('embedding') or []) for row in rows)
+                    if len(embedding) == self.dim
+                )
+                if not rows or len(rows) < page_size:
+                    break
+                last_id = rows[-1].get('id')
+            if vectors:
+                await asyncio.to_thread(self.fit, vectors)
+            self._failed_at = None
+        except Exception as error:
+            self.stale = True
+            self._failed_at = time.monotonic()
+            logger.warning("No se pudieron calcular los centroides del router: %s", error)
+
+    def schedule_build(self, fetch_page: Callable[[Any, int], Awaitable[List[Dict[str, Any]]]], page_size: int) -> None:
+        """
+        Lanza build() en segundo plano si los centroides faltan, están
+        desactualizados o pasaron refresh_seconds desde la última construcción
+        (otros workers, jobs o migraciones también cambian el corpus)
+        """
+        if not (self.stale or self._refresh_due()) or (self._task is not None and not self._task.done()):
+            return
+        if self._failed_at is not None and time.monotonic() - self._failed_at < self.RETRY_AFTER:
+            return
+        self._task = asyncio.create_task(self.build(fetch_page, page_size))
+
+    def _refresh_due(self) -> bool:
+        if self.refresh_seconds <= 0 or self._built_at is None:
+            return False
+        return time.monotonic() - self._built_at >= self.refresh_seconds
+
+    # --- Decisiones ---
+
+    def score(self, embedding: Sequence[float]) -> Optional[float]:
+        """Similitud coseno máxima de la consulta contra los centroides"""
+        if self._centroids is None:
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if query.shape != (self.dim,) or not norm:
+            return None
+        return float(np.max(self._centroids @ (query / norm)))
+
+    def route_query(self, embedding: Sequence[float]) -> str:
+        """
+        OFF_TOPIC si la consulta está claramente fuera del corpus; si no, ANSWER.
+        Cuenta todas las consultas, también las que no se pueden puntuar
+        """
+        route = ANSWER
+        score = self.score(embedding)
+        if score is not None:
+            self._scores.append(score)
+            del self._scores[:-SCORE_WINDOW]
+            if self.off_topic_threshold and score < self.off_topic_threshold:
+                route = OFF_TOPIC
+        self.query_routes[route] += 1
+        metrics.inc('router_decisions_total', stage='query', route=route)
+        if route == OFF_TOPIC:
+            self._record(OFF_TOPIC)
+        return route
+
+    def route_cached(self) -> str:
+        """Registra una consulta que pasó el router y se respondió desde el cache de respuestas"""
+        return self._record(CACHED)
+
+    def route_documents(self, documents: Optional[List[Dict[str, Any]]]) -> str:
+        """
+        NO_CONTEXT si ningún chunk recuperado supera min_similarity; si no,
+        ANSWER. Solo cuenta la similitud coseno ('similarity'): los puntajes
+        léxicos ('bm25', 'rrf') no están en la misma escala
+        """
+        best = max(
+            (doc['similarity'] for doc in documents or [] if doc.get('similarity') is not None),
+            default=None
+        )
+        if best is None or best < self.min_similarity:
+            return self._record(NO_CONTEXT)
+        return self._record(ANSWER)
+
+    def _record(self, route: str) -> str:
+        """Desenlace final de una consulta"""
+        self.routes[route] += 1
+        metrics.inc('router_decisions_total', stage='outcome', route=route)
+        if route in (OFF_TOPIC, NO_CONTEXT):
+            metrics.inc('llm_calls_saved_total')
+        return route
+
+    def stats(self) -> Dict[str, Any]:
+        """Decisiones, llamadas al LLM ahorradas y distribución de puntajes"""
+        total = sum(self.query_routes.values())
+        saved = self.routes[OFF_TOPIC] + self.routes[NO_CONTEXT]
+        scores = sorted(self._scores)
+
+        def quantile(q: float) -> float:
+            return scores[min(int(q * len(scores)), len(scores) - 1)] if scores else 0.0
+
+        return {
+            'ready': self.ready,
+            'centroids': 0 if self._centroids is None else len(self._centroids),
+            'off_topic_threshold': self.off_topic_threshold,
+            'min_similarity': self.min_similarity,
+            'queries': total,
+            'passed': self.query_routes[ANSWER],
+            'off_topic': self.routes[OFF_TOPIC],
+            'no_context': self.routes[NO_CONTEXT],
+            'cached': self.routes[CACHED],
+            'answered': self.routes[ANSWER],
+            'llm_calls_saved': saved,
+            'short_circuit_rate': saved / total if total else 0.0,
+            'score_p05': quantile(0.05),
+            'score_p50': quantile(0.5)
+        }
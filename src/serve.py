@@ -0,0 +1,70 @@
+"""
+Modo de servicio en producción: varios procesos worker detrás del transporte
+streamable-HTTP, compartiendo los caches de embeddings y de respuestas
+
+Uso:
+    python -m src.serve [--workers 4] [--host 127.0.0.1] [--port 8000]
+
+Cada worker es un proceso con su propio event loop, así que el formateo del
+prompt, el parseo JSON de las respuestas y la construcción de resultados se
+reparten entre los núcleos. El estado compartido vive fuera del proceso:
+
+- Cache de embeddings de consultas: SQLite en EMBED_CACHE_PATH
+- Cache semántico de respuestas y versión del corpus: SQLite en ANSWER_CACHE_PATH
+- Snapshot de embeddings (EMBED_STORE_ENABLED): np.memmap, páginas compartidas
+- Jobs de ingesta: checkpoints en INGEST_JOBS_DIR
+
+El transporte corre sin sesiones (stateless_http): cualquier worker puede
+atender cualquier request, sin afinidad de sesión en el balanceo.
+"""
+import argparse
+import os
+import time
+
+# Rutas compartidas por defecto: se fijan antes de importar la configuración
+# para que los workers (procesos nuevos) las hereden por el entorno
+SHARED_DEFAULTS = {
+    'EMBED_CACHE_PATH': '.cache/embeddings.sqlite',
+    'ANSWER_CACHE_PATH': '.cache/answers.sqlite',
+    'INGEST_JOBS_DIR': '.ingest_jobs',
+}
+
+
+def create_app():
+    """Factory ASGI que ejecuta cada worker de uvicorn"""
+    from src.config import config
+    from src.main import mcp
+    return mcp.http_app(path=config.SERVE_PATH, stateless_http=True)
+
+
+def main() -> None:
+    for name, value in SHARED_DEFAULTS.items():
+        if not os.getenv(name):
+            os.environ[name] = value
+    # Los jobs creados desde ahora pertenecen al worker que los recibe
+    os.environ['SERVE_STARTED_AT'] = str(time.time())
+
+    from src.config import config
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=config.SERVE_WORKERS or os.cpu_count() or 1)
+    parser.add_argument('--host', default=config.SERVE_HOST)
+    parser.add_argument('--port', type=int, default=config.SERVE_PORT)
+    parser.add_argument('--log-level', default=config.LOG_LEVEL.lower())
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(
+        'src.serve:create_app',
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=max(1, args.workers),
+        log_level='critical' if args.log_level == 'off' else args.log_level,
+        timeout_graceful_shutdown=30
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Coalescencia de requests (single-flight): las llamadas concurrentes con la
+misma clave esperan un único trabajo compartido en lugar de repetirlo
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from .embedding_cache import normalize_text
+
+T = TypeVar('T')
+
+
+def make_key(operation: str, query: str, *params: Any) -> Tuple[Any, ...]:
+    """Clave de coalescencia: operación, consulta normalizada y parámetros"""
+    return (operation, normalize_text(query), *params)
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes idénticas. La primera llamada con una clave
+    lanza el trabajo como una tarea; las que llegan mientras sigue en curso
+    esperan esa misma tarea. Los errores se propagan a todos los que esperan,
+    y cancelar a uno de ellos no cancela el trabajo compartido (asyncio.shield).
+    Al terminar, la clave se libera: no es un cache de resultados.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._stats = {'executions': 0, 'coalesced': 0}
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable[T]]) -> T:
+        """
+        Ejecuta work() o se une a la ejecución en curso con la misma clave
+
+        Args:
+            key: Clave hashable de la operación (ver make_key)
+            work: Función sin argumentos que crea la corrutina del trabajo
+
+        Returns:
+            El resultado compartido del trabajo
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, work))
+            task.add_done_callback(self._consume)
+            self._inflight[key] = task
+            self._stats['executions'] += 1
+        else:
+            self._stats['coalesced'] += 1
+        return await asyncio.shield(task)
+
+    async def _run(self, key: Hashable, work: Callable[[], Awaitable[T]]) -> T:
+        try:
+            return await work()
+        finally:
+            # Se libera dentro de la tarea: ninguna llamada nueva puede unirse
+            # a un trabajo que ya terminó
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    def _consume(task: asyncio.Task) -> None:
+        # Si todos los que esperaban se cancelaron, el error no lo lee nadie
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, 'in_flight': len(self._inflight)}
@@ -2,55 +2,335 @@
 Cliente para Supabase - Base de datos y funciones
 """
 import asyncio
-from typing import List, Dict, Any, Optional
-from supabase import create_client, Client
+import time
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Sequence, Set, Tuple
 from .config import config
+from .lazy import LazyClient
+from .log import get_logger
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from supabase import Client
+    from .http_transport import PostgrestHTTP
+    from .vector_index import LocalVectorIndex
+    from .embedding_store import EmbeddingStore
+    from .bm25 import BM25Index
+
+logger = get_logger(__name__)
 
 class SupabaseClient:
     
     """Cliente para interactuar con Supabase"""
     
+    # Columnas de jp_documents que se escriben al almacenar un chunk
+    ROW_COLUMNS = ('content', 'embedding', 'content_hash', 'document_key')
+    
     def __init__(self):
         if not config.SUPABASE_URL or not config.SUPABASE_SERVICE_ROLE_KEY:
             raise ValueError("Faltan variables de entorno de Supabase")
-        self.client: Client = create_client(
-            config.SUPABASE_URL,
-            config.SUPABASE_SERVICE_ROLE_KEY
+        self.client: Optional["Client"] = None
+        self._http: Optional["PostgrestHTTP"] = None
+        if config.ASYNC_HTTP_ENABLED:
+            # PostgREST directo sobre el pool HTTP asíncrono compartido
+            from .http_transport import PostgrestHTTP
+            self._http = PostgrestHTTP(config.SUPABASE_URL, config.SUPABASE_SERVICE_ROLE_KEY)
+        else:
+            # Import diferido: el SDK de supabase es lento de importar
+            from supabase import create_client
+            self.client = create_client(
+                config.SUPABASE_URL,
+                config.SUPABASE_SERVICE_ROLE_KEY
+            )
+        self.local_index: Optional["LocalVectorIndex"] = None
+        if config.LOCAL_INDEX_ENABLED:
+            from .vector_index import LocalVectorIndex
+            if LocalVectorIndex.available():
+                self.local_index = LocalVectorIndex(config.EMBED_DIM)
+            else:
+                logger.warning("numpy no está instalado, se usará el RPC match_documents")
+        self.embedding_store: Optional["EmbeddingStore"] = None
+        self._store_lock = asyncio.Lock()
+        # None hasta verificar si jp_documents tiene content_hash y document_key
+        self._has_dedup_columns: Optional[bool] = None
+        if config.EMBED_STORE_ENABLED:
+            from .embedding_store import EmbeddingStore
+            if EmbeddingStore.available():
+                self.embedding_store = EmbeddingStore(
+                    config.EMBED_STORE_PATH,
+                    config.EMBED_DIM,
+                    dtype=config.EMBED_STORE_DTYPE,
+                    keep_exact=config.EMBED_STORE_RESCORE,
+                    model=config.GEMINI_EMBED_MODEL
+                )
+            else:
+                logger.warning("numpy no está instalado, no se usará el snapshot de embeddings")
+        self.lexical_index: Optional["BM25Index"] = None
+        if config.BM25_ENABLED:
+            from .bm25 import BM25Index
+            self.lexical_index = BM25Index(config.BM25_K1, config.BM25_B)
+        self._lexical_rebuild: Optional[asyncio.Task] = None
+        # Cambios de este proceso durante una reconstrucción, para aplicarlos al índice nuevo
+        self._lexical_pending: Optional[List[tuple]] = None
+        self._local_rebuild: Optional[asyncio.Task] = None
+        self._local_pending: Optional[List[tuple]] = None
+    
+    async def _insert(self, data: Any) -> List[Dict[str, Any]]:
+        """Insert en jp_documents; devuelve las filas creadas en el mismo orden"""
+        if self._http is not None:
+            return await self._http.insert('jp_documents', data)
+        response = await asyncio.to_thread(
+            lambda: self.client.table('jp_documents').insert(data).execute()
+        )
+        return response.data or []
+    
+    async def _update(self, row_id: Any, values: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Update de una fila existente de jp_documents por id; vacío si la fila ya no existe"""
+        if self._http is not None:
+            return await self._http.update('jp_documents', row_id, values)
+        response = await asyncio.to_thread(
+            lambda: self.client.table('jp_documents').update(values).eq('id', row_id).execute()
+        )
+        return response.data or []
+    
+    async def _rpc(self, function: str, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Llama a una función RPC de Postgres"""
+        if self._http is not None:
+            return await self._http.rpc(function, payload)
+        response = await asyncio.to_thread(
+            lambda: self.client.rpc(function, payload).execute()
+        )
+        return response.data or []
+    
+    async def _select(
+        self,
+        columns: str,
+        after_id: Any = None,
+        limit: Optional[int] = None,
+        eq: Optional[Dict[str, Any]] = None,
+        in_: Optional[Dict[str, List[Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Select sobre jp_documents ordenado por id (paginación por keyset con after_id)"""
+        if self._http is not None:
+            return await self._http.select('jp_documents', columns, after_id, limit, eq, in_)
+        
+        def query():
+            request = self.client.table('jp_documents').select(columns)
+            for column, value in (eq or {}).items():
+                request = request.eq(column, value)
+            for column, values in (in_ or {}).items():
+                request = request.in_(column, list(values))
+            if after_id is not None:
+                request = request.gt('id', after_id)
+            request = request.order('id')
+            if limit is not None:
+                request = request.limit(limit)
+            return request.execute()
+        
+        response = await asyncio.to_thread(query)
+        return response.data or []
+    
+    async def _delete(self, ids: List[Any]) -> List[Dict[str, Any]]:
+        """Elimina filas de jp_documents por id; devuelve las filas eliminadas"""
+        if self._http is not None:
+            return await self._http.delete('jp_documents', ids)
+        response = await asyncio.to_thread(
+            lambda: self.client.table('jp_documents').delete().in_('id', ids).execute()
         )
+        return response.data or []
+    
+    async def ensure_local_index(self) -> bool:
+        """
+        Carga el índice local si está activo y lo reconstruye en segundo plano
+        cada LOCAL_INDEX_REFRESH_SECONDS (o cuando se marca como obsoleto), para
+        incorporar lo que escribieron otros workers, jobs o migraciones;
+        devuelve True si está listo (mientras se reconstruye responde el anterior)
+        """
+        index = self.local_index
+        if index is None:
+            return False
+        if not index.ready:
+            await index.load(self._fetch_embeddings_page, config.LOCAL_INDEX_PAGE_SIZE)
+            return index.ready
+        if index.needs_refresh(config.LOCAL_INDEX_REFRESH_SECONDS) and (
+            self._local_rebuild is None or self._local_rebuild.done()
+        ):
+            # Si la carga falla, se reintenta en el siguiente intervalo
+            index.last_refresh = time.monotonic()
+            index.stale = False
+            self._local_pending = []
+            self._local_rebuild = asyncio.create_task(self._rebuild_local_index())
+        return True
+    
+    def _fetch_embeddings_page(self, after_id: Any, limit: int):
+        return self._select('id, content, embedding', after_id, limit)
+    
+    async def _rebuild_local_index(self) -> None:
+        """Carga un índice vectorial nuevo desde jp_documents y reemplaza al actual"""
+        from .vector_index import LocalVectorIndex
+        fresh = LocalVectorIndex(self.local_index.dim)
+        try:
+            await fresh.load(self._fetch_embeddings_page, config.LOCAL_INDEX_PAGE_SIZE)
+            if not fresh.ready:
+                return
+            for operation, ids, contents, embeddings in self._local_pending:
+                if operation == 'add':
+                    fresh.add(ids, contents, embeddings)
+                else:
+                    fresh.remove(ids)
+            self.local_index = fresh
+            metrics.inc('local_index_rebuilds_total')
+        finally:
+            self._local_pending = None
+    
+    async def ensure_lexical_index(self) -> bool:
+        """
+        Construye el índice BM25 si está activo (solo id y content) y lo
+        reconstruye en segundo plano cada BM25_REFRESH_SECONDS, para incorporar
+        lo que escribieron otros workers, jobs o migraciones; devuelve True si
+        está listo (mientras se reconstruye sigue respondiendo el anterior)
+        """
+        index = self.lexical_index
+        if index is None:
+            return False
+        if not index.ready:
+            await index.load(self._fetch_contents_page, config.LOCAL_INDEX_PAGE_SIZE)
+            return index.ready
+        if index.needs_refresh(config.BM25_REFRESH_SECONDS) and (
+            self._lexical_rebuild is None or self._lexical_rebuild.done()
+        ):
+            # Si la carga falla, se reintenta en el siguiente intervalo
+            index.last_refresh = time.monotonic()
+            index.stale = False
+            # Desde ahora se anotan los cambios de este proceso que la paginación pueda no ver
+            self._lexical_pending = []
+            self._lexical_rebuild = asyncio.create_task(self._rebuild_lexical_index())
+        return True
+    
+    def _fetch_contents_page(self, after_id: Any, limit: int):
+        return self._select('id, content', after_id, limit)
+    
+    async def _rebuild_lexical_index(self) -> None:
+        """Carga un índice BM25 nuevo desde jp_documents y reemplaza al actual"""
+        from .bm25 import BM25Index
+        fresh = BM25Index(self.lexical_index.k1, self.lexical_index.b)
+        try:
+            await fresh.load(self._fetch_contents_page, config.LOCAL_INDEX_PAGE_SIZE)
+            if not fresh.ready:
+                return
+            for operation, ids, contents in self._lexical_pending:
+                if operation == 'add':
+                    fresh.add(ids, contents)
+                else:
+                    fresh.remove(ids)
+            self.lexical_index = fresh
+            metrics.inc('lexical_index_rebuilds_total')
+        finally:
+            self._lexical_pending = None
+    
+    async def ensure_embedding_store(self) -> bool:
+        """
+        Abre el snapshot mapeado en memoria y le agrega las filas nuevas (solo
+        las de id mayor al último guardado). Se refresca al primer uso, luego
+        cada EMBED_STORE_REFRESH_SECONDS y en cuanto aparece una generación
+        nueva (otro modelo o corpus re-embebido); devuelve True si está listo
+        """
+        store = self.embedding_store
+        if store is None:
+            return False
+        # Detecta una generación nueva escrita por otro proceso
+        store.open()
+        if not store.needs_refresh(config.EMBED_STORE_REFRESH_SECONDS):
+            return True
+        async with self._store_lock:
+            if store.needs_refresh(config.EMBED_STORE_REFRESH_SECONDS):
+                await store.refresh(self._fetch_embeddings_page, config.LOCAL_INDEX_PAGE_SIZE)
+        return store.ready
+    
+    def mark_indexes_stale(self) -> None:
+        """El índice local y el BM25 se reconstruyen en segundo plano con la próxima búsqueda"""
+        if self.local_index is not None:
+            self.local_index.stale = True
+        if self.lexical_index is not None:
+            self.lexical_index.stale = True
+    
+    def invalidate_local_copies(self) -> None:
+        """
+        Los embeddings de jp_documents se reescribieron (re-embedding): además de
+        reconstruir los índices, el snapshot empieza una generación nueva, que
+        los otros procesos también detectan
+        """
+        self.mark_indexes_stale()
+        if self.embedding_store is not None:
+            try:
+                self.embedding_store.reset()
+            except Exception as error:
+                logger.warning("No se pudo descartar el snapshot de embeddings: %s", error)
+    
+    def _index_rows(self, ids: List[Any], contents: List[str], embeddings: List[List[float]]) -> None:
+        """Agrega filas recién insertadas al índice local y al snapshot (si están activos)"""
+        if self.local_index is not None:
+            try:
+                self.local_index.add(ids, contents, embeddings)
+                if self._local_pending is not None:
+                    self._local_pending.append(('add', ids, contents, embeddings))
+            except Exception as error:
+                # El índice es solo una réplica: un fallo aquí no invalida el insert
+                logger.warning("No se pudo actualizar el índice local: %s", error)
+        if self.embedding_store is not None:
+            try:
+                self.embedding_store.append(ids, contents, embeddings)
+            except Exception as error:
+                logger.warning("No se pudo actualizar el snapshot de embeddings: %s", error)
+        if self.lexical_index is not None:
+            try:
+                self.lexical_index.add(ids, contents)
+                if self._lexical_pending is not None:
+                    self._lexical_pending.append(('add', ids, contents))
+            except Exception as error:
+                logger.warning("No se pudo actualizar el índice BM25: %s", error)
     
     async def store_embedding(
         self, 
         content: str, 
-        embedding: List[float]
+        embedding: List[float],
+        content_hash: Optional[str] = None,
+        document_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Almacena un documento con su embedding en la tabla jp_documents
         
         Args:
             content: Contenido del documento
-            embedding: Vector de embedding (debe ser 768 dimensiones)
+            embedding: Vector de embedding (debe tener EMBED_DIM dimensiones)
+            content_hash: Huella del contenido para deduplicación (opcional)
+            document_key: Documento de origen del chunk (opcional)
             
         Returns:
             Dict con el resultado: {'success': bool, 'id': int, 'message': str}
         """
         try:
             # Validar dimensiones del embedding
-            if len(embedding) != 768:
-                error_msg = f"El embedding debe tener 768 dimensiones, pero tiene {len(embedding)}"
+            if len(embedding) != config.EMBED_DIM:
+                error_msg = f"El embedding debe tener {config.EMBED_DIM} dimensiones, pero tiene {len(embedding)}"
                 return {'success': False, 'id': None, 'message': error_msg}
             
             data = {
                 'content': content,
                 'embedding': embedding
             }
+            if content_hash is not None:
+                data['content_hash'] = content_hash
+            if document_key is not None:
+                data['document_key'] = document_key
             
-            response = await asyncio.to_thread(
-                lambda: self.client.table('jp_documents').insert(data).execute()
-            )
+            with metrics.span('insert'):
+                inserted = await self._insert(data)
             
-            if response.data and len(response.data) > 0:
-                document_id = response.data[0].get('id')
-                print(f"[SUPABASE] ✅ Documento almacenado con ID: {document_id}")
+            if inserted:
+                document_id = inserted[0].get('id')
+                self._index_rows([document_id], [content], [embedding])
+                metrics.inc('inserted_rows_total')
+                logger.debug("Documento almacenado", extra={'id': document_id})
                 return {
                     'success': True, 
                     'id': document_id, 
@@ -58,16 +338,294 @@ class SupabaseClient:
                 }
             else:
                 error_msg = "No se recibió respuesta de Supabase"
-                print(f"[SUPABASE] ❌ {error_msg}")
+                logger.error(error_msg)
                 return {'success': False, 'id': None, 'message': error_msg}
                 
         except Exception as error:
             error_msg = f"Excepción al almacenar documento: {str(error)}"
-            print(f"[SUPABASE] ❌ {error_msg}")
-            import traceback
-            traceback.print_exc()
+            logger.error(error_msg, exc_info=True)
             return {'success': False, 'id': None, 'message': error_msg}
     
+    async def store_embeddings_bulk(
+        self,
+        rows: List[Dict[str, Any]],
+        batch_size: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Almacena muchos documentos con un insert multi-fila por lote
+        
+        Args:
+            rows: Lista de dicts con 'content' y 'embedding' (EMBED_DIM dimensiones),
+                y opcionalmente 'content_hash' y 'document_key'
+            batch_size: Filas por insert (default del config: INSERT_BATCH_SIZE)
+            
+        Returns:
+            Lista en el mismo orden que rows, cada elemento con el formato de
+            store_embedding: {'success': bool, 'id': int, 'message': str}
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+        valid: List[int] = []
+        
+        # Validar dimensiones fila por fila
+        for index, row in enumerate(rows):
+            embedding = row.get('embedding') or []
+            if len(embedding) != config.EMBED_DIM:
+                error_msg = f"El embedding debe tener {config.EMBED_DIM} dimensiones, pero tiene {len(embedding)}"
+                results[index] = {'success': False, 'id': None, 'message': error_msg}
+            else:
+                valid.append(index)
+        
+        batch_size = max(1, batch_size or config.INSERT_BATCH_SIZE)
+        for start in range(0, len(valid), batch_size):
+            batch = valid[start:start + batch_size]
+            data = [
+                {key: rows[i][key] for key in self.ROW_COLUMNS if rows[i].get(key) is not None}
+                for i in batch
+            ]
+            
+            try:
+                with metrics.span('insert'):
+                    inserted = await self._insert(data)
+            except Exception as error:
+                # El insert es atómico y no escribió nada: reintentar fila por fila para aislar las que fallan
+                logger.warning("Falló el insert del lote, reintentando por fila: %s", error, extra={'rows': len(batch)})
+                for i in batch:
+                    results[i] = await self.store_embedding(
+                        rows[i]['content'],
+                        rows[i]['embedding'],
+                        content_hash=rows[i].get('content_hash'),
+                        document_key=rows[i].get('document_key')
+                    )
+                continue
+            
+            # Desde aquí el lote ya está en la tabla: nada se vuelve a insertar
+            if len(inserted) == len(batch):
+                # PostgREST devuelve las filas en el mismo orden del insert
+                pairs = list(zip(batch, inserted))
+            else:
+                # Respuesta incompleta: emparejar por contenido y reportar las filas sin confirmar
+                logger.error(
+                    "El insert devolvió %d filas de %d; no se reintenta para no duplicarlas",
+                    len(inserted), len(batch)
+                )
+                returned: Dict[str, List[Dict[str, Any]]] = {}
+                for row in inserted:
+                    returned.setdefault(row.get('content'), []).append(row)
+                pairs = []
+                for i in batch:
+                    candidates = returned.get(rows[i]['content'])
+                    if candidates:
+                        pairs.append((i, candidates.pop(0)))
+                    else:
+                        results[i] = {
+                            'success': False,
+                            'id': None,
+                            'message': "Insert sin confirmar: Supabase no devolvió la fila (no se reintenta)"
+                        }
+            
+            for i, row in pairs:
+                results[i] = {
+                    'success': True,
+                    'id': row.get('id'),
+                    'message': 'Documento almacenado correctamente'
+                }
+            try:
+                self._index_rows(
+                    [row.get('id') for _, row in pairs],
+                    [rows[i]['content'] for i, _ in pairs],
+                    [rows[i]['embedding'] for i, _ in pairs]
+                )
+            except Exception as error:
+                # Los índices son réplicas: un fallo aquí no invalida el insert
+                logger.warning("No se pudieron indexar las filas insertadas: %s", error, extra={'rows': len(pairs)})
+            metrics.inc('inserted_rows_total', len(pairs))
+            logger.debug("Lote de documentos almacenado", extra={'rows': len(pairs)})
+        
+        return results
+    
+    async def update_embeddings(
+        self,
+        rows: List[Dict[str, Any]],
+        dim: int,
+        column: str = 'embedding'
+    ) -> int:
+        """
+        Reescribe el embedding de filas existentes con un update por id. Las
+        filas que se eliminaron mientras tanto no se vuelven a crear.
+        
+        Args:
+            rows: Lista de dicts con 'id' y 'embedding'
+            dim: Dimensión de la columna destino (la del modelo nuevo)
+            column: Columna destino (otra columna permite migrar a una nueva
+                dimensión sin tocar la que usa match_documents)
+            
+        Returns:
+            Número de filas actualizadas
+        """
+        for row in rows:
+            if len(row['embedding']) != dim:
+                raise ValueError(
+                    f"El embedding debe tener {dim} dimensiones, pero tiene {len(row['embedding'])}"
+                )
+        with metrics.span('update_embeddings'):
+            # Un PATCH por fila; todos comparten el pool de conexiones
+            updated = await asyncio.gather(*(
+                self._update(row['id'], {column: row['embedding']}) for row in rows
+            ))
+        count = sum(1 for returned in updated if returned)
+        if count < len(rows):
+            logger.info("Filas eliminadas durante la migración", extra={'rows': len(rows) - count})
+        metrics.inc('updated_rows_total', count)
+        return count
+    
+    async def supports_dedup(self) -> bool:
+        """
+        Indica si jp_documents tiene las columnas content_hash y document_key.
+        Se consulta una vez por proceso: en una base sin migrar la ingesta hace
+        inserts simples sin deduplicación en lugar de fallar.
+        
+        Raises:
+            Cualquier error de Supabase distinto de "la columna no existe"
+        """
+        if self._has_dedup_columns is None:
+            try:
+                await self._select('content_hash, document_key', limit=1)
+                self._has_dedup_columns = True
+            except Exception as error:
+                message = str(error)
+                # 42703: undefined_column de Postgres; PGRST204: columna desconocida en PostgREST
+                if not any(marker in message for marker in ('42703', 'PGRST204', 'does not exist')):
+                    raise
+                self._has_dedup_columns = False
+                logger.warning(
+                    "jp_documents no tiene content_hash/document_key: la ingesta no deduplica chunks "
+                    "(agrega las columnas para activarla)"
+                )
+        return self._has_dedup_columns
+    
+    async def find_existing_hashes(
+        self,
+        hashes: List[str],
+        document_key: str
+    ) -> Set[str]:
+        """
+        Indica qué huellas de contenido ya existen en las filas de un documento
+        
+        Args:
+            hashes: Huellas a consultar
+            document_key: Documento de origen (no se compara con otros documentos)
+            
+        Returns:
+            Conjunto con las huellas que ya están almacenadas
+        """
+        if not hashes:
+            return set()
+        
+        rows = await self._select(
+            'content_hash',
+            eq={'document_key': document_key},
+            in_={'content_hash': hashes}
+        )
+        return {row['content_hash'] for row in rows if row.get('content_hash')}
+    
+    async def fetch_document_hashes(
+        self,
+        document_key: str,
+        page_size: int = 1000
+    ) -> List[Dict[str, Any]]:
+        """
+        Lista las filas (id, content_hash) de un documento, paginando por id
+        
+        Args:
+            document_key: Documento de origen
+            page_size: Filas por página
+            
+        Returns:
+            Lista de dicts con 'id' y 'content_hash'
+        """
+        rows: List[Dict[str, Any]] = []
+        last_id = None
+        while True:
+            page = await self._select(
+                'id, content_hash',
+                after_id=last_id,
+                limit=page_size,
+                eq={'document_key': document_key}
+            )
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+            last_id = page[-1]['id']
+    
+    async def delete_documents(self, ids: List[Any], batch_size: int = 200) -> int:
+        """
+        Elimina filas de jp_documents por id
+        
+        Args:
+            ids: IDs a eliminar
+            batch_size: IDs por request de borrado
+            
+        Returns:
+            Número de filas eliminadas
+        """
+        deleted = 0
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            deleted += len(await self._delete(batch))
+        
+        if self.local_index is not None:
+            self.local_index.remove(ids)
+            if self._local_pending is not None:
+                self._local_pending.append(('remove', ids, None, None))
+        if self.embedding_store is not None:
+            self.embedding_store.delete(ids)
+        if self.lexical_index is not None:
+            self.lexical_index.remove(ids)
+            if self._lexical_pending is not None:
+                self._lexical_pending.append(('remove', ids, None))
+        logger.info("Documentos eliminados", extra={'rows': deleted})
+        return deleted
+    
+    async def fetch_embeddings(self, ids: List[Any]) -> Dict[Any, Sequence[float]]:
+        """
+        Embeddings almacenados de las filas indicadas
+        
+        Args:
+            ids: IDs de jp_documents
+            
+        Returns:
+            Dict id -> embedding (del índice local si está cargado y las tiene todas)
+        """
+        if not ids:
+            return {}
+        if self.local_index is not None and self.local_index.ready:
+            found = self.local_index.vectors(ids)
+            if len(found) == len(set(ids)):
+                return found
+        
+        from .vector_index import parse_embedding
+        rows = await self._select('id, embedding', in_={'id': list(ids)})
+        return {row['id']: parse_embedding(row['embedding']) for row in rows if row.get('embedding')}
+    
+    async def search_lexical(self, query: str, limit: int = 5) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        Búsqueda BM25 en el índice léxico local, sin embedding de la consulta
+        
+        Args:
+            query: Consulta en lenguaje natural
+            limit: Número máximo de documentos a retornar
+            
+        Returns:
+            (documentos con id, content y bm25, confianza 0-1 del primero);
+            ([], 0.0) si el índice está desactivado o no cargó
+        """
+        if not await self.ensure_lexical_index():
+            return [], 0.0
+        with metrics.span('lexical_search'):
+            documents, confidence = self.lexical_index.search(query, limit)
+        metrics.inc('lexical_searches_total')
+        return documents, confidence
+    
     async def search_similar_documents(
         self, 
         embedding: List[float], 
@@ -89,6 +647,25 @@ class SupabaseClient:
             if threshold is None:
                 threshold = config.SIMILARITY_THRESHOLD if hasattr(config, 'SIMILARITY_THRESHOLD') else 0.6           
             
+            # Responder desde el snapshot mapeado en memoria si está activo
+            if self.embedding_store is not None and await self.ensure_embedding_store():
+                with metrics.span('vector_search'):
+                    documents = self.embedding_store.search(
+                        embedding, limit, threshold, config.EMBED_STORE_RESCORE_FACTOR
+                    )
+                metrics.inc('vector_searches_total', backend='mmap')
+                logger.debug("Documentos encontrados", extra={'count': len(documents), 'backend': 'mmap'})
+                return documents
+            
+            # Responder desde el índice local si está cargado
+            if self.local_index is not None:
+                if await self.ensure_local_index():
+                    with metrics.span('vector_search'):
+                        documents = self.local_index.search(embedding, limit, threshold)
+                    metrics.inc('vector_searches_total', backend='local')
+                    logger.debug("Documentos encontrados", extra={'count': len(documents), 'backend': 'local'})
+                    return documents
+            
             # Preparar payload - usar query_embedding como en el script que funciona
             payload = {
                 'query_embedding': embedding,  # float8[] - igual que simulate_recomendation.py
@@ -97,27 +674,71 @@ class SupabaseClient:
             }
             
             # Usar match_documents (única función RPC disponible)
-            response = await asyncio.to_thread(
-                lambda: self.client.rpc('match_documents', payload).execute()
-            )
-            
-            if response.data:
-                print(f"[SUPABASE] ✅ Encontrados {len(response.data)} documentos (fallback)")
-                return response.data
-            
-            print("[SUPABASE] ⚠️  No se encontraron documentos")
-            return []
+            with metrics.span('vector_search'):
+                documents = await self._rpc('match_documents', payload)
+            metrics.inc('vector_searches_total', backend='rpc')
+            logger.debug("Documentos encontrados", extra={'count': len(documents), 'backend': 'rpc'})
+            return documents or []
             
         except Exception as error:
-            print(f"[SUPABASE] ❌ Error buscando documentos similares: {error}")
-            import traceback
-            traceback.print_exc()
+            logger.error("Error buscando documentos similares: %s", error, exc_info=True)
+            return []
+
+    async def search_similar_documents_batch(
+        self,
+        embeddings: List[List[float]],
+        limit: int = 5,
+        threshold: float = None,
+        concurrency: int = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Búsqueda de varias consultas: con el snapshot o el índice local es una
+        sola pasada de productos de matrices; sin ellos, RPCs concurrentes
+        acotados por `concurrency`
+
+        Args:
+            embeddings: Un embedding por consulta
+            limit: Número máximo de documentos por consulta
+            threshold: Umbral de similitud (default: SIMILARITY_THRESHOLD)
+            concurrency: RPCs en vuelo al mismo tiempo (default: BATCH_SEARCH_CONCURRENCY)
+
+        Returns:
+            Una lista de documentos por consulta, en el mismo orden
+        """
+        if not embeddings:
             return []
+        if threshold is None:
+            threshold = config.SIMILARITY_THRESHOLD
+
+        if self.embedding_store is not None:
+            try:
+                if await self.ensure_embedding_store():
+                    with metrics.span('vector_search_batch'):
+                        results = self.embedding_store.search_batch(
+                            embeddings, limit, threshold, config.EMBED_STORE_RESCORE_FACTOR
+                        )
+                    metrics.inc('vector_searches_total', len(embeddings), backend='mmap')
+                    return results
+            except Exception as error:
+                logger.error("Error en la búsqueda por lote en el snapshot: %s", error, exc_info=True)
+
+        if self.local_index is not None and await self.ensure_local_index():
+            try:
+                with metrics.span('vector_search_batch'):
+                    results = self.local_index.search_batch(embeddings, limit, threshold)
+                metrics.inc('vector_searches_total', len(embeddings), backend='local')
+                return results
+            except Exception as error:
+                logger.error("Error en la búsqueda local por lote: %s", error, exc_info=True)
+
+        semaphore = asyncio.Semaphore(max(1, concurrency or config.BATCH_SEARCH_CONCURRENCY))
+
+        async def search(embedding: List[float]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await self.search_similar_documents(embedding, limit, threshold)
+
+        return list(await asyncio.gather(*(search(embedding) for embedding in embeddings)))
 
 
-# Instancia global del cliente - con manejo de errores
-try:
-    supabase_client = SupabaseClient()
-except Exception as e:
-    print(f"⚠️  Warning: No se pudo crear cliente Supabase: {e}")
-    supabase_client = None
\ No newline at end of file
+# Instancia global del cliente: se construye en el primer uso
+supabase_client: SupabaseClient = LazyClient(SupabaseClient, "Supabase")
@@ -0,0 +1,246 @@
+"""
+Índice vectorial en memoria que replica jp_documents para búsqueda local
+"""
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence
+
+from .log import get_logger
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él se usa siempre el RPC
+    np = None
+
+logger = get_logger(__name__)
+
+
+def parse_embedding(value: Any) -> List[float]:
+    """PostgREST devuelve las columnas vector como texto '[0.1,0.2,...]'"""
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+
+class LocalVectorIndex:
+    """
+    Matriz float32 contigua con filas normalizadas; la similitud coseno de una
+    consulta contra todo el corpus es un solo producto matriz-vector.
+    """
+
+    # Segundos a esperar antes de reintentar una carga fallida
+    RETRY_AFTER = 60.0
+
+    def __init__(self, dim: int):
+        if np is None:
+            raise RuntimeError("numpy no está instalado")
+        self.dim = dim
+        self._matrix = np.empty((0, dim), dtype=np.float32)
+        self._ids: List[Any] = []
+        self._contents: List[str] = []
+        self._positions: Dict[Any, int] = {}
+        self._size = 0
+        self.ready = False
+        # Momento de la última carga completa y marca para forzar la siguiente
+        self.last_refresh: Optional[float] = None
+        self.stale = False
+        self._lock = asyncio.Lock()
+        self._failed_at: Optional[float] = None
+
+    @staticmethod
+    def available() -> bool:
+        return np is not None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, extra: int) -> None:
+        """Crece la capacidad al doble para que los inserts sean O(1) amortizado"""
+        needed = self._size + extra
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        matrix = np.empty((new_capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = matrix
+
+    @staticmethod
+    def _normalize(vectors: "np.ndarray") -> "np.ndarray":
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add(
+        self,
+        ids: Sequence[Any],
+        contents: Sequence[str],
+        embeddings: Iterable[Sequence[float]]
+    ) -> int:
+        """
+        Agrega filas al índice sin recargarlo; ignora IDs que ya existen
+
+        Returns:
+            Número de filas agregadas
+        """
+        new_ids, new_contents, new_vectors = [], [], []
+        for doc_id, content, embedding in zip(ids, contents, embeddings):
+            if doc_id is None or doc_id in self._positions or len(embedding) != self.dim:
+                continue
+            new_ids.append(doc_id)
+            new_contents.append(content)
+            new_vectors.append(embedding)
+
+        if not new_ids:
+            return 0
+
+        vectors = self._normalize(np.asarray(new_vectors, dtype=np.float32))
+        self._reserve(len(new_ids))
+        start = self._size
+        self._matrix[start:start + len(new_ids)] = vectors
+        for offset, (doc_id, content) in enumerate(zip(new_ids, new_contents)):
+            self._positions[doc_id] = start + offset
+            self._ids.append(doc_id)
+            self._contents.append(content)
+        self._size += len(new_ids)
+        return len(new_ids)
+
+    def remove(self, ids: Iterable[Any]) -> int:
+        """
+        Elimina filas del índice moviendo la última fila al hueco liberado
+
+        Returns:
+            Número de filas eliminadas
+        """
+        removed = 0
+        for doc_id in ids:
+            position = self._positions.pop(doc_id, None)
+            if position is None:
+                continue
+            last = self._size - 1
+            if position != last:
+                moved_id = self._ids[last]
+                self._matrix[position] = self._matrix[last]
+                self._ids[position] = moved_id
+                self._contents[position] = self._contents[last]
+                self._positions[moved_id] = position
+            self._ids.pop()
+            self._contents.pop()
+            self._size -= 1
+            removed += 1
+        return removed
+
+    def vectors(self, ids: Iterable[Any]) -> Dict[Any, "np.ndarray"]:
+        """Embeddings normalizados de los IDs que están en el índice"""
+        return {
+            doc_id: self._matrix[self._positions[doc_id]]
+            for doc_id in ids
+            if doc_id in self._positions
+        }
+
+    def _top(self, scores: "np.ndarray", limit: int, threshold: float) -> List[Dict[str, Any]]:
+        """Filas con score > threshold, las `limit` mejores de mayor a menor"""
+        candidates = np.flatnonzero(scores > threshold)
+        if candidates.size > limit:
+            top = np.argpartition(-scores[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+        return [
+            {
+                'id': self._ids[position],
+                'content': self._contents[position],
+                'similarity': float(scores[position])
+            }
+            for position in order
+        ]
+
+    def search(
+        self,
+        embedding: Sequence[float],
+        limit: int = 5,
+        threshold: float = 0.6
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k por similitud coseno, con la misma semántica que el RPC
+        match_documents: similitud > threshold, ordenado de mayor a menor
+        """
+        if self._size == 0 or limit <= 0:
+            return []
+
+        query = self._normalize(np.asarray(embedding, dtype=np.float32))
+        return self._top(self._matrix[:self._size] @ query, limit, threshold)
+
+    def search_batch(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        limit: int = 5,
+        threshold: float = 0.6
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        search() para varias consultas con un solo producto de matrices
+        (corpus x consultas) en lugar de uno por consulta
+        """
+        if not len(embeddings):
+            return []
+        if self._size == 0 or limit <= 0:
+            return [[] for _ in embeddings]
+
+        queries = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        scores = self._matrix[:self._size] @ queries.T
+        return [self._top(scores[:, column], limit, threshold) for column in range(scores.shape[1])]
+
+    async def load(
+        self,
+        fetch_page: Callable[[Any, int], Awaitable[List[Dict[str, Any]]]],
+        page_size: int = 1000
+    ) -> None:
+        """
+        Carga todos los embeddings de jp_documents paginando por id
+
+        Args:
+            fetch_page: Corrutina (after_id, limit) -> filas con id, content y embedding
+            page_size: Filas por página
+        """
+        if self.ready:
+            return
+        if self._failed_at is not None and time.monotonic() - self._failed_at < self.RETRY_AFTER:
+            return
+
+        async with self._lock:
+            if self.ready:
+                return
+            try:
+                last_id = None
+                while True:
+                    rows = await fetch_page(last_id, page_size)
+                    self.add(
+                        [row.get('id') for row in rows],
+                        [row.get('content', '') for row in rows],
+                        [parse_embedding(row.get('embedding') or []) for row in rows]
+                    )
+                    if len(rows) < page_size:
+                        break
+                    last_id = rows[-1].get('id')
+
+                self.ready = True
+                self.last_refresh = time.monotonic()
+                self._failed_at = None
+                logger.info("Índice local cargado", extra={'documents': self._size})
+
+            except Exception as error:
+                self._failed_at = time.monotonic()
+                logger.error("No se pudo cargar el índice local: %s", error)
+
+    def needs_refresh(self, interval: float) -> bool:
+        """
+        True si el índice se marcó como obsoleto o pasaron `interval` segundos
+        desde la última carga completa (0 = solo al inicio): otros procesos
+        pueden haber insertado, eliminado o re-embebido filas
+        """
+        if not self.ready or self.last_refresh is None:
+            return False
+        if self.stale:
+            return True
+        return interval > 0 and time.monotonic() - self.last_refresh >= interval
@@ -0,0 +1,56 @@
+"""Cache semántico de respuestas con invalidación por versión del corpus"""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from src import answer_cache  # noqa: E402
+from src.answer_cache import SemanticAnswerCache  # noqa: E402
+
+DIM = 4
+
+
+def near(vector, noise: float) -> list:
+    return (np.asarray(vector, dtype=np.float32) + noise).tolist()
+
+
+def test_near_duplicate_hits_and_distinct_misses():
+    cache = SemanticAnswerCache(DIM, threshold=0.95)
+    assert cache.store([1, 0, 0, 0], 'respuesta A')
+    assert cache.lookup(near([1, 0, 0, 0], 0.05)) == 'respuesta A'
+    assert cache.lookup([0, 1, 0, 0]) is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_corpus_version_invalidates_answers():
+    cache = SemanticAnswerCache(DIM)
+    version = cache.corpus_version
+    cache.store([1, 0, 0, 0], 'vieja')
+    cache.bump_corpus_version()
+    assert cache.lookup([1, 0, 0, 0]) is None
+    # Generada antes del cambio de corpus: no se guarda
+    assert not cache.store([1, 0, 0, 0], 'tardía', corpus_version=version)
+    assert cache.lookup([1, 0, 0, 0]) is None
+
+
+def test_ttl_and_lru_eviction(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, 'time', lambda: now[0])
+    cache = SemanticAnswerCache(DIM, max_size=2, ttl=10)
+    cache.store([1, 0, 0, 0], 'a')
+    now[0] += 1
+    cache.store([0, 1, 0, 0], 'b')
+    now[0] += 1
+    assert cache.lookup([1, 0, 0, 0]) == 'a'  # 'b' queda como la menos usada
+    cache.store([0, 0, 1, 0], 'c')
+    assert cache.lookup([0, 1, 0, 0]) is None
+    assert cache.stats()['evictions'] == 1
+    now[0] += 11
+    assert cache.lookup([1, 0, 0, 0]) is None
+
+
+def test_rejects_wrong_dimension_and_empty_answers():
+    cache = SemanticAnswerCache(DIM)
+    assert not cache.store([1, 0], 'x')
+    assert not cache.store([0, 0, 0, 0], 'x')
+    assert not cache.store([1, 0, 0, 0], '')
+    assert cache.lookup([1, 0]) is None
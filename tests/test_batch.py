@@ -0,0 +1,76 @@
+"""Consultas por lote: validación, orden de resultados y errores por consulta"""
+import asyncio
+
+import pytest
+
+from src.batch import check_queries, map_bounded, search_batch
+from src.config import config
+
+
+class Gemini:
+    """Un embedding por consulta; las que contienen 'falla' devuelven la excepción"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_query_embeddings(self, queries):
+        self.calls += 1
+        return [RuntimeError('cuota agotada') if 'falla' in query else [float(len(query))] for query in queries]
+
+
+class Supabase:
+    def __init__(self):
+        self.batches = []
+
+    async def search_similar_documents_batch(self, embeddings, limit, threshold):
+        self.batches.append(embeddings)
+        return [[{'id': int(embedding[0]), 'similarity': 0.9}] for embedding in embeddings]
+
+
+def test_check_queries(monkeypatch):
+    monkeypatch.setattr(config, 'BATCH_MAX_QUERIES', 2)
+    check_queries(['a', 'b'])
+    for invalid in ([], 'una consulta', ['a', 'b', 'c']):
+        with pytest.raises(ValueError):
+            check_queries(invalid)
+
+
+def test_search_batch_keeps_input_order_and_isolates_errors():
+    gemini, supabase = Gemini(), Supabase()
+    queries = ['uno', '', 'falla aquí', 'cuatro!']
+    results = asyncio.run(search_batch(queries, gemini, supabase, limit=3, threshold=0.5))
+
+    assert [item['index'] for item in results] == [0, 1, 2, 3]
+    assert results[0]['documents'] == [{'id': 3, 'similarity': 0.9}]
+    assert results[1]['error'] == 'consulta vacía'
+    assert results[2]['error'] == 'cuota agotada'
+    assert results[3]['documents'][0]['id'] == 7
+    # Un solo request de embeddings y una sola búsqueda para las consultas válidas
+    assert gemini.calls == 1
+    assert supabase.batches == [[[3.0], [7.0]]]
+
+
+def test_map_bounded_limits_concurrency_and_keeps_errors():
+    active = peak = 0
+    progress = []
+
+    async def worker(index, item):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        if item == 'mal':
+            raise ValueError(item)
+        return item.upper()
+
+    async def on_done(done):
+        progress.append(done)
+        if done == 2:
+            raise RuntimeError('el progreso no debe tumbar el lote')
+
+    results = asyncio.run(map_bounded(['a', 'mal', 'c', 'd', 'e'], worker, 2, on_done))
+    assert results[0] == 'A' and results[2:] == ['C', 'D', 'E']
+    assert isinstance(results[1], ValueError)
+    assert peak == 2
+    assert progress == [1, 2, 3, 4, 5]
@@ -0,0 +1,133 @@
+"""Índice BM25 y reciprocal rank fusion"""
+import asyncio
+
+from src.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+DOCS = {
+    1: 'Trabajó en Google como ingeniero de datos con Python',
+    2: 'Estudió Ingeniería en el Tecnológico de Monterrey',
+    3: 'Proyectos en Python y C++ para visión por computadora',
+    4: 'Experiencia en Accenture con Java y Python',
+}
+
+
+def make_index() -> BM25Index:
+    index = BM25Index()
+    index.add(list(DOCS), list(DOCS.values()))
+    return index
+
+
+def test_tokenize_strips_accents_and_stopwords():
+    assert tokenize('Estudió en el Tecnológico; programa en C++ y C#') == [
+        'estudio', 'tecnologico', 'programa', 'c++', 'c#'
+    ]
+
+
+def test_unique_term_is_confident():
+    documents, confidence = make_index().search('Google', 5)
+    assert [doc['id'] for doc in documents] == [1]
+    assert documents[0]['content'] == DOCS[1]
+    assert 'similarity' not in documents[0]
+    assert confidence == 1.0
+
+
+def test_common_term_has_low_confidence():
+    documents, confidence = make_index().search('Python', 5)
+    assert {doc['id'] for doc in documents} == {1, 3, 4}
+    assert confidence < 0.5
+
+
+def test_unknown_terms_lower_confidence():
+    _, known = make_index().search('Google', 5)
+    _, mixed = make_index().search('Google Kubernetes', 5)
+    assert mixed < known
+    assert make_index().search('Kubernetes', 5) == ([], 0.0)
+    assert make_index().search('de la', 5) == ([], 0.0)
+
+
+def test_remove_and_compact():
+    index = make_index()
+    assert index.add([1], ['duplicado']) == 0
+    assert index.remove([1, 99]) == 1
+    assert index.search('Google', 5) == ([], 0.0)
+    index.remove([2])  # supera COMPACT_RATIO: compacta
+    assert index.stats()['removed_pending'] == 0
+    assert len(index) == 2
+    assert [doc['id'] for doc in index.search('Accenture', 5)[0]] == [4]
+    index.add([5], ['Google otra vez'])
+    assert [doc['id'] for doc in index.search('Google', 5)[0]] == [5]
+
+
+def test_load_pages_by_id():
+    rows = [{'id': doc_id, 'content': content} for doc_id, content in DOCS.items()]
+    calls = []
+
+    async def fetch_page(after_id, limit):
+        calls.append(after_id)
+        start = 0 if after_id is None else after_id
+        return rows[start:start + limit]
+
+    index = BM25Index()
+    asyncio.run(index.load(fetch_page, 3))
+    assert calls == [None, 3]
+    assert index.ready and len(index) == 4
+    assert not index.needs_refresh(0)
+    assert index.needs_refresh(1e-9)
+
+
+def test_failed_load_waits_before_retrying():
+    async def broken(after_id, limit):
+        raise RuntimeError('sin conexión')
+
+    index = BM25Index()
+    asyncio.run(index.load(broken))
+    assert not index.ready
+    assert not index.needs_refresh(1e-9)
+
+    async def working(after_id, limit):
+        return [{'id': 1, 'content': 'Google'}]
+
+    asyncio.run(index.load(working))
+    assert not index.ready  # dentro de RETRY_AFTER
+
+
+def test_rrf_merges_fields_and_orders_by_rank():
+    vector = [{'id': 1, 'similarity': 0.9}, {'id': 2, 'similarity': 0.8}]
+    lexical = [{'id': 2, 'bm25': 5.0}, {'id': 3, 'bm25': 4.0}]
+    fused = reciprocal_rank_fusion([vector, lexical], 3, k=60)
+    assert [doc['id'] for doc in fused] == [2, 1, 3]
+    assert fused[0]['similarity'] == 0.8 and fused[0]['bm25'] == 5.0
+    assert fused[0]['rrf'] == 1 / 62 + 1 / 61
+    assert 'similarity' not in fused[2]
+
+
+def test_rrf_first_ranking_wins_conflicts():
+    fused = reciprocal_rank_fusion([[{'id': 1, 'content': 'a'}], [{'id': 1, 'content': 'b'}]], 5)
+    assert fused == [{'id': 1, 'content': 'a', 'rrf': 2 / 61}]
+    assert reciprocal_rank_fusion([[], []], 5) == []
+
+
+def test_client_rebuilds_index_with_rows_from_other_writers(monkeypatch):
+    from benchmarks.fakes import FakeSupabaseClient
+    from src.config import config
+
+    monkeypatch.setattr(config, 'BM25_ENABLED', True)
+    monkeypatch.setattr(config, 'BM25_REFRESH_SECONDS', 1e-9)
+    supabase = FakeSupabaseClient(latency=0.0, jitter=0.0)
+    for doc_id, content in DOCS.items():
+        supabase.rows[doc_id] = {'id': doc_id, 'content': content}
+
+    async def main():
+        assert await supabase.ensure_lexical_index()
+        first = supabase.lexical_index
+        # Otro worker agrega una fila y borra otra directamente en la tabla
+        supabase.rows[9] = {'id': 9, 'content': 'Certificación en Kubernetes'}
+        del supabase.rows[1]
+        assert await supabase.ensure_lexical_index()
+        await supabase._lexical_rebuild
+        return first
+
+    first = asyncio.run(main())
+    assert supabase.lexical_index is not first
+    assert [doc['id'] for doc in supabase.lexical_index.search('Kubernetes', 5)[0]] == [9]
+    assert supabase.lexical_index.search('Google', 5) == ([], 0.0)
@@ -0,0 +1,120 @@
+"""
+El chunker perezoso produce exactamente los mismos chunks que el
+_split_into_chunks original, sin importar cómo se lea la fuente
+"""
+import io
+import random
+
+import pytest
+
+from src.chunking import count_tokens, iter_chunks, iter_file_chunks, split_into_chunks
+
+
+def baseline_split_into_chunks(text: str, chunk_size: int = 500, overlap: int = 50) -> list:
+    """_split_into_chunks tal como estaba en main.py antes del chunker perezoso"""
+    if len(text) <= chunk_size:
+        return [text]
+
+    chunks = []
+    start = 0
+
+    while start < len(text):
+        end = start + chunk_size
+
+        if end < len(text):
+            last_period = text.rfind('.', start, end)
+            last_newline = text.rfind('\n', start, end)
+            last_separator = max(last_period, last_newline)
+
+            if last_separator > start + chunk_size // 2:
+                end = last_separator + 1
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+
+        start = end - overlap if end < len(text) else end
+
+    return chunks
+
+
+def random_text(seed: int, length: int) -> str:
+    """Palabras, puntos, saltos de línea, espacios repetidos y acentos"""
+    rng = random.Random(seed)
+    words = ['Python', 'experiencia', 'año', 'Tec', 'C++', 'señal', 'datos', 'ML', 'API', 'México']
+    pieces = []
+    size = 0
+    while size < length:
+        piece = rng.choice(words) + rng.choice([' ', ' ', ' ', '. ', '\n', '  ', '.\n\n', ', '])
+        pieces.append(piece)
+        size += len(piece)
+    return ''.join(pieces)[:length]
+
+
+TEXTS = [
+    '',
+    '   ',
+    'Texto corto sin cortes',
+    'x' * 1200,
+    '.' * 700,
+    '\n' * 600 + 'fin',
+    *(random_text(seed, length) for seed, length in enumerate((501, 999, 2500, 10_000)))
+]
+PARAMS = [(500, 50), (100, 0), (100, 49), (37, 5), (1000, 200)]
+
+
+@pytest.mark.parametrize('chunk_size, overlap', PARAMS)
+@pytest.mark.parametrize('text', TEXTS, ids=range(len(TEXTS)))
+def test_split_matches_baseline(text, chunk_size, overlap):
+    assert split_into_chunks(text, chunk_size, overlap) == baseline_split_into_chunks(text, chunk_size, overlap)
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 64, 4096])
+def test_block_size_does_not_change_chunks(block_size):
+    text = random_text(42, 5000)
+    expected = baseline_split_into_chunks(text, 300, 40)
+    assert list(iter_chunks(io.StringIO(text), 300, 40, block_size=block_size)) == expected
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_file_chunks_match_baseline(tmp_path, use_mmap):
+    text = random_text(7, 8000)
+    path = tmp_path / 'cv.txt'
+    path.write_text(text, encoding='utf-8')
+    # Bloques chicos: con mmap cortan caracteres multibyte a la mitad
+    chunks = list(iter_file_chunks(str(path), 400, 60, use_mmap=use_mmap, block_size=33))
+    assert chunks == baseline_split_into_chunks(text, 400, 60)
+
+
+def test_empty_file_with_mmap(tmp_path):
+    path = tmp_path / 'vacio.txt'
+    path.write_bytes(b'')
+    assert list(iter_file_chunks(str(path), use_mmap=True)) == ['']
+
+
+def test_iter_chunks_is_lazy():
+    class Reader:
+        reads = 0
+
+        def read(self, size):
+            self.reads += 1
+            return 'palabra. ' * (size // 9)
+
+    reader = Reader()
+    first = next(iter_chunks(reader, 100, 10, block_size=1000))
+    assert first.startswith('palabra.')
+    assert reader.reads == 1
+
+
+def test_token_chunks_respect_size_and_overlap():
+    text = random_text(3, 4000)
+    chunks = list(iter_chunks(text, 50, 5, unit='tokens'))
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 50 for chunk in chunks)
+    # El final de cada chunk se repite al inicio del siguiente
+    assert all(chunks[i + 1].split()[0] in chunks[i] for i in range(len(chunks) - 1))
+
+
+def test_unknown_unit():
+    with pytest.raises(ValueError):
+        iter_chunks('texto', unit='lines')
@@ -0,0 +1,64 @@
+"""Contexto compacto del prompt: fusión de chunks adyacentes y presupuesto de tokens"""
+from src.chunking import count_tokens, split_into_chunks
+from src.context_builder import NO_CONTEXT, build_context
+
+TEXT = (
+    "Juan Pablo trabajó como ingeniero de datos construyendo pipelines en Python. "
+    "Después lideró un equipo de machine learning enfocado en visión por computadora. "
+    "Estudió Ingeniería en Sistemas y participó en proyectos de investigación aplicada. "
+) * 3
+
+
+def chunk_documents(similarities):
+    chunks = split_into_chunks(TEXT, 120, 30)
+    return [
+        {'id': doc_id, 'content': chunk, 'similarity': similarity}
+        for doc_id, (chunk, similarity) in enumerate(zip(chunks, similarities), 1)
+    ]
+
+
+def test_adjacent_chunks_are_merged_without_overlap():
+    documents = chunk_documents([0.7, 0.8, 0.75])
+    # El orden de llegada no importa: se fusionan por id
+    context = build_context(list(reversed(documents)), token_budget=0)
+    assert context['chunks'] == 3 and context['merged'] == 2
+    assert context['text'].startswith('[1] Juan Pablo trabajó')
+    assert context['text'].count('[') == 1
+    assert context['tokens'] < context['raw_tokens']
+    assert context['saved_tokens'] == context['raw_tokens'] - context['tokens']
+
+
+def test_duplicates_and_empty_chunks_are_dropped():
+    documents = [
+        {'id': 1, 'content': 'Python y SQL.', 'similarity': 0.9},
+        {'id': 5, 'content': 'Python y SQL.', 'similarity': 0.6},
+        {'id': 7, 'content': '   ', 'similarity': 0.95},
+        {'id': 9, 'content': 'Estudió en el Tec.', 'similarity': 0.7},
+    ]
+    context = build_context(documents, token_budget=0)
+    assert context['text'] == '[1] Python y SQL.\n\n[2] Estudió en el Tec.'
+
+
+def test_budget_drops_least_relevant_groups():
+    documents = [
+        {'id': 1, 'content': 'Primer grupo menos relevante. ' * 5, 'similarity': 0.6},
+        {'id': 10, 'content': 'Grupo más relevante. ' * 5, 'similarity': 0.9},
+    ]
+    context = build_context(documents, token_budget=25)
+    assert context['text'].startswith('[1] Grupo más relevante.')
+    assert context['dropped'] == 1
+    assert context['tokens'] <= 25
+
+
+def test_most_relevant_group_is_truncated_not_dropped():
+    documents = [{'id': 1, 'content': 'palabra ' * 100, 'similarity': 0.9}]
+    context = build_context(documents, token_budget=20)
+    assert context['text'].endswith('…')
+    assert context['dropped'] == 0
+    assert count_tokens(context['text']) <= 21
+
+
+def test_no_documents():
+    context = build_context([], token_budget=100)
+    assert context['text'] == NO_CONTEXT
+    assert build_context(None)['chunks'] == 0
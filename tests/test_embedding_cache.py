@@ -0,0 +1,107 @@
+"""Cache LRU + TTL de embeddings de consultas, en memoria y en SQLite"""
+import asyncio
+import threading
+
+import pytest
+
+from src import embedding_cache
+from src.embedding_cache import EmbeddingCache, normalize_text
+
+
+def test_key_normalizes_text_and_separates_models():
+    key = EmbeddingCache.make_key('  Dónde   TRABAJÓ ', 'model-a', 'RETRIEVAL_QUERY')
+    assert key == EmbeddingCache.make_key('dónde trabajó', 'model-a', 'RETRIEVAL_QUERY')
+    assert key != EmbeddingCache.make_key('dónde trabajó', 'model-b', 'RETRIEVAL_QUERY')
+    assert key != EmbeddingCache.make_key('dónde trabajó', 'model-a', 'RETRIEVAL_DOCUMENT')
+    assert normalize_text(' A\tb\n') == 'a b'
+
+
+def test_lru_eviction():
+    async def main():
+        cache = EmbeddingCache(max_size=2, ttl=0)
+        await cache.set('a', [1.0])
+        await cache.set('b', [2.0])
+        assert await cache.get('a') == [1.0]  # 'a' pasa a ser la más reciente
+        await cache.set('c', [3.0])
+        assert await cache.get('b') is None
+        assert await cache.get_many(['a', 'c']) == [[1.0], [3.0]]
+        return cache.stats()
+
+    stats = asyncio.run(main())
+    assert stats['evictions'] == 1 and stats['hits'] == 3 and stats['misses'] == 1
+
+
+def test_ttl_expiration(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, 'time', lambda: now[0])
+    cache = EmbeddingCache(max_size=4, ttl=10)
+    asyncio.run(cache.set('a', [1.0]))
+    now[0] += 5
+    assert asyncio.run(cache.get('a')) == [1.0]
+    now[0] += 6
+    assert asyncio.run(cache.get('a')) is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_persistence_across_instances(tmp_path):
+    path = str(tmp_path / 'cache' / 'embeddings.sqlite')
+
+    async def fill():
+        first = EmbeddingCache(max_size=1, ttl=0, path=path)
+        await first.set('a', [0.5, -0.25])
+        await first.set('b', [1.5, 2.5])
+        await first.flush()
+
+    asyncio.run(fill())
+
+    # Solo 'b' cabe en memoria al precargar; 'a' se lee del disco
+    second = EmbeddingCache(max_size=1, ttl=0, path=path)
+    assert second.stats()['size'] == 1
+    assert asyncio.run(second.get('a')) == pytest.approx([0.5, -0.25])
+    assert second.stats()['disk_hits'] == 1
+
+    second.clear()
+    assert asyncio.run(EmbeddingCache(max_size=4, ttl=0, path=path).get('b')) is None
+
+
+def test_disk_io_runs_off_the_event_loop_in_batches(tmp_path, monkeypatch):
+    path = str(tmp_path / 'embeddings.sqlite')
+    cache = EmbeddingCache(max_size=2, ttl=0, path=path)
+    threads, batches = [], []
+    load, write = cache._load_from_disk, cache._write_rows
+
+    def tracked_load(keys):
+        threads.append(threading.current_thread())
+        return load(keys)
+
+    def tracked_write(rows):
+        threads.append(threading.current_thread())
+        batches.append(len(rows))
+        write(rows)
+
+    monkeypatch.setattr(cache, '_load_from_disk', tracked_load)
+    monkeypatch.setattr(cache, '_write_rows', tracked_write)
+
+    async def main():
+        for i in range(5):
+            await cache.set(f"k{i}", [float(i)])
+        await cache.flush()
+        # Las tres llaves que ya no están en memoria se leen con una sola consulta
+        return await cache.get_many(['k0', 'k1', 'k2', 'k4', 'k0'])
+
+    found = asyncio.run(main())
+    assert found == [[0.0], [1.0], [2.0], [4.0], [0.0]]
+    assert threading.main_thread() not in threads
+    assert batches == [5] and len(threads) == 2
+    assert cache.stats()['disk_hits'] == 3 and cache.stats()['pending_writes'] == 0
+
+
+def test_pending_writes_survive_loop_shutdown(tmp_path):
+    path = str(tmp_path / 'embeddings.sqlite')
+
+    async def main():
+        cache = EmbeddingCache(max_size=4, ttl=0, path=path)
+        await cache.set('a', [1.0])  # sin flush: el loop cierra con la escritura encolada
+
+    asyncio.run(main())
+    assert asyncio.run(EmbeddingCache(max_size=4, ttl=0, path=path).get('a')) == [1.0]
@@ -0,0 +1,156 @@
+"""Snapshot de embeddings mapeado en memoria: escritura, lectura y refresh"""
+import asyncio
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from src.embedding_store import EmbeddingStore, quantize_int8  # noqa: E402
+
+DIM = 16
+
+
+def vectors(count: int, seed: int = 0) -> list:
+    return np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32).tolist()
+
+
+@pytest.mark.parametrize('dtype', ['float16', 'int8', 'float32'])
+def test_round_trip_across_instances(tmp_path, dtype):
+    embeddings = vectors(50)
+    contents = [f"chunk {i} con acentos: señal, año" for i in range(50)]
+    writer = EmbeddingStore(str(tmp_path), DIM, dtype)
+    assert writer.append(list(range(1, 51)), contents, embeddings) == 50
+    # Ids repetidos, no enteros o de otra dimensión se omiten
+    assert writer.append([1, 'x', 51], ['a', 'b', 'c'], [embeddings[0], embeddings[0], [1.0]]) == 0
+
+    reader = EmbeddingStore(str(tmp_path), DIM, dtype)
+    assert reader.open() and len(reader) == 50
+    for index in (0, 17, 49):
+        best = reader.search(embeddings[index], limit=3, threshold=0.0)[0]
+        assert best['id'] == index + 1
+        assert best['content'] == contents[index]
+        assert best['similarity'] == pytest.approx(1.0, abs=0.02)
+    assert reader.stats()['last_id'] == 50
+
+
+def test_other_process_appends_are_visible(tmp_path):
+    first = EmbeddingStore(str(tmp_path), DIM)
+    second = EmbeddingStore(str(tmp_path), DIM)
+    first.append([1], ['uno'], vectors(1, seed=1))
+    second.append([2], ['dos'], vectors(1, seed=2))
+    assert len(first.search(vectors(1, seed=2)[0], limit=5, threshold=-1.0)) == 2
+    assert first.search(vectors(1, seed=2)[0], limit=1, threshold=0.0)[0]['content'] == 'dos'
+
+
+def test_delete_hides_rows(tmp_path):
+    store = EmbeddingStore(str(tmp_path), DIM)
+    embeddings = vectors(3)
+    store.append([1, 2, 3], ['a', 'b', 'c'], embeddings)
+    store.delete([2])
+    assert sorted(doc['id'] for doc in store.search(embeddings[1], limit=3, threshold=-1.0)) == [1, 3]
+    assert EmbeddingStore(str(tmp_path), DIM).stats()['deleted'] == 1
+
+
+def test_refresh_fetches_only_new_rows(tmp_path):
+    embeddings = vectors(5)
+    rows = [{'id': i + 1, 'content': f"fila {i + 1}", 'embedding': str(embeddings[i])} for i in range(5)]
+    requested = []
+
+    async def fetch_page(after_id, limit):
+        requested.append(after_id)
+        start = 0 if after_id is None else after_id
+        return rows[start:start + limit]
+
+    store = EmbeddingStore(str(tmp_path), DIM)
+    assert store.needs_refresh(60)
+    assert asyncio.run(store.refresh(fetch_page, page_size=2)) == 5
+    assert store.ready and not store.needs_refresh(60)
+
+    requested.clear()
+    reopened = EmbeddingStore(str(tmp_path), DIM)
+    assert asyncio.run(reopened.refresh(fetch_page, page_size=2)) == 0
+    assert requested == [5]
+
+
+def rows_fetcher(rows, requested=None):
+    async def fetch_page(after_id, limit):
+        if requested is not None:
+            requested.append(after_id)
+        start = 0 if after_id is None else next(i for i, row in enumerate(rows) if row['id'] > after_id)
+        return rows[start:start + limit]
+    return fetch_page
+
+
+def test_other_model_or_format_is_rebuilt(tmp_path):
+    embeddings = vectors(3)
+    rows = [{'id': i + 1, 'content': str(i + 1), 'embedding': embeddings[i]} for i in range(3)]
+    old = EmbeddingStore(str(tmp_path), DIM, model='modelo-a')
+    asyncio.run(old.refresh(rows_fetcher(rows)))
+
+    store = EmbeddingStore(str(tmp_path), DIM, model='modelo-b')
+    assert not store.open() and store.search(embeddings[0], threshold=-1.0) == []
+    assert store.append([9], ['x'], vectors(1)) == 0
+    assert asyncio.run(store.refresh(rows_fetcher(rows))) == 3
+    assert store.ready and store.stats()['generation'] == 1
+    assert store.search(embeddings[2], limit=1, threshold=0.0)[0]['id'] == 3
+    # El de otra dimensión tampoco lo usa hasta reconstruirlo
+    assert not EmbeddingStore(str(tmp_path), DIM * 2, model='modelo-b').open()
+
+
+def test_reset_is_picked_up_by_other_processes(tmp_path):
+    embeddings = vectors(4)
+    rows = [{'id': i + 1, 'content': f"v1 {i + 1}", 'embedding': embeddings[i]} for i in range(3)]
+    reader = EmbeddingStore(str(tmp_path), DIM)
+    asyncio.run(reader.refresh(rows_fetcher(rows)))
+    assert not reader.needs_refresh(60)
+
+    # Otro proceso re-embebe el corpus y descarta el snapshot; luego se inserta una fila
+    EmbeddingStore(str(tmp_path), DIM).reset()
+    reader.append([4], ['nueva'], [embeddings[3]])
+    assert reader.needs_refresh(60)
+    rows = [{**row, 'content': row['content'].replace('v1', 'v2')} for row in rows]
+    requested = []
+    asyncio.run(reader.refresh(rows_fetcher(rows, requested), page_size=2))
+    # La generación nueva se recorre desde el principio aunque ya tenga la fila 4
+    assert requested[0] is None and reader.ready and len(reader) == 4
+    assert reader.search(embeddings[0], limit=1, threshold=0.0)[0]['content'] == 'v2 1'
+
+    requested.clear()
+    asyncio.run(reader.refresh(rows_fetcher(rows, requested), page_size=2))
+    assert requested == [4]
+
+
+@pytest.mark.parametrize('dtype', ['float16', 'int8'])
+def test_search_batch_equals_single_searches(tmp_path, dtype):
+    embeddings = vectors(40)
+    store = EmbeddingStore(str(tmp_path), DIM, dtype)
+    store.append(list(range(1, 41)), [str(i) for i in range(1, 41)], embeddings)
+    store.delete([2])
+    queries = vectors(5, seed=3) + [embeddings[1]]
+    batch = store.search_batch(queries, limit=4, threshold=0.1)
+    assert batch == [store.search(query, limit=4, threshold=0.1) for query in queries]
+    assert store.search_batch([]) == []
+
+
+def test_client_batch_search_goes_through_the_store(tmp_path, monkeypatch):
+    from benchmarks.fakes import FakeSupabaseClient
+
+    embeddings = vectors(3)
+    supabase = FakeSupabaseClient(latency=0.0, jitter=0.0)
+    for doc_id in (1, 2, 3):
+        supabase.rows[doc_id] = {'id': doc_id, 'content': str(doc_id), 'embedding': embeddings[doc_id - 1]}
+    supabase.embedding_store = EmbeddingStore(str(tmp_path), DIM)
+
+    async def no_rpc(function, payload):
+        raise AssertionError('la búsqueda por lote no debe llegar al RPC')
+
+    supabase._rpc = no_rpc
+    results = asyncio.run(supabase.search_similar_documents_batch(embeddings[:2], limit=1, threshold=0.0))
+    assert [docs[0]['id'] for docs in results] == [1, 2]
+
+
+def test_int8_quantization_error_is_small():
+    matrix = np.asarray(vectors(10), dtype=np.float32)
+    q, scales, offsets = quantize_int8(matrix)
+    restored = q.astype(np.float32) * scales[:, None] + offsets[:, None]
+    assert np.max(np.abs(restored - matrix)) <= np.max(scales) / 2 + 1e-6
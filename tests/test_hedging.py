@@ -0,0 +1,121 @@
+"""Deadlines por etapa y requests hedged"""
+import asyncio
+
+import pytest
+
+from src import hedging
+from src.config import config
+from src.hedging import Budget, DeadlineExceeded, LatencyTracker, hedged, with_deadline
+
+
+@pytest.fixture
+def hedge_config(monkeypatch):
+    monkeypatch.setattr(config, 'HEDGE_ENABLED', True)
+    monkeypatch.setattr(config, 'HEDGE_MIN_DELAY', 0.01)
+    monkeypatch.setattr(config, 'HEDGE_MAX_RATIO', 1.0)
+    monkeypatch.setattr(config, 'HEDGE_MIN_SAMPLES', 5)
+    # Estado por etapa limpio en cada prueba
+    for name in ('_trackers', '_calls', '_hedges'):
+        monkeypatch.setattr(hedging, name, {})
+
+
+def warm_up(stage: str, seconds: float = 0.01, samples: int = 5) -> None:
+    for _ in range(samples):
+        hedging.tracker(stage).record(seconds)
+
+
+def test_latency_tracker_needs_min_samples():
+    tracker = LatencyTracker(window=3, min_samples=2)
+    tracker.record(1.0)
+    assert tracker.percentile(0.95) is None
+    for seconds in (2.0, 3.0, 4.0):
+        tracker.record(seconds)
+    assert tracker.percentile(0.5) == 3.0  # la ventana solo guarda las últimas 3
+    assert tracker.percentile(0.95) == 4.0
+
+
+def test_budget_caps_stage_timeout():
+    assert Budget(0).timeout(10) == 10
+    assert Budget(0).timeout(0) is None
+    assert Budget(1).timeout(10) <= 1
+    assert Budget(10).timeout(0.5) == 0.5
+
+
+def test_slow_call_is_hedged_and_fast_duplicate_wins(hedge_config):
+    warm_up('embed-test')
+    attempts = []
+
+    async def call():
+        attempts.append(len(attempts))
+        await asyncio.sleep(1.0 if len(attempts) == 1 else 0.0)
+        return len(attempts)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = await hedged('embed-test', call, timeout=2.0)
+        return result, loop.time() - start
+
+    result, elapsed = asyncio.run(main())
+    assert result == 2
+    assert elapsed < 0.5
+    assert hedging.stats()['embed-test']['hedges'] == 1
+
+
+def test_no_hedge_without_samples_or_over_ratio(hedge_config, monkeypatch):
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.03)
+        return 'ok'
+
+    assert asyncio.run(hedged('search-test', call)) == 'ok'
+    assert calls == 1
+
+    monkeypatch.setattr(config, 'HEDGE_MAX_RATIO', 0.0)
+    warm_up('search-test')
+    assert asyncio.run(hedged('search-test', call)) == 'ok'
+    assert calls == 2
+
+
+def test_deadline_cancels_attempts(hedge_config):
+    cancelled = []
+
+    async def call():
+        try:
+            await asyncio.sleep(1.0)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(DeadlineExceeded) as error:
+        asyncio.run(hedged('deadline-test', call, timeout=0.02))
+    assert error.value.stage == 'deadline-test'
+    assert cancelled == [True]
+
+
+def test_errors_are_not_hedged(hedge_config):
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        raise ConnectionError('caída')
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(hedged('error-test', call, timeout=1.0))
+    assert calls == 1
+
+
+def test_with_deadline():
+    async def slow():
+        await asyncio.sleep(1.0)
+
+    async def fast():
+        return 'ok'
+
+    assert asyncio.run(with_deadline('generate', fast(), None)) == 'ok'
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(with_deadline('generate', slow(), 0.01))
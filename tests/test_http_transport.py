@@ -0,0 +1,125 @@
+"""Transporte HTTP asíncrono sobre el pool compartido, contra un transporte httpx simulado"""
+import asyncio
+import json
+
+import pytest
+
+httpx = pytest.importorskip('httpx')
+
+from src import http_transport  # noqa: E402
+from src.config import config  # noqa: E402
+from src.http_transport import GeminiHTTP, PostgrestHTTP  # noqa: E402
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    """Instala un cliente compartido que registra los requests y responde según la ruta"""
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        path = request.url.path
+        if path.endswith(':embedContent'):
+            return httpx.Response(200, json={'embedding': {'values': [0.1, 0.2]}})
+        if path.endswith(':batchEmbedContents'):
+            count = len(json.loads(request.content)['requests'])
+            return httpx.Response(200, json={'embeddings': [{'values': [float(i)]} for i in range(count)]})
+        if path.endswith(':generateContent'):
+            return httpx.Response(200, json={'candidates': [{'content': {'parts': [{'text': 'Hola '}, {'text': 'mundo'}]}}]})
+        if path.endswith(':streamGenerateContent'):
+            events = [
+                {'candidates': [{'content': {'parts': [{'text': 'Ho'}]}}]},
+                {'candidates': []},
+                {'candidates': [{'content': {'parts': [{'text': 'la'}]}}]},
+            ]
+            body = ''.join(f"data: {json.dumps(event)}\n\n" for event in events)
+            return httpx.Response(200, text=body, headers={'Content-Type': 'text/event-stream'})
+        if path.endswith('/rest/v1/broken'):
+            return httpx.Response(500, json={'message': 'error'})
+        if request.method in ('DELETE', 'PATCH'):
+            return httpx.Response(200, json=[{'id': 1}])
+        if request.method == 'GET':
+            return httpx.Response(200, json=[{'id': 3, 'content': 'x'}])
+        return httpx.Response(201, json=json.loads(request.content or b'[]') or [])
+
+    monkeypatch.setattr(http_transport, '_http_client', httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return seen
+
+
+def test_gemini_embed_and_generate(requests, monkeypatch):
+    monkeypatch.setattr(config, 'GEMINI_EMBED_MODEL', 'text-embedding-004')
+    monkeypatch.setattr(config, 'GEMINI_MODEL', 'gemini-2.0-flash')
+    gemini = GeminiHTTP('clave', base_url='https://gemini.test/')
+
+    async def main():
+        return (
+            await gemini.embed('hola', 'RETRIEVAL_QUERY'),
+            await gemini.embed_batch(['a', 'b', 'c'], 'RETRIEVAL_DOCUMENT'),
+            await gemini.generate('prompt'),
+            [piece async for piece in gemini.generate_stream('prompt')]
+        )
+
+    single, batch, text, pieces = asyncio.run(main())
+    assert single == [0.1, 0.2]
+    assert batch == [[0.0], [1.0], [2.0]]
+    assert text == 'Hola mundo'
+    assert pieces == ['Ho', 'la']
+
+    embed = requests[0]
+    assert str(embed.url) == 'https://gemini.test/v1beta/models/text-embedding-004:embedContent'
+    assert embed.headers['x-goog-api-key'] == 'clave'
+    payload = json.loads(embed.content)
+    assert payload['taskType'] == 'RETRIEVAL_QUERY'
+    assert payload['outputDimensionality'] == config.EMBED_DIM
+    assert requests[3].url.params['alt'] == 'sse'
+
+
+def test_gemini_embedding_001_keeps_default_dimension(requests, monkeypatch):
+    monkeypatch.setattr(config, 'GEMINI_EMBED_MODEL', 'models/gemini-embedding-001')
+    asyncio.run(GeminiHTTP('clave', base_url='https://gemini.test').embed('hola', 'RETRIEVAL_QUERY'))
+    assert 'outputDimensionality' not in json.loads(requests[0].content)
+    assert requests[0].url.path == '/v1beta/models/gemini-embedding-001:embedContent'
+
+
+def test_postgrest_requests(requests):
+    postgrest = PostgrestHTTP('https://db.test/', 'clave')
+
+    async def main():
+        return (
+            await postgrest.insert('jp_documents', [{'content': 'x'}]),
+            await postgrest.select('jp_documents', 'id, content', after_id=2, limit=10,
+                                   eq={'document_key': 'cv'}, in_={'content_hash': ['a', 'b']}),
+            await postgrest.update('jp_documents', 1, {'embedding': [0.1]}),
+            await postgrest.delete('jp_documents', [1, 2])
+        )
+
+    inserted, selected, updated, deleted = asyncio.run(main())
+    assert inserted == [{'content': 'x'}] and selected == [{'id': 3, 'content': 'x'}]
+    assert updated == [{'id': 1}] and deleted == [{'id': 1}]
+
+    insert, select, update, delete = requests
+    assert insert.headers['Prefer'] == 'return=representation'
+    assert insert.headers['Authorization'] == 'Bearer clave' and insert.headers['apikey'] == 'clave'
+    assert dict(select.url.params) == {
+        'select': 'id,content', 'order': 'id.asc', 'id': 'gt.2', 'limit': '10',
+        'document_key': 'eq.cv', 'content_hash': 'in.("a","b")'
+    }
+    assert update.method == 'PATCH' and update.headers['Prefer'] == 'return=representation'
+    assert dict(update.url.params) == {'id': 'eq.1', 'select': 'id'}
+    assert json.loads(update.content) == {'embedding': [0.1]}
+    assert delete.method == 'DELETE' and delete.url.params['id'] == 'in.(1,2)'
+
+
+def test_http_errors_are_raised(requests):
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(PostgrestHTTP('https://db.test', 'clave').select('broken', 'id'))
+
+
+def test_shared_client_is_reused_and_recreated_after_close(monkeypatch):
+    monkeypatch.setattr(http_transport, '_http_client', None)
+    client = http_transport.get_http_client()
+    assert http_transport.get_http_client() is client
+    asyncio.run(http_transport.close_http_client())
+    assert client.is_closed
+    assert http_transport.get_http_client() is not client
+    asyncio.run(http_transport.close_http_client())
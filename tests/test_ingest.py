@@ -0,0 +1,172 @@
+"""Pipeline de ingesta contra los dobles locales de Gemini y Supabase"""
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from benchmarks.fakes import FakeGeminiClient, FakeSupabaseClient  # noqa: E402
+from src.config import config  # noqa: E402
+from src.ingest import format_ingest_summary, ingest_chunks  # noqa: E402
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    monkeypatch.setattr(config, 'CHUNK_DEDUP_ENABLED', True)
+    return FakeGeminiClient(embed_latency=0.0, jitter=0.0), FakeSupabaseClient(latency=0.0, jitter=0.0)
+
+
+def ingest(gemini, supabase, chunks, **kwargs):
+    kwargs.setdefault('embed_batch_size', 3)
+    return asyncio.run(ingest_chunks(iter(chunks), gemini, supabase, **kwargs))
+
+
+def test_stores_every_chunk_in_order(clients):
+    gemini, supabase = clients
+    chunks = [f"Chunk número {i}" for i in range(10)]
+    progress = []
+    result = ingest(gemini, supabase, chunks, document_key='cv', on_progress=lambda outcome, ids: progress.extend(ids))
+
+    assert result['total'] == 10 and not result['errors']
+    assert [item['chunk_id'] for item in result['stored']] == list(range(1, 11))
+    assert sorted(progress) == list(range(1, 11))
+    assert gemini.faults.calls == 4  # lotes de 3
+    stored = {row['content']: row for row in supabase.rows.values()}
+    assert set(stored) == set(chunks)
+    assert all(row['document_key'] == 'cv' and row['content_hash'] for row in stored.values())
+    assert 'Documento almacenado exitosamente' in format_ingest_summary(result)
+
+
+def test_reingestion_reuses_unchanged_chunks(clients):
+    gemini, supabase = clients
+    ingest(gemini, supabase, ['uno', 'dos', 'tres'], document_key='cv')
+    calls = gemini.faults.calls
+
+    result = ingest(gemini, supabase, ['uno', 'dos', 'tres'], document_key='cv')
+    assert result['reused'] == 3 and not result['stored']
+    assert gemini.faults.calls == calls
+    assert len(supabase.rows) == 3
+
+    # 'tres' ya no está: queda obsoleto o se elimina con delete_removed
+    result = ingest(gemini, supabase, ['uno', 'dos', 'cuatro'], document_key='cv')
+    assert result['reused'] == 2 and len(result['stored']) == 1 and result['stale'] == 1
+    result = ingest(gemini, supabase, ['uno', 'dos', 'cuatro'], document_key='cv', delete_removed=True)
+    assert result['removed'] == 1
+    assert sorted(row['content'] for row in supabase.rows.values()) == ['cuatro', 'dos', 'uno']
+
+
+def test_repeated_chunks_within_a_document(clients):
+    gemini, supabase = clients
+    result = ingest(gemini, supabase, ['igual', 'igual', 'otro'], document_key='cv')
+    assert result['reused'] == 1 and len(result['stored']) == 2
+
+
+def test_same_chunk_in_another_document_is_stored(clients):
+    gemini, supabase = clients
+    ingest(gemini, supabase, ['uno', 'dos'], document_key='cv')
+    result = ingest(gemini, supabase, ['uno', 'tres'], document_key='blog')
+    assert len(result['stored']) == 2 and not result['reused']
+    # Sin documento de origen no se compara con lo que ya está en la tabla
+    result = ingest(gemini, supabase, ['uno', 'uno'])
+    assert len(result['stored']) == 1 and result['reused'] == 1
+    assert sorted(row['content'] for row in supabase.rows.values()) == ['dos', 'tres', 'uno', 'uno', 'uno']
+
+
+def test_dedup_argument_overrides_config(clients, monkeypatch):
+    gemini, supabase = clients
+    ingest(gemini, supabase, ['uno'], document_key='cv', dedup=False)
+    assert all(row.get('content_hash') is None for row in supabase.rows.values())
+
+    monkeypatch.setattr(config, 'CHUNK_DEDUP_ENABLED', False)
+    ingest(gemini, supabase, ['dos'], document_key='cv', dedup=True)
+    result = ingest(gemini, supabase, ['dos'], document_key='cv', dedup=True)
+    assert result['reused'] == 1 and len(supabase.rows) == 2
+
+
+def test_corpus_change_hook_invalidates_answers_router_and_indexes(clients, tmp_path):
+    from src.answer_cache import SemanticAnswerCache
+    from src.ingest import notify_corpus_changed
+    from src.vector_index import LocalVectorIndex
+
+    class Router:
+        stale = False
+
+    gemini, supabase = clients
+    supabase.local_index = LocalVectorIndex(config.EMBED_DIM)
+    asyncio.run(supabase.ensure_local_index())
+    cache, router = SemanticAnswerCache(4), Router()
+    result = ingest(gemini, supabase, ['uno'], document_key='cv')
+    assert notify_corpus_changed(result, supabase, cache, router)
+    assert cache.corpus_version == 1 and router.stale and supabase.local_index.stale
+
+    # Una re-ingesta sin cambios no invalida nada
+    result = ingest(gemini, supabase, ['uno'], document_key='cv')
+    assert not notify_corpus_changed(result, supabase, cache, router)
+    assert cache.corpus_version == 1
+
+
+def test_resume_skips_persisted_chunks(clients):
+    gemini, supabase = clients
+    result = ingest(gemini, supabase, ['a', 'b', 'c', 'd'], document_key='cv', skip=2)
+    assert result['resumed'] == 2
+    assert [item['chunk_id'] for item in result['stored']] == [3, 4]
+    assert sorted(row['content'] for row in supabase.rows.values()) == ['c', 'd']
+
+
+def test_without_hash_columns_inserts_plain_rows(clients):
+    gemini, supabase = clients
+    supabase._has_dedup_columns = False
+    ingest(gemini, supabase, ['uno', 'dos'], document_key='cv')
+    result = ingest(gemini, supabase, ['uno', 'dos'], document_key='cv')
+    assert len(result['stored']) == 2 and not result['reused']
+    # Las columnas de huella ni siquiera se envían: la tabla no las tiene
+    assert all('content_hash' not in row and 'document_key' not in row for row in supabase.rows.values())
+
+
+def test_failed_rows_are_reported(clients):
+    gemini, supabase = clients
+    insert = supabase._insert
+
+    async def failing_insert(data):
+        rows = data if isinstance(data, list) else [data]
+        if any('roto' in row['content'] for row in rows):
+            raise RuntimeError('insert rechazado')
+        return await insert(data)
+
+    supabase._insert = failing_insert
+    result = ingest(gemini, supabase, ['bien 1', 'roto', 'bien 2'], document_key='cv')
+    # El lote falla, se reintenta fila por fila y solo la mala queda con error
+    assert [item['chunk_id'] for item in result['stored']] == [1, 3]
+    assert len(result['errors']) == 1 and result['errors'][0].startswith('Chunk 2:')
+    assert len(supabase.rows) == 2
+
+
+def test_slow_source_does_not_block_the_event_loop(clients):
+    gemini, supabase = clients
+
+    def slow_chunks():
+        for i in range(4):
+            time.sleep(0.05)  # lectura de archivo bloqueante
+            yield f"chunk {i}"
+
+    async def main():
+        gaps, stop = [], False
+
+        async def ticker():
+            last = time.monotonic()
+            while not stop:
+                await asyncio.sleep(0.005)
+                now = time.monotonic()
+                gaps.append(now - last)
+                last = now
+
+        task = asyncio.ensure_future(ticker())
+        result = await ingest_chunks(slow_chunks(), gemini, supabase, embed_batch_size=4)
+        stop = True
+        await task
+        return result, max(gaps)
+
+    result, worst_gap = asyncio.run(main())
+    assert len(result['stored']) == 4
+    assert worst_gap < 0.1
@@ -0,0 +1,160 @@
+"""Cola de jobs de ingesta: ejecución, checkpoints, reanudación y cancelación"""
+import asyncio
+import json
+
+from src.jobs import CANCELLED, COMPLETED, FAILED, QUEUED, IngestionJob, IngestionQueue, _Watermark
+
+
+def result(total: int, **extra):
+    return {'total': total, 'stored': [], 'errors': [], **extra}
+
+
+def test_watermark_waits_for_gaps():
+    watermark = _Watermark()
+    watermark.advance([2, 3])
+    assert watermark.value == 0
+    watermark.advance([1])
+    assert watermark.value == 3
+    watermark.advance([5])
+    assert watermark.value == 3
+
+
+def test_job_runs_and_reports_progress(tmp_path):
+    async def runner(job, progress):
+        assert job.params == {'document_key': 'cv'}
+        progress('stored', [1, 2])
+        progress('reused', [3])
+        progress('error', [4])
+        return result(4, summary='listo')
+
+    async def main():
+        queue = IngestionQueue(runner, workers=1, state_dir=str(tmp_path))
+        job = await queue.submit('document', {'document_key': 'cv'}, content='texto')
+        while queue.get(job.id).status not in (COMPLETED, FAILED):
+            await asyncio.sleep(0.01)
+        await queue.close()
+        return job
+
+    job = asyncio.run(main())
+    assert job.status == COMPLETED and job.summary == 'listo'
+    assert (job.stored, job.reused, job.errors, job.watermark) == (2, 1, 1, 3)
+    # El contenido se borra al terminar; el estado queda para consultarlo
+    assert not (tmp_path / f"{job.id}.txt").exists()
+    assert json.loads((tmp_path / f"{job.id}.json").read_text())['status'] == COMPLETED
+    assert job.status_dict()['document_key'] == 'cv'
+
+
+def test_failed_runner_marks_job_failed():
+    async def runner(job, progress):
+        raise RuntimeError('sin conexión')
+
+    async def main():
+        queue = IngestionQueue(runner)
+        job = await queue.submit('document', {}, content='texto')
+        while job.status != FAILED:
+            await asyncio.sleep(0.01)
+        await queue.close()
+        return job
+
+    assert asyncio.run(main()).error_messages == ['sin conexión']
+
+
+def test_interrupted_job_resumes_from_watermark(tmp_path):
+    async def main():
+        first_run = asyncio.Event()
+
+        async def slow_runner(job, progress):
+            progress('stored', [1, 2])
+            first_run.set()
+            await asyncio.sleep(10)
+
+        queue = IngestionQueue(slow_runner, state_dir=str(tmp_path))
+        job = await queue.submit('document', {}, content='texto')
+        await first_run.wait()
+        await queue.close()  # el servidor se detiene a mitad del job
+
+        seen = []
+
+        async def runner(job, progress):
+            seen.append((job.watermark, job.attempts))
+            progress('stored', [3])
+            return result(3)
+
+        restarted = IngestionQueue(runner, state_dir=str(tmp_path))
+        assert await restarted.resume() == 1
+        while restarted.get(job.id).status != COMPLETED:
+            await asyncio.sleep(0.01)
+        await restarted.close()
+        return seen, restarted.get(job.id)
+
+    seen, job = asyncio.run(main())
+    assert seen == [(2, 2)]
+    assert job.watermark == 3
+
+
+def test_state_dir_is_created_with_the_first_job(tmp_path):
+    state_dir = tmp_path / 'jobs'
+
+    async def main():
+        async def runner(job, progress):
+            return result(1)
+
+        queue = IngestionQueue(runner, state_dir=str(state_dir))
+        # Arrancar sin jobs no crea el directorio ni toma el lock de reanudación
+        assert await queue.resume() == 0 and queue.list() == []
+        assert not state_dir.exists() and queue._resume_lock is None
+        job = await queue.submit('document', {}, content='texto')
+        while queue.get(job.id).status != COMPLETED:
+            await asyncio.sleep(0.01)
+        await queue.close()
+
+    asyncio.run(main())
+    assert len(list(state_dir.glob('*.json'))) == 1
+
+
+def test_cancel_queued_and_running_jobs():
+    async def main():
+        running = asyncio.Event()
+
+        async def runner(job, progress):
+            running.set()
+            await asyncio.sleep(10)
+
+        queue = IngestionQueue(runner, workers=1)
+        first = await queue.submit('document', {}, content='a')
+        second = await queue.submit('document', {}, content='b')
+        await running.wait()
+        assert second.status == QUEUED
+        assert await queue.cancel(second.id)
+        assert await queue.cancel(first.id)
+        assert not await queue.cancel(first.id)
+        assert not await queue.cancel('no-existe')
+        await queue.close()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first.status == CANCELLED and second.status == CANCELLED
+
+
+def test_history_keeps_only_recent_finished_jobs(tmp_path):
+    async def runner(job, progress):
+        return result(0)
+
+    async def main():
+        queue = IngestionQueue(runner, state_dir=str(tmp_path), history=2)
+        jobs = [await queue.submit('document', {}, content=str(i)) for i in range(4)]
+        while any(queue.get(job.id) is not None and queue.get(job.id).status != COMPLETED for job in jobs):
+            await asyncio.sleep(0.01)
+        await queue.close()
+        return queue
+
+    queue = asyncio.run(main())
+    assert len(queue.list()) == 2
+    assert len(list(tmp_path.glob('*.json'))) == 2
+
+
+def test_job_round_trips_through_checkpoint():
+    job = IngestionJob('abc', 'file', {'path': 'cv.txt'})
+    job.watermark = 7
+    restored = IngestionJob.from_dict(json.loads(json.dumps(job.to_dict())))
+    assert restored.to_dict() == job.to_dict()
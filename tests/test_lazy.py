@@ -0,0 +1,66 @@
+"""Construcción perezosa de clientes"""
+import threading
+
+import pytest
+
+from src.lazy import LazyClient
+
+
+class Client:
+    def __init__(self):
+        self.value = 42
+
+
+def test_builds_on_first_attribute_access_only():
+    built = []
+
+    def factory():
+        built.append(True)
+        return Client()
+
+    client = LazyClient(factory, 'prueba')
+    assert not client.initialized and built == []
+    assert 'sin inicializar' in repr(client)
+    assert client.value == 42
+    assert client.value == 42
+    assert built == [True] and client.initialized
+    assert client.get() is client.get()
+
+
+def test_failed_construction_is_retried():
+    attempts = []
+
+    def factory():
+        attempts.append(True)
+        if len(attempts) == 1:
+            raise RuntimeError('falta GEMINI_API_KEY')
+        return Client()
+
+    client = LazyClient(factory, 'prueba')
+    with pytest.raises(RuntimeError):
+        client.value
+    assert not client.initialized
+    assert client.value == 42
+    assert len(attempts) == 2
+
+
+def test_concurrent_first_use_builds_once():
+    built = []
+    barrier = threading.Barrier(8)
+
+    def factory():
+        built.append(True)
+        return Client()
+
+    client = LazyClient(factory, 'prueba')
+
+    def use():
+        barrier.wait()
+        assert client.value == 42
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1
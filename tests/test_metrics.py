@@ -0,0 +1,65 @@
+"""Contadores, histogramas de latencia y exportación Prometheus"""
+import asyncio
+
+import pytest
+
+from src.metrics import Histogram, MetricsRegistry
+
+
+def test_counters_and_labels():
+    registry = MetricsRegistry()
+    registry.inc('requests_total', tool='search')
+    registry.inc('requests_total', 2, tool='search')
+    registry.inc('requests_total', tool='generate')
+    counters = registry.snapshot()['counters']
+    assert counters['requests_total{tool="search"}'] == 3
+    assert counters['requests_total{tool="generate"}'] == 1
+
+
+def test_spans_record_duration_and_errors():
+    registry = MetricsRegistry()
+    with registry.span('embed'):
+        pass
+    with pytest.raises(ValueError):
+        with registry.span('embed'):
+            raise ValueError('falló')
+    # Cancelar no cuenta como error de la etapa
+    with pytest.raises(asyncio.CancelledError):
+        with registry.span('embed'):
+            raise asyncio.CancelledError()
+    stage = registry.snapshot()['stages']['embed']
+    assert stage['count'] == 3 and stage['errors'] == 1
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    registry.inc('requests_total')
+    with registry.span('embed'):
+        pass
+    assert registry.snapshot()['counters'] == {} and registry.snapshot()['stages'] == {}
+
+
+def test_histogram_quantiles_are_bounded_by_observations():
+    histogram = Histogram()
+    for value in (0.002, 0.004, 0.02, 0.3, 0.8):
+        histogram.observe(value)
+    assert histogram.min <= histogram.quantile(0.5) <= histogram.max
+    assert histogram.quantile(0.0) >= 0.002
+    assert histogram.quantile(1.0) == pytest.approx(0.8)
+    assert Histogram().quantile(0.5) == 0.0
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry(namespace='jp')
+    registry.inc('requests_total', tool='a"b')
+    registry.observe('stage_duration_seconds', 0.003, stage='embed')
+    text = registry.render_prometheus()
+    assert '# TYPE jp_requests_total counter' in text
+    assert 'jp_requests_total{tool="a\\"b"} 1' in text
+    assert '# TYPE jp_stage_duration_seconds histogram' in text
+    assert 'jp_stage_duration_seconds_bucket{stage="embed",le="0.0025"} 0' in text
+    assert 'jp_stage_duration_seconds_bucket{stage="embed",le="0.005"} 1' in text
+    assert 'jp_stage_duration_seconds_bucket{stage="embed",le="+Inf"} 1' in text
+    assert 'jp_stage_duration_seconds_count{stage="embed"} 1' in text
+    registry.reset()
+    assert registry.render_prometheus() == '\n'
@@ -0,0 +1,164 @@
+"""Re-embedding masivo reanudable contra los dobles locales de Gemini y Supabase"""
+import asyncio
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from benchmarks.fakes import FakeGeminiClient, FakeSupabaseClient, fake_embedding  # noqa: E402
+from src.config import config  # noqa: E402
+from src.migration import ReembedMigration, bump_answer_cache_version, format_migration_summary  # noqa: E402
+
+
+@pytest.fixture
+def clients():
+    gemini = FakeGeminiClient(embed_latency=0.0, jitter=0.0)
+    supabase = FakeSupabaseClient(latency=0.0, jitter=0.0)
+    for row_id in range(1, 12):
+        content = f"chunk {row_id}" if row_id != 5 else ''
+        supabase.rows[row_id] = {'id': row_id, 'content': content, 'embedding': [0.0] * config.EMBED_DIM}
+    supabase._next_id = 12
+    return gemini, supabase
+
+
+def migration(clients, tmp_path, **kwargs):
+    gemini, supabase = clients
+    return ReembedMigration(
+        gemini, supabase, checkpoint_path=str(tmp_path / 'reembed.json'),
+        page_size=4, write_batch_size=3, **kwargs
+    )
+
+
+def test_reembeds_every_row(clients, tmp_path):
+    _, supabase = clients
+    state = asyncio.run(migration(clients, tmp_path).run())
+    assert state.status == 'completed'
+    assert (state.processed, state.skipped, state.failed_ids, state.last_id) == (10, 1, [], 11)
+    assert supabase.rows[3]['embedding'] == fake_embedding('chunk 3', config.EMBED_DIM)
+    assert supabase.rows[3]['content'] == 'chunk 3'
+    assert supabase.rows[5]['embedding'] == [0.0] * config.EMBED_DIM
+    assert 'completed' in format_migration_summary(state)
+    # Una corrida ya completa no vuelve a recorrer la tabla
+    assert asyncio.run(migration(clients, tmp_path).run()).runs == 1
+
+
+def test_resumes_from_checkpoint_and_retries_failed_rows(clients, tmp_path):
+    gemini, supabase = clients
+    write = supabase.update_embeddings
+    calls = []
+
+    async def flaky_write(rows, dim, column='embedding'):
+        calls.append([row['id'] for row in rows])
+        if 2 in (row['id'] for row in rows) and len(calls) == 1:
+            raise RuntimeError('timeout')
+        return await write(rows, dim, column=column)
+
+    supabase.update_embeddings = flaky_write
+    pages = []
+
+    def stop_after_first_page(state):
+        pages.append(state.last_id)
+        if len(pages) == 1:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        asyncio.run(migration(clients, tmp_path).run(on_progress=stop_after_first_page))
+
+    checkpoint = migration(clients, tmp_path).load_state()
+    assert checkpoint.last_id == 4 and checkpoint.failed_ids == [1, 2, 3]
+    assert calls == [[1, 2, 3], [4]]
+
+    state = asyncio.run(migration(clients, tmp_path).run())
+    assert state.status == 'completed' and state.failed_ids == [] and state.runs == 2
+    assert state.processed == 10
+    # La reanudación empieza por los fallidos y sigue después del último id (5 no tiene contenido)
+    assert calls[2:4] == [[1, 2, 3], [6, 7, 8]]
+
+
+def test_rows_deleted_during_the_migration_are_not_recreated(clients, tmp_path):
+    _, supabase = clients
+    write = supabase.update_embeddings
+
+    async def delete_then_write(rows, dim, column='embedding'):
+        supabase.rows.pop(7, None)
+        return await write(rows, dim, column=column)
+
+    supabase.update_embeddings = delete_then_write
+    state = asyncio.run(migration(clients, tmp_path).run())
+    assert state.status == 'completed' and 7 not in supabase.rows
+    assert supabase.rows[8]['embedding'] == fake_embedding('chunk 8', config.EMBED_DIM)
+
+
+def test_completion_invalidates_local_copies(clients, tmp_path):
+    from src.embedding_store import EmbeddingStore
+    from src.vector_index import LocalVectorIndex
+
+    _, supabase = clients
+    supabase.local_index = LocalVectorIndex(config.EMBED_DIM)
+    supabase.embedding_store = EmbeddingStore(str(tmp_path / 'store'), config.EMBED_DIM)
+    assert asyncio.run(supabase.ensure_local_index()) and asyncio.run(supabase.ensure_embedding_store())
+
+    asyncio.run(migration(clients, tmp_path).run())
+    assert supabase.local_index.stale and supabase.local_index.needs_refresh(0)
+    assert supabase.embedding_store.stats()['generation'] == 1
+    assert supabase.embedding_store.needs_refresh(60)
+    # La siguiente búsqueda ya ve los embeddings nuevos
+    embedding = fake_embedding('chunk 3', config.EMBED_DIM)
+    assert asyncio.run(supabase.search_similar_documents(embedding, 1, 0.9))[0]['id'] == 3
+
+
+def test_cli_bumps_the_shared_answer_cache(tmp_path, monkeypatch):
+    from src.answer_cache import SemanticAnswerCache
+
+    path = str(tmp_path / 'answers.sqlite')
+    monkeypatch.setattr(config, 'ANSWER_CACHE_ENABLED', True)
+    monkeypatch.setattr(config, 'ANSWER_CACHE_PATH', path)
+    server = SemanticAnswerCache(4, path=path)
+    server.store([1.0, 0.0, 0.0, 0.0], 'respuesta vieja')
+    assert server.lookup([1.0, 0.0, 0.0, 0.0]) == 'respuesta vieja'
+    bump_answer_cache_version()
+    assert server.lookup([1.0, 0.0, 0.0, 0.0]) is None
+
+
+def test_checkpoint_of_another_migration_is_rejected(clients, tmp_path, monkeypatch):
+    asyncio.run(migration(clients, tmp_path).run())
+    monkeypatch.setattr(config, 'GEMINI_EMBED_MODEL', 'otro-modelo')
+    with pytest.raises(ValueError):
+        asyncio.run(migration(clients, tmp_path).run())
+    assert asyncio.run(migration(clients, tmp_path).run(restart=True)).model == 'otro-modelo'
+
+
+def test_dimension_mismatch_stops_the_migration(clients, tmp_path):
+    gemini, supabase = clients
+
+    async def short_embeddings(texts, **kwargs):
+        return [[0.1, 0.2] for _ in texts]
+
+    gemini.generate_embeddings = short_embeddings
+    with pytest.raises(ValueError):
+        asyncio.run(migration(clients, tmp_path).run())
+    assert supabase.rows[1]['embedding'] == [0.0] * config.EMBED_DIM
+
+
+def test_cli_logs_the_summary_instead_of_printing(clients, tmp_path, monkeypatch, capsys):
+    import importlib
+    import logging
+    import sys
+
+    from src import migration as migration_module
+
+    gemini, supabase = clients
+    # setitem: los clientes perezosos se construirían al leer el atributo
+    monkeypatch.setitem(vars(importlib.import_module('src.gemini')), 'gemini_client', gemini)
+    monkeypatch.setitem(vars(importlib.import_module('src.supabase_client')), 'supabase_client', supabase)
+    monkeypatch.setattr(sys, 'argv', ['migration', '--checkpoint', str(tmp_path / 'reembed.json')])
+    messages = []
+    handler = logging.Handler()
+    handler.emit = lambda record: messages.append(record.getMessage())
+    migration_module.logger.addHandler(handler)
+    try:
+        migration_module.main()
+    finally:
+        migration_module.logger.removeHandler(handler)
+    assert capsys.readouterr().out == ''
+    assert any('Filas migradas: 10' in message for message in messages)
@@ -0,0 +1,122 @@
+"""Limitador de tasa: clasificación de errores, buckets, ventana AIMD y reintentos"""
+import asyncio
+import time
+
+import pytest
+
+from src.rate_limit import AdaptiveConcurrency, RateLimiter, TokenBucket, is_retryable_error, is_throttle_error
+
+
+class StatusError(Exception):
+    def __init__(self, code, headers=None):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+        if headers is not None:
+            self.response = type('Response', (), {'status_code': code, 'headers': headers})()
+
+
+def test_error_classification():
+    assert is_throttle_error(StatusError(429))
+    assert is_throttle_error(Exception('429 Resource has been exhausted (e.g. check quota).'))
+    assert not is_throttle_error(StatusError(500))
+    assert is_retryable_error(StatusError(502))
+    assert is_retryable_error(asyncio.TimeoutError())
+    assert is_retryable_error(ConnectionResetError())
+    assert not is_retryable_error(StatusError(400))
+    assert not is_retryable_error(ValueError('entrada inválida'))
+
+
+def test_token_bucket_waits_after_burst():
+    bucket = TokenBucket(per_minute=600)  # 10 por segundo
+
+    async def main():
+        start = time.monotonic()
+        await bucket.acquire(600)
+        await bucket.acquire(1)
+        return time.monotonic() - start
+
+    assert 0.05 < asyncio.run(main()) < 0.5
+
+
+def test_disabled_bucket_never_waits():
+    asyncio.run(TokenBucket(0).acquire(10 ** 9))
+
+
+def test_window_halves_once_per_round_and_grows_back():
+    async def main():
+        window = AdaptiveConcurrency(initial=8, minimum=1, maximum=8)
+        started = [await window.acquire() for _ in range(3)]
+        # Tres 429 de la misma ronda: una sola reducción
+        for begin in started:
+            await window.release(begin, throttled=True)
+        halved = window.limit
+        for _ in range(20):
+            await window.release(await window.acquire(), throttled=False)
+        return halved, window.limit
+
+    halved, grown = asyncio.run(main())
+    assert halved == 4
+    assert 4 < grown <= 8
+
+
+def limiter() -> RateLimiter:
+    return RateLimiter('test', max_retries=3, base_delay=0.001, max_delay=0.01, max_concurrency=2)
+
+
+def test_transient_errors_are_retried():
+    rate_limiter = limiter()
+    attempts = 0
+
+    async def operation():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise StatusError(503)
+        return 'ok'
+
+    assert asyncio.run(rate_limiter.call(operation)) == 'ok'
+    stats = rate_limiter.stats()
+    assert stats['retries'] == 2 and stats['throttled'] == 2 and stats['in_flight'] == 0
+
+
+def test_permanent_errors_and_exhausted_retries_propagate():
+    rate_limiter = limiter()
+
+    async def invalid():
+        raise ValueError('entrada inválida')
+
+    async def unavailable():
+        raise StatusError(500)
+
+    with pytest.raises(ValueError):
+        asyncio.run(rate_limiter.call(invalid))
+    with pytest.raises(StatusError):
+        asyncio.run(rate_limiter.call(unavailable))
+    assert rate_limiter.stats()['retries'] == 3
+    assert rate_limiter.stats()['failures'] == 2
+    assert rate_limiter.stats()['in_flight'] == 0
+
+
+def test_stream_retries_only_before_first_item():
+    rate_limiter = limiter()
+    attempts = 0
+
+    async def flaky_start():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise StatusError(429)
+        for piece in ('hola ', 'mundo'):
+            yield piece
+
+    async def broken_middle():
+        yield 'hola '
+        raise StatusError(503)
+
+    async def collect(operation):
+        return [piece async for piece in rate_limiter.stream(operation)]
+
+    assert asyncio.run(collect(flaky_start)) == ['hola ', 'mundo']
+    with pytest.raises(StatusError):
+        asyncio.run(collect(broken_middle))
+    assert rate_limiter.stats()['in_flight'] == 0
@@ -0,0 +1,37 @@
+"""Re-ranking por diversidad con MMR"""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from src.rerank import mmr, rerank_documents  # noqa: E402
+
+QUERY = [1.0, 0.0, 0.0]
+# Dos casi duplicados muy relevantes y uno distinto algo menos relevante
+CANDIDATES = [
+    [0.95, 0.31, 0.0],
+    [0.94, 0.34, 0.0],
+    [0.80, 0.0, 0.60],
+]
+
+
+def test_pure_relevance_keeps_similarity_order():
+    assert mmr(QUERY, np.asarray(CANDIDATES), 3, lambda_=1.0) == [0, 1, 2]
+
+
+def test_diversity_skips_near_duplicates():
+    assert mmr(QUERY, np.asarray(CANDIDATES), 2, lambda_=0.5) == [0, 2]
+
+
+def test_k_larger_than_candidates():
+    assert sorted(mmr(QUERY, np.asarray(CANDIDATES), 10)) == [0, 1, 2]
+    assert mmr(QUERY, np.empty((0, 3)), 3) == []
+
+
+def test_rerank_documents():
+    documents = [{'id': i, 'content': str(i), 'similarity': 0.9 - i / 10} for i in range(3)]
+    embeddings = dict(enumerate(CANDIDATES))
+    assert [doc['id'] for doc in rerank_documents(QUERY, documents, embeddings, 2, 0.5)] == [0, 2]
+    # Sin embeddings conocidos se conserva el orden por similitud
+    assert rerank_documents(QUERY, documents, {}, 2) == documents[:2]
+    # Los candidatos sin embedding no participan
+    assert [doc['id'] for doc in rerank_documents(QUERY, documents, {0: CANDIDATES[0], 2: CANDIDATES[2]}, 3)] == [0, 2]
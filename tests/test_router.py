@@ -0,0 +1,140 @@
+"""Router de consultas fuera de tema y sin contexto"""
+import asyncio
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from src.router import ANSWER, CACHED, NO_CONTEXT, OFF_TOPIC, QueryRouter  # noqa: E402
+
+DIM = 3
+
+
+def corpus_rows():
+    """Dos grupos de chunks: alrededor de los ejes x e y"""
+    rng = np.random.default_rng(0)
+    rows = []
+    for axis in (0, 1):
+        for _ in range(20):
+            vector = np.zeros(DIM)
+            vector[axis] = 1.0
+            vector += rng.normal(0, 0.05, DIM)
+            rows.append({'id': len(rows) + 1, 'embedding': vector.tolist()})
+    return rows
+
+
+def fetcher(rows):
+    async def fetch_page(after_id, limit):
+        start = 0 if after_id is None else after_id
+        return rows[start:start + limit]
+    return fetch_page
+
+
+def built_router(**kwargs) -> QueryRouter:
+    router = QueryRouter(dim=DIM, centroids=2, off_topic_threshold=0.5, min_similarity=0.6, **kwargs)
+    asyncio.run(router.build(fetcher(corpus_rows()), page_size=7))
+    return router
+
+
+def test_off_topic_query_is_short_circuited():
+    router = built_router()
+    assert router.ready and not router.stale
+    assert router.route_query([1.0, 0.1, 0.0]) == ANSWER
+    assert router.route_query([0.0, 0.0, 1.0]) == OFF_TOPIC
+    stats = router.stats()
+    assert stats['off_topic'] == 1 and stats['llm_calls_saved'] == 1
+    assert stats['queries'] == 2 and stats['passed'] == 1
+
+
+def test_without_centroids_every_query_is_answered():
+    router = QueryRouter(dim=DIM)
+    assert not router.ready
+    assert router.route_query([0.0, 0.0, 1.0]) == ANSWER
+    assert router.stats()['queries'] == router.stats()['passed'] == 1
+
+
+def test_every_outcome_is_recorded():
+    router = built_router(refresh_seconds=0)
+    router.route_query([0.0, 0.0, 1.0])
+    for _ in range(3):
+        assert router.route_query([1.0, 0.1, 0.0]) == ANSWER
+    assert router.route_cached() == CACHED
+    router.route_documents([])
+    router.route_documents([{'id': 1, 'similarity': 0.9}])
+
+    stats = router.stats()
+    assert stats['queries'] == 4 and stats['passed'] == 3
+    assert (stats['off_topic'], stats['cached'], stats['no_context'], stats['answered']) == (1, 1, 1, 1)
+    # Las respuestas del cache las cuenta el cache; el router ahorra las negativas
+    assert stats['llm_calls_saved'] == 2 and stats['short_circuit_rate'] == 0.5
+
+
+def test_no_context_when_nothing_relevant_is_retrieved():
+    router = QueryRouter(dim=DIM, min_similarity=0.6)
+    assert router.route_documents([]) == NO_CONTEXT
+    assert router.route_documents(None) == NO_CONTEXT
+    assert router.route_documents([{'id': 1, 'similarity': 0.4}]) == NO_CONTEXT
+    assert router.route_documents([{'id': 1, 'similarity': 0.4}, {'id': 2, 'similarity': 0.7}]) == ANSWER
+    # Los puntajes léxicos (bm25, rrf) no están en la escala coseno
+    assert router.route_documents([{'id': 1, 'bm25': 12.0, 'rrf': 0.03}]) == NO_CONTEXT
+    assert router.stats()['no_context'] == 4
+
+
+def test_failed_build_keeps_centroids_stale():
+    async def broken(after_id, limit):
+        raise RuntimeError('sin conexión')
+
+    router = QueryRouter(dim=DIM)
+    asyncio.run(router.build(broken))
+    assert router.stale and not router.ready
+
+
+def test_schedule_build_only_when_stale():
+    rows = corpus_rows()
+    calls = []
+
+    async def fetch_page(after_id, limit):
+        calls.append(after_id)
+        return await fetcher(rows)(after_id, limit)
+
+    async def main():
+        router = QueryRouter(dim=DIM, centroids=2, sample_rows=10)
+        router.schedule_build(fetch_page, 100)
+        await router._task
+        pages = len(calls)
+        router.schedule_build(fetch_page, 100)
+        assert router._task.done() and len(calls) == pages
+        router.stale = True
+        router.schedule_build(fetch_page, 100)
+        await router._task
+        return router, pages
+
+    router, pages = asyncio.run(main())
+    assert router.ready and pages == 1 and len(calls) == 2
+
+
+def test_schedule_build_refreshes_after_interval(monkeypatch):
+    rows = corpus_rows()
+    calls = []
+
+    async def fetch_page(after_id, limit):
+        calls.append(after_id)
+        return await fetcher(rows)(after_id, limit)
+
+    now = [1000.0]
+    monkeypatch.setattr('src.router.time.monotonic', lambda: now[0])
+
+    async def main():
+        router = QueryRouter(dim=DIM, centroids=2, sample_rows=10, refresh_seconds=60)
+        router.schedule_build(fetch_page, 100)
+        await router._task
+        now[0] += 30
+        router.schedule_build(fetch_page, 100)
+        assert router._task.done() and len(calls) == 1
+        now[0] += 31
+        router.schedule_build(fetch_page, 100)
+        await router._task
+        return router
+
+    router = asyncio.run(main())
+    assert router.ready and not router.stale and len(calls) == 2
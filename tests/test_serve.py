@@ -0,0 +1,46 @@
+"""Modo de servicio con varios workers: rutas compartidas y parámetros de uvicorn"""
+import os
+import sys
+
+import pytest
+
+from src import serve
+
+
+@pytest.fixture
+def uvicorn_run(monkeypatch):
+    uvicorn = pytest.importorskip('uvicorn')
+    calls = []
+    monkeypatch.setattr(uvicorn, 'run', lambda app, **kwargs: calls.append((app, kwargs)))
+    for name in (*serve.SHARED_DEFAULTS, 'SERVE_STARTED_AT'):
+        monkeypatch.delenv(name, raising=False)
+    return calls
+
+
+def test_main_shares_caches_between_workers(uvicorn_run, monkeypatch):
+    monkeypatch.setenv('ANSWER_CACHE_PATH', '/tmp/propio.sqlite')
+    monkeypatch.setattr(sys, 'argv', ['serve', '--workers', '3', '--port', '9000', '--log-level', 'off'])
+    serve.main()
+
+    (app, options), = uvicorn_run
+    assert app == 'src.serve:create_app' and options['factory']
+    assert options['workers'] == 3 and options['port'] == 9000
+    assert options['log_level'] == 'critical'
+    # Los workers heredan las rutas por el entorno; las explícitas se respetan
+    assert os.environ['EMBED_CACHE_PATH'] == serve.SHARED_DEFAULTS['EMBED_CACHE_PATH']
+    assert os.environ['ANSWER_CACHE_PATH'] == '/tmp/propio.sqlite'
+    assert float(os.environ['SERVE_STARTED_AT']) > 0
+
+
+def test_at_least_one_worker(uvicorn_run, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['serve', '--workers', '0'])
+    serve.main()
+    assert uvicorn_run[0][1]['workers'] == 1
+
+
+def test_create_app_mounts_the_mcp_endpoint():
+    pytest.importorskip('fastmcp')
+    from src.config import config
+
+    app = serve.create_app()
+    assert any(getattr(route, 'path', None) == config.SERVE_PATH for route in app.routes)
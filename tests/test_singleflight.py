@@ -0,0 +1,67 @@
+"""Coalescencia de llamadas concurrentes con SingleFlight"""
+import asyncio
+
+import pytest
+
+from src.singleflight import SingleFlight, make_key
+
+
+def test_make_key_normalizes_query():
+    assert make_key('search', '  ¿Dónde   trabajó? ', 5) == make_key('search', '¿Dónde trabajó?', 5)
+    assert make_key('search', 'python', 5) != make_key('search', 'python', 10)
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    runs = 0
+
+    async def work():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        return runs
+
+    async def main():
+        results = await asyncio.gather(*(flight.do('k', work) for _ in range(5)))
+        # La clave se libera al terminar: no es un cache
+        again = await flight.do('k', work)
+        return results, again
+
+    results, again = asyncio.run(main())
+    assert results == [1] * 5
+    assert again == 2
+    assert flight.stats() == {'executions': 2, 'coalesced': 4, 'in_flight': 0}
+
+
+def test_error_reaches_every_waiter():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError('falló')
+
+    async def main():
+        return await asyncio.gather(*(flight.do('k', work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_cancelling_a_waiter_keeps_shared_work():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return 'listo'
+
+    async def main():
+        first = asyncio.ensure_future(flight.do('k', work))
+        second = asyncio.ensure_future(flight.do('k', work))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == 'listo'
@@ -0,0 +1,127 @@
+"""Índice vectorial local en NumPy con la semántica de match_documents"""
+import asyncio
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from src.vector_index import LocalVectorIndex, parse_embedding  # noqa: E402
+
+DIM = 8
+
+
+def random_vectors(count: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+
+
+def brute_force(vectors: np.ndarray, query: np.ndarray, limit: int, threshold: float) -> list:
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    order = [int(i) for i in np.argsort(-scores) if scores[i] > threshold]
+    return order[:limit]
+
+
+def test_parse_embedding():
+    assert parse_embedding('[0.5,-1,2]') == [0.5, -1, 2]
+    assert parse_embedding((1.0, 2.0)) == [1.0, 2.0]
+
+
+def test_search_matches_brute_force():
+    vectors = random_vectors(200)
+    index = LocalVectorIndex(DIM)
+    assert index.add(list(range(200)), [f"doc {i}" for i in range(200)], vectors.tolist()) == 200
+    for seed in range(5):
+        query = random_vectors(1, seed=100 + seed)[0]
+        found = index.search(query.tolist(), limit=7, threshold=0.1)
+        assert [doc['id'] for doc in found] == brute_force(vectors, query, 7, 0.1)
+        assert all(doc['content'] == f"doc {doc['id']}" for doc in found)
+        assert all(doc['similarity'] > 0.1 for doc in found)
+
+
+def test_search_batch_equals_single_searches():
+    vectors = random_vectors(50)
+    index = LocalVectorIndex(DIM)
+    index.add(list(range(50)), [''] * 50, vectors.tolist())
+    queries = random_vectors(4, seed=9).tolist()
+    batch = index.search_batch(queries, 5, 0.0)
+    for found, query in zip(batch, queries):
+        single = index.search(query, 5, 0.0)
+        assert [doc['id'] for doc in found] == [doc['id'] for doc in single]
+        assert [doc['similarity'] for doc in found] == pytest.approx([doc['similarity'] for doc in single], abs=1e-5)
+    assert index.search_batch([], 5, 0.0) == []
+
+
+def test_add_skips_duplicates_and_wrong_dimension():
+    index = LocalVectorIndex(DIM)
+    vectors = random_vectors(2).tolist()
+    assert index.add([1, 2, None], ['a', 'b', 'c'], [vectors[0], [1.0], vectors[1]]) == 1
+    assert index.add([1], ['otra vez'], [vectors[1]]) == 0
+    assert len(index) == 1
+    assert index.search(vectors[0], 1, 0.0)[0]['content'] == 'a'
+
+
+def test_remove_keeps_remaining_rows_searchable():
+    vectors = random_vectors(10)
+    index = LocalVectorIndex(DIM)
+    index.add(list(range(10)), [str(i) for i in range(10)], vectors.tolist())
+    assert index.remove([0, 5, 42]) == 2
+    assert len(index) == 8
+    for doc_id in (1, 9):
+        assert index.search(vectors[doc_id].tolist(), 1, 0.0)[0]['id'] == doc_id
+    assert 0 not in {doc['id'] for doc in index.search(vectors[0].tolist(), 10, -1.0)}
+    assert set(index.vectors([1, 5])) == {1}
+
+
+def test_load_pages_and_retries_later():
+    vectors = random_vectors(5).tolist()
+    rows = [{'id': i + 1, 'content': str(i + 1), 'embedding': str(vectors[i])} for i in range(5)]
+
+    async def fetch_page(after_id, limit):
+        start = 0 if after_id is None else after_id
+        return rows[start:start + limit]
+
+    index = LocalVectorIndex(DIM)
+    asyncio.run(index.load(fetch_page, 2))
+    assert index.ready and len(index) == 5
+
+    async def broken(after_id, limit):
+        raise RuntimeError('sin conexión')
+
+    failing = LocalVectorIndex(DIM)
+    asyncio.run(failing.load(broken))
+    assert not failing.ready
+    asyncio.run(failing.load(fetch_page))
+    assert not failing.ready  # espera RETRY_AFTER antes de reintentar
+
+
+def test_client_rebuilds_index_with_rows_from_other_writers(monkeypatch):
+    from benchmarks.fakes import FakeSupabaseClient
+    from src.config import config
+
+    monkeypatch.setattr(config, 'LOCAL_INDEX_REFRESH_SECONDS', 0)
+    vectors = random_vectors(4).tolist()
+    supabase = FakeSupabaseClient(latency=0.0, jitter=0.0)
+    supabase.local_index = LocalVectorIndex(DIM)
+    for doc_id in (1, 2, 3):
+        supabase.rows[doc_id] = {'id': doc_id, 'content': str(doc_id), 'embedding': vectors[doc_id - 1]}
+
+    async def main():
+        assert await supabase.ensure_local_index()
+        first = supabase.local_index
+        # Otro worker agrega una fila y borra otra directamente en la tabla
+        supabase.rows[4] = {'id': 4, 'content': '4', 'embedding': vectors[3]}
+        del supabase.rows[1]
+        assert await supabase.ensure_local_index()
+        assert supabase._local_rebuild is None  # intervalo 0: solo al inicio
+        first.stale = True
+        assert await supabase.ensure_local_index()
+        # Mientras se reconstruye, este proceso inserta otra fila
+        supabase._index_rows([5], ['5'], [vectors[0]])
+        await supabase._local_rebuild
+        return first
+
+    first = asyncio.run(main())
+    index = supabase.local_index
+    assert index is not first and not index.stale
+    assert sorted(index._ids) == [2, 3, 4, 5]
+    assert index.search(vectors[3], 1, 0.0)[0]['id'] == 4